@@ -0,0 +1,187 @@
+"""
+Cache de Áudio do TTS em Disco
+Cada WAV gerado fica em `diretorio`/<modelo>/<2 primeiros caracteres>/<chave>.wav, onde a
+chave vem do texto normalizado, da voz (e do modelo dela) e da velocidade (ver chave_cache).
+<modelo> é o modelo padrão do serviço, e os áudios de todas as vozes ficam nele, inclusive os
+das vozes com modelo próprio: quem separa modelos diferentes é a chave. Trocar o modelo padrão
+usa outro subdiretório e deixa de lado o cache anterior inteiro
+
+O índice (chave -> tamanho, do menos ao mais recentemente usado) fica em memória e é
+reconstruído dos arquivos ao iniciar; passando de `limite_bytes`, os menos usados são apagados.
+Áudios gravados depois por outro processo (outro worker HTTP, utilitarios/preaquecer_cache.py)
+entram no índice na primeira consulta
+
+A chave não identifica os bytes: o Piper sorteia ruído a cada síntese, então o mesmo texto gerado
+de novo (depois de sair do cache) é outro WAV. Por isso versao() dá o sha256 do arquivo gravado,
+que vai no ETag e na URL de /api/audio
+"""
+
+import hashlib
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from gateway import chave_tts
+
+
+def chave_cache(texto: str, voz: str, modelo: str, velocidade: float, esticado: bool = False) -> str:
+    """
+    Chave do áudio, que identifica o pedido (vai na URL de /api/audio/{chave}): texto normalizado,
+    voz e o modelo dela (outro modelo na mesma voz é outro áudio) e velocidade, com as versões
+    esticadas separadas das geradas pelo Piper
+    """
+    return chave_tts(texto, f"{voz}@{modelo}|stretch" if esticado else f"{voz}@{modelo}", velocidade)
+
+
+class CacheAudio:
+    """Cache LRU de WAVs em disco, seguro para uso a partir de várias threads"""
+
+    def __init__(self, diretorio: Path, modelo: str, limite_bytes: int):
+        self.diretorio = Path(diretorio) / modelo
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self.limite_bytes = limite_bytes
+        self._indice: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._trava = threading.Lock()
+        # chave -> (inode, tamanho, sha256): o hash só é recalculado se o arquivo for trocado
+        self._versoes: Dict[str, Tuple[int, int, str]] = {}
+        self.acertos = 0
+        self.faltas = 0
+        self._carregar_indice()
+
+    def _carregar_indice(self):
+        arquivos = []
+        for caminho in self.diretorio.glob("*/*.wav"):
+            try:
+                info = caminho.stat()
+            except FileNotFoundError:
+                continue
+            arquivos.append((info.st_mtime, caminho.stem, info.st_size))
+        for _, chave, tamanho in sorted(arquivos):
+            self._indice[chave] = tamanho
+            self._total += tamanho
+        if arquivos:
+            print(f"✓ Cache de TTS: {len(arquivos)} áudios ({self._total / 1e6:.1f} MB) em {self.diretorio}")
+        self._liberar_espaco()
+
+    def caminho(self, chave: str) -> Path:
+        return self.diretorio / chave[:2] / f"{chave}.wav"
+
+    def _adotar(self, chave: str) -> bool:
+        """Incluir no índice um áudio gravado por outro processo (chamar com a trava)"""
+        try:
+            tamanho = self.caminho(chave).stat().st_size
+        except FileNotFoundError:
+            return False
+        self._indice[chave] = tamanho
+        self._total += tamanho
+        return True
+
+    def contem(self, chave: str) -> bool:
+        with self._trava:
+            return chave in self._indice or self._adotar(chave)
+
+    def obter(self, chave: str) -> Optional[bytes]:
+        """WAV da chave, ou None se não estiver em cache"""
+        with self._trava:
+            if chave not in self._indice and not self._adotar(chave):
+                self.faltas += 1
+                return None
+            self._indice.move_to_end(chave)
+        caminho = self.caminho(chave)
+        try:
+            dados = caminho.read_bytes()
+            # mtime = último uso, para a ordem LRU sobreviver a reinícios
+            os.utime(caminho, (time.time(), time.time()))
+        except FileNotFoundError:
+            # Apagado por fora (ou por outro processo que divide o diretório)
+            with self._trava:
+                self._total -= self._indice.pop(chave, 0)
+                self._versoes.pop(chave, None)
+                self.faltas += 1
+            return None
+        with self._trava:
+            self.acertos += 1
+        return dados
+
+    def localizar(self, chave: str) -> Optional[Path]:
+        """Arquivo do WAV da chave (contado como uso, sem ler o conteúdo), ou None"""
+        with self._trava:
+            if chave not in self._indice and not self._adotar(chave):
+                self.faltas += 1
+                return None
+            self._indice.move_to_end(chave)
+            self.acertos += 1
+        caminho = self.caminho(chave)
+        try:
+            os.utime(caminho, (time.time(), time.time()))
+        except FileNotFoundError:
+            with self._trava:
+                self._total -= self._indice.pop(chave, 0)
+                self._versoes.pop(chave, None)
+            return None
+        return caminho
+
+    def versao(self, chave: str) -> Optional[str]:
+        """sha256 do WAV gravado na chave (muda se ele for gerado de novo), ou None se não estiver em cache"""
+        caminho = self.caminho(chave)
+        try:
+            info = caminho.stat()
+            with self._trava:
+                memo = self._versoes.get(chave)
+            if memo is not None and memo[:2] == (info.st_ino, info.st_size):
+                return memo[2]
+            with open(caminho, "rb") as arquivo:
+                # Aberto: o hash é do arquivo de info mesmo que outro processo o troque agora
+                info = os.fstat(arquivo.fileno())
+                versao = hashlib.sha256(arquivo.read()).hexdigest()
+        except FileNotFoundError:
+            return None
+        with self._trava:
+            self._versoes[chave] = (info.st_ino, info.st_size, versao)
+        return versao
+
+    def guardar(self, chave: str, dados: bytes):
+        caminho = self.caminho(chave)
+        # parents: o diretório do modelo pode ter sido apagado com o serviço rodando
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        # Escrita atômica: quem lê nunca vê um WAV pela metade
+        temporario = caminho.with_name(f".{chave}.{secrets.token_hex(4)}.tmp")
+        temporario.write_bytes(dados)
+        inode = temporario.stat().st_ino
+        os.replace(temporario, caminho)
+        with self._trava:
+            self._total += len(dados) - self._indice.pop(chave, 0)
+            self._indice[chave] = len(dados)
+            self._versoes[chave] = (inode, len(dados), hashlib.sha256(dados).hexdigest())
+            # O áudio recém-gravado fica, mesmo sozinho passando do limite: a URL dele
+            # (/api/audio/{chave}?v=...) já vai na resposta e não pode virar 404
+            self._liberar_espaco(preservar=chave)
+
+    def _liberar_espaco(self, preservar: Optional[str] = None):
+        """
+        Apagar os menos usados até caber no limite (chamar com a trava)
+        `preservar` é o mais recente do índice: sobrando só ele, a limpeza para
+        """
+        minimo = 1 if preservar in self._indice else 0
+        while self._total > self.limite_bytes and len(self._indice) > minimo:
+            chave, tamanho = self._indice.popitem(last=False)
+            self._total -= tamanho
+            self._versoes.pop(chave, None)
+            self.caminho(chave).unlink(missing_ok=True)
+
+    def estado(self) -> Dict:
+        with self._trava:
+            consultas = self.acertos + self.faltas
+            return {
+                "entradas": len(self._indice),
+                "bytes": self._total,
+                "limite_bytes": self.limite_bytes,
+                "acertos": self.acertos,
+                "faltas": self.faltas,
+                "taxa_acerto": round(self.acertos / consultas, 4) if consultas else None,
+            }
@@ -0,0 +1,86 @@
+"""
+Coalescência de Requisições (single-flight)
+Requisições idênticas que chegam enquanto a primeira ainda está em execução não
+disparam outra síntese/transcrição: aguardam a mesma execução e recebem o mesmo resultado
+
+A execução roda numa tarefa própria, então o cliente que a iniciou pode desistir sem
+derrubar os demais; ela só é cancelada quando todos os interessados desistem. Por isso
+cada interessado aplica o seu próprio prazo à espera, e não o de quem iniciou a execução
+"""
+
+import asyncio
+import contextvars
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from escalonador import PrazoEsgotado
+
+
+class _Execucao:
+    __slots__ = ("tarefa", "interessados", "dados")
+
+    def __init__(self, tarefa: "asyncio.Task", dados=None):
+        self.tarefa = tarefa
+        self.interessados = 0
+        self.dados = dados
+
+
+class ChamadasEmVoo:
+    """Execuções em andamento por chave, compartilhadas entre chamadas idênticas"""
+
+    def __init__(self):
+        self._em_voo: Dict[str, _Execucao] = {}
+        self.executadas = 0
+        self.coalescidas = 0
+
+    def em_andamento(self, chave: str) -> bool:
+        return chave in self._em_voo
+
+    def dados(self, chave: str):
+        """Dados associados à execução em voo com `chave` (None se não houver)"""
+        execucao = self._em_voo.get(chave)
+        return execucao.dados if execucao is not None else None
+
+    async def executar(self, chave: str, funcao: Callable[..., Awaitable], *args, prazo: Optional[float] = None,
+                       contexto: Optional[contextvars.Context] = None, dados=None) -> Tuple[Any, bool]:
+        """
+        Executar `funcao(*args)` ou aguardar a execução já em voo com a mesma `chave`
+        Retorna (resultado, compartilhado); exceções chegam a todos os interessados
+
+        prazo: instante (time.monotonic) até o qual este interessado espera (PrazoEsgotado depois)
+        contexto: contexto da tarefa, se for iniciada agora (padrão: cópia do contexto atual)
+        dados: guardados com a execução, se for iniciada agora (ver dados())
+        """
+        execucao = self._em_voo.get(chave)
+        compartilhado = execucao is not None
+        if compartilhado:
+            self.coalescidas += 1
+        else:
+            contexto = contexto or contextvars.copy_context()
+            execucao = _Execucao(contexto.run(asyncio.ensure_future, funcao(*args)), dados)
+            self._em_voo[chave] = execucao
+            execucao.tarefa.add_done_callback(lambda _: self._encerrar(chave, execucao))
+            self.executadas += 1
+
+        execucao.interessados += 1
+        try:
+            espera = None if prazo is None else max(prazo - time.monotonic(), 0.0)
+            return await asyncio.wait_for(asyncio.shield(execucao.tarefa), espera), compartilhado
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            if not execucao.tarefa.done() and execucao.interessados == 1:
+                execucao.tarefa.cancel()  # Ninguém mais espera este resultado
+            if isinstance(e, asyncio.TimeoutError) and not execucao.tarefa.done():
+                raise PrazoEsgotado("Prazo esgotado aguardando a execução") from None
+            raise
+        finally:
+            execucao.interessados -= 1
+
+    def _encerrar(self, chave: str, execucao: _Execucao):
+        # Execuções posteriores com a mesma chave começam do zero
+        if self._em_voo.get(chave) is execucao:
+            del self._em_voo[chave]
+        if not execucao.tarefa.cancelled():
+            execucao.tarefa.exception()  # Marcar como observada (evita aviso se ninguém mais esperava)
+
+    def estado(self) -> Dict:
+        return {"em_voo": len(self._em_voo), "executadas": self.executadas, "coalescidas": self.coalescidas}
@@ -0,0 +1,261 @@
+"""
+Escalonador por Prioridade
+Controla a vez nos motores (Whisper/Piper) com classes de prioridade em vez de ordem de chegada:
+
+- interactive: turnos de diálogo e requisições de usuário esperando a resposta
+- normal: padrão
+- bulk: pré-geração, lotes e trabalhos longos em segundo plano
+
+Entre as classes, a vez é dividida por fila justa ponderada (stride scheduling): com pesos
+8/3/1, sob disputa, interactive recebe 8 vezes mais vagas que bulk, sem que bulk pare de
+andar. Além disso, quem espera mais que `envelhecimento` segundos passa à frente (aging)
+
+Há duas versões com a mesma política: EscalonadorAsync (event loop do serviço HTTP)
+e EscalonadorThreads (servidor de modelos)
+
+Com `prazo` (instante em time.monotonic), quem ainda não recebeu a vez até lá sai da fila
+com PrazoEsgotado, em vez de ocupar o motor com uma resposta que ninguém vai esperar
+
+Uma espera pode ter um `dono` (ex.: uma execução compartilhada por requisições idênticas);
+promover(dono, prioridade) passa as esperas dele para uma classe mais alta sem perder a chegada
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Deque, Dict, Optional
+
+PRIORIDADES = ("interactive", "normal", "bulk")
+PRIORIDADE_PADRAO = "normal"
+
+
+def interpretar_pesos(texto: str) -> Dict[str, float]:
+    """'interactive=8,normal=3,bulk=1' -> dict (classes omitidas ficam com peso 1)"""
+    pesos = {prioridade: 1.0 for prioridade in PRIORIDADES}
+    for parte in texto.split(","):
+        nome, _, valor = parte.partition("=")
+        nome = nome.strip()
+        if nome not in pesos:
+            raise ValueError(f"Prioridade desconhecida: {nome!r} (use {', '.join(PRIORIDADES)})")
+        pesos[nome] = float(valor)
+        if pesos[nome] <= 0:
+            raise ValueError(f"Peso de {nome} deve ser positivo")
+    return pesos
+
+
+PRIORIDADE_PESOS = interpretar_pesos(os.getenv("PRIORIDADE_PESOS", "interactive=8,normal=3,bulk=1"))
+# Espera (s) a partir da qual qualquer requisição passa à frente das demais
+PRIORIDADE_ENVELHECIMENTO = float(os.getenv("PRIORIDADE_ENVELHECIMENTO", "30"))
+
+
+class PrazoEsgotado(Exception):
+    """O prazo da requisição terminou antes (ou não daria tempo) de executar"""
+
+
+def validar_prioridade(prioridade: Optional[str]) -> str:
+    if not prioridade:
+        return PRIORIDADE_PADRAO
+    prioridade = prioridade.strip().lower()
+    if prioridade not in PRIORIDADES:
+        raise ValueError(f"Prioridade inválida: {prioridade!r} (use {', '.join(PRIORIDADES)})")
+    return prioridade
+
+# ============================================
+# POLÍTICA (SEM SINCRONIZAÇÃO)
+# ============================================
+
+class _Espera:
+    __slots__ = ("prioridade", "chegada", "sinal", "dono")
+
+    def __init__(self, prioridade: str, sinal, dono=None):
+        self.prioridade = prioridade
+        self.chegada = time.monotonic()
+        self.sinal = sinal  # Future (async) ou Event (threads)
+        self.dono = dono
+
+
+class PoliticaPrioridade:
+    """Filas por classe e escolha da próxima espera; quem usa cuida da sincronização"""
+
+    def __init__(self, pesos: Dict[str, float] = None, envelhecimento: float = PRIORIDADE_ENVELHECIMENTO):
+        self.pesos = pesos or PRIORIDADE_PESOS
+        self.envelhecimento = envelhecimento
+        self.filas: Dict[str, Deque[_Espera]] = {prioridade: deque() for prioridade in PRIORIDADES}
+        # Passada de cada classe: cresce 1/peso a cada vez concedida; a que terminaria antes é servida
+        self.passadas = {prioridade: 0.0 for prioridade in PRIORIDADES}
+        self.tempo_virtual = 0.0
+        self.atendidas = {prioridade: 0 for prioridade in PRIORIDADES}
+        self.envelhecidas = 0
+
+    def __len__(self):
+        return sum(len(fila) for fila in self.filas.values())
+
+    def entrar(self, espera: _Espera):
+        fila = self.filas[espera.prioridade]
+        if not fila:
+            # Classe ociosa não acumula crédito enquanto não tinha ninguém esperando
+            self.passadas[espera.prioridade] = max(self.passadas[espera.prioridade], self.tempo_virtual)
+        fila.append(espera)
+
+    def remover(self, espera: _Espera):
+        try:
+            self.filas[espera.prioridade].remove(espera)
+        except ValueError:
+            pass
+
+    def promover(self, dono, prioridade: str) -> int:
+        """Passar as esperas de `dono` em classes abaixo de `prioridade` para ela (mantendo a chegada)"""
+        promovidas = 0
+        for classe in PRIORIDADES[PRIORIDADES.index(prioridade) + 1:]:
+            for espera in [espera for espera in self.filas[classe] if espera.dono is dono]:
+                self.filas[classe].remove(espera)
+                espera.prioridade = prioridade
+                fila = self.filas[prioridade]
+                if not fila:
+                    self.passadas[prioridade] = max(self.passadas[prioridade], self.tempo_virtual)
+                # Na fila nova, entra na posição da sua chegada
+                posicao = next((i for i, outra in enumerate(fila) if outra.chegada > espera.chegada), len(fila))
+                fila.insert(posicao, espera)
+                promovidas += 1
+        return promovidas
+
+    def proxima(self) -> Optional[_Espera]:
+        ativas = [prioridade for prioridade in PRIORIDADES if self.filas[prioridade]]
+        if not ativas:
+            return None
+
+        # Envelhecimento: a espera mais antiga acima do limite passa à frente
+        agora = time.monotonic()
+        mais_antiga = min(ativas, key=lambda prioridade: self.filas[prioridade][0].chegada)
+        if agora - self.filas[mais_antiga][0].chegada >= self.envelhecimento:
+            self.envelhecidas += 1
+            escolhida = mais_antiga
+        else:
+            # Menor passada ao fim desta vez (tempo de término virtual, como no WFQ)
+            escolhida = min(ativas, key=lambda prioridade: (
+                self.passadas[prioridade] + 1.0 / self.pesos[prioridade], PRIORIDADES.index(prioridade)
+            ))
+            self.tempo_virtual = self.passadas[escolhida]
+            self.passadas[escolhida] += 1.0 / self.pesos[escolhida]
+
+        self.atendidas[escolhida] += 1
+        return self.filas[escolhida].popleft()
+
+    def estado(self) -> Dict:
+        return {
+            prioridade: {"na_fila": len(self.filas[prioridade]), "atendidas": self.atendidas[prioridade]}
+            for prioridade in PRIORIDADES
+        }
+
+# ============================================
+# ESCALONADORES
+# ============================================
+
+class EscalonadorAsync:
+    """Semáforo com prioridade para o event loop (substitui asyncio.Lock/Semaphore dos motores)"""
+
+    def __init__(self, vagas: int, pesos: Dict[str, float] = None, envelhecimento: float = PRIORIDADE_ENVELHECIMENTO):
+        self.vagas = vagas
+        self.ocupadas = 0
+        self.politica = PoliticaPrioridade(pesos, envelhecimento)
+
+    async def adquirir(self, prioridade: str = PRIORIDADE_PADRAO, prazo: Optional[float] = None, dono=None):
+        if prazo is not None and time.monotonic() >= prazo:
+            raise PrazoEsgotado("Prazo esgotado antes de entrar na fila")
+        if self.ocupadas < self.vagas and not len(self.politica):
+            self.ocupadas += 1
+            return
+
+        espera = _Espera(prioridade, asyncio.get_running_loop().create_future(), dono)
+        self.politica.entrar(espera)
+        try:
+            if prazo is None:
+                await espera.sinal
+            else:
+                await asyncio.wait_for(espera.sinal, prazo - time.monotonic())
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            if espera.sinal.done() and not espera.sinal.cancelled():
+                self.liberar()  # A vaga chegou junto com o cancelamento: repassar
+            else:
+                self.politica.remover(espera)
+            if isinstance(e, asyncio.TimeoutError):
+                raise PrazoEsgotado("Prazo esgotado na fila") from None
+            raise
+
+    def liberar(self):
+        while True:
+            proxima = self.politica.proxima()
+            if proxima is None:
+                self.ocupadas -= 1
+                return
+            if not proxima.sinal.done():
+                proxima.sinal.set_result(None)  # A vaga passa direto para a próxima espera
+                return
+
+    def promover(self, dono, prioridade: str) -> int:
+        return self.politica.promover(dono, prioridade)
+
+    @asynccontextmanager
+    async def vez(self, prioridade: str = PRIORIDADE_PADRAO, prazo: Optional[float] = None):
+        await self.adquirir(prioridade, prazo)
+        try:
+            yield
+        finally:
+            self.liberar()
+
+    def estado(self) -> Dict:
+        return {"vagas": self.vagas, "ocupadas": self.ocupadas, "envelhecidas": self.politica.envelhecidas,
+                "classes": self.politica.estado()}
+
+
+class EscalonadorThreads:
+    """Mesmo escalonador para threads (servidor de modelos)"""
+
+    def __init__(self, vagas: int, pesos: Dict[str, float] = None, envelhecimento: float = PRIORIDADE_ENVELHECIMENTO):
+        self.vagas = vagas
+        self.ocupadas = 0
+        self.politica = PoliticaPrioridade(pesos, envelhecimento)
+        self._trava = threading.Lock()
+
+    def adquirir(self, prioridade: str = PRIORIDADE_PADRAO, prazo: Optional[float] = None):
+        with self._trava:
+            if prazo is not None and time.monotonic() >= prazo:
+                raise PrazoEsgotado("Prazo esgotado antes de entrar na fila")
+            if self.ocupadas < self.vagas and not len(self.politica):
+                self.ocupadas += 1
+                return
+            espera = _Espera(prioridade, threading.Event())
+            self.politica.entrar(espera)
+        if espera.sinal.wait(None if prazo is None else max(prazo - time.monotonic(), 0)):
+            return
+        with self._trava:
+            recebeu = espera.sinal.is_set()
+            if not recebeu:
+                self.politica.remover(espera)
+        if recebeu:
+            self.liberar()  # A vaga chegou junto com o prazo: repassar
+        raise PrazoEsgotado("Prazo esgotado na fila")
+
+    def liberar(self):
+        with self._trava:
+            proxima = self.politica.proxima()
+            if proxima is None:
+                self.ocupadas -= 1
+            else:
+                proxima.sinal.set()
+
+    @contextmanager
+    def vez(self, prioridade: str = PRIORIDADE_PADRAO, prazo: Optional[float] = None):
+        self.adquirir(prioridade, prazo)
+        try:
+            yield
+        finally:
+            self.liberar()
+
+    def estado(self) -> Dict:
+        with self._trava:
+            return {"vagas": self.vagas, "ocupadas": self.ocupadas, "envelhecidas": self.politica.envelhecidas,
+                    "classes": self.politica.estado()}
@@ -0,0 +1,201 @@
+"""
+Memória de Fonemização (Piper em processo)
+Antes de cada inferência o Piper passa o texto pelo espeak-ng (texto -> fonemas -> IDs).
+Como o corpus repete as mesmas frases e palavras, o resultado é guardado:
+
+- por frase: frase normalizada -> sequências de IDs de fonemas, prontas para o ONNX
+- por palavra: palavra (com a pontuação colada) -> fonemas, aprendidos das frases já
+  fonemizadas; uma frase nova feita só de palavras conhecidas é montada sem o espeak
+
+As duas memórias são LRU limitadas e ficam também num SQLite (um por modelo), então
+sobrevivem a reinícios. A ordem de uso gravada é a da fonemização, não a do último acerto
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS frases (texto TEXT PRIMARY KEY, ids TEXT NOT NULL, uso REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS palavras (palavra TEXT PRIMARY KEY, fonemas TEXT NOT NULL, uso REAL NOT NULL);
+"""
+
+# Fim de frase seguido de espaço: cada frase é fonemizada (e memorizada) separadamente
+_FIM_DE_FRASE = re.compile(r"(?<=[.!?])\s+")
+
+# Separador de palavras na saída do espeak
+ESPACO = " "
+
+# O espeak-ng guarda a voz e o buffer de saída em estado global do processo, e cada voz do Piper
+# troca essa voz antes de fonemizar: duas chamadas ao mesmo tempo (da mesma voz ou de vozes
+# diferentes, com MemoFonemas diferentes) misturam os fonemas. Só a chamada ao espeak é serializada
+_TRAVA_ESPEAK = threading.Lock()
+
+
+class _LRU:
+    """Dicionário limitado, do menos ao mais recentemente usado"""
+
+    def __init__(self, limite: int):
+        self.limite = limite
+        self.itens: "OrderedDict[str, object]" = OrderedDict()
+
+    def obter(self, chave: str):
+        valor = self.itens.get(chave)
+        if valor is not None:
+            self.itens.move_to_end(chave)
+        return valor
+
+    def guardar(self, chave: str, valor):
+        self.itens[chave] = valor
+        self.itens.move_to_end(chave)
+        while len(self.itens) > self.limite:
+            self.itens.popitem(last=False)
+
+
+class MemoFonemas:
+    """Texto -> IDs de fonemas por frase, com memória por frase e por palavra"""
+
+    def __init__(self, arquivo: Optional[Path], limite_frases: int = 50000, limite_palavras: int = 200000,
+                 montar_palavras: bool = True):
+        self.arquivo = Path(arquivo) if arquivo else None
+        self.frases = _LRU(limite_frases)
+        self.palavras = _LRU(limite_palavras)
+        self.montar_palavras = montar_palavras
+        self._trava = threading.Lock()
+        self._db = None
+        self._pid = None
+        self.acertos = 0
+        self.montadas = 0
+        self.faltas = 0
+        self.tempo_fonemizacao = 0.0
+        if self.arquivo:
+            self._carregar()
+
+    # ---------- persistência ----------
+
+    def _conexao(self) -> sqlite3.Connection:
+        # Conexões SQLite não atravessam fork (workers pré-fork do servidor de modelos)
+        if self._pid != os.getpid():
+            self.arquivo.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.arquivo), check_same_thread=False, timeout=10)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(ESQUEMA)
+            self._pid = os.getpid()
+        return self._db
+
+    def _carregar(self):
+        db = self._conexao()
+        for tabela, coluna, memoria in (("frases", "texto", self.frases), ("palavras", "palavra", self.palavras)):
+            valor = "ids" if tabela == "frases" else "fonemas"
+            linhas = db.execute(
+                f"SELECT {coluna}, {valor} FROM {tabela} ORDER BY uso DESC LIMIT ?", (memoria.limite,)
+            ).fetchall()
+            for chave, dados in reversed(linhas):
+                memoria.guardar(chave, json.loads(dados))
+            # O arquivo também fica limitado: apaga o que não coube na memória
+            db.execute(
+                f"DELETE FROM {tabela} WHERE {coluna} NOT IN "
+                f"(SELECT {coluna} FROM {tabela} ORDER BY uso DESC LIMIT ?)", (memoria.limite,)
+            )
+        db.commit()
+        if self.frases.itens or self.palavras.itens:
+            print(f"✓ Fonemas memorizados: {len(self.frases.itens)} frases, {len(self.palavras.itens)} palavras")
+
+    def _persistir(self, frase: str, ids: List[List[int]], palavras: Dict[str, List[str]]):
+        if not self.arquivo:
+            return
+        agora = time.time()
+        db = self._conexao()
+        db.execute("INSERT OR REPLACE INTO frases VALUES (?, ?, ?)", (frase, json.dumps(ids), agora))
+        db.executemany(
+            "INSERT OR REPLACE INTO palavras VALUES (?, ?, ?)",
+            [(palavra, json.dumps(fonemas, ensure_ascii=False), agora) for palavra, fonemas in palavras.items()],
+        )
+        db.commit()
+
+    # ---------- consulta ----------
+
+    def ids(self, texto: str, fonemizar: Callable[[str], List[List[str]]],
+            para_ids: Callable[[List[str]], List[int]]) -> List[List[int]]:
+        """
+        IDs de fonemas de cada frase de `texto`
+        `fonemizar` e `para_ids` são os da voz (PiperVoice.phonemize / phonemes_to_ids)
+        """
+        resultado = []
+        for frase in _FIM_DE_FRASE.split(" ".join(texto.split())):
+            if frase:
+                resultado.extend(self._ids_frase(frase, fonemizar, para_ids))
+        return resultado
+
+    def _ids_frase(self, frase: str, fonemizar, para_ids) -> List[List[int]]:
+        with self._trava:
+            ids = self.frases.obter(frase)
+            if ids is not None:
+                self.acertos += 1
+                return ids
+            palavras = frase.split(ESPACO)
+            fonemas_palavras = [self.palavras.obter(palavra) for palavra in palavras] if self.montar_palavras else [None]
+
+        if len(palavras) > 1 and all(fonemas is not None for fonemas in fonemas_palavras):
+            # Frase nova, palavras conhecidas: junta os fonemas de cada uma
+            fonemas = []
+            for indice, fonemas_palavra in enumerate(fonemas_palavras):
+                if indice:
+                    fonemas.append(ESPACO)
+                fonemas.extend(fonemas_palavra)
+            ids = [para_ids(fonemas)]
+            with self._trava:
+                self.montadas += 1
+                self.frases.guardar(frase, ids)
+            return ids
+
+        with _TRAVA_ESPEAK:
+            inicio = time.perf_counter()
+            fonemas_frases = [fonemas for fonemas in fonemizar(frase) if fonemas]
+            duracao = time.perf_counter() - inicio
+        ids = [para_ids(fonemas) for fonemas in fonemas_frases]
+        aprendidas = self._separar_palavras(palavras, fonemas_frases)
+        with self._trava:
+            self.faltas += 1
+            self.tempo_fonemizacao += duracao
+            self.frases.guardar(frase, ids)
+            for palavra, fonemas in aprendidas.items():
+                self.palavras.guardar(palavra, fonemas)
+            self._persistir(frase, ids, aprendidas)
+        return ids
+
+    @staticmethod
+    def _separar_palavras(palavras: List[str], fonemas_frases: List[List[str]]) -> Dict[str, List[str]]:
+        """Fonemas de cada palavra, se a saída do espeak tiver uma palavra para cada palavra do texto"""
+        if len(fonemas_frases) != 1:
+            return {}
+        partes = [[]]
+        for fonema in fonemas_frases[0]:
+            if fonema == ESPACO:
+                partes.append([])
+            else:
+                partes[-1].append(fonema)
+        # Números, siglas e afins podem virar várias palavras: nesse caso não dá para alinhar
+        if len(partes) != len(palavras) or not all(partes):
+            return {}
+        return dict(zip(palavras, partes))
+
+    def estado(self) -> Dict:
+        with self._trava:
+            consultas = self.acertos + self.montadas + self.faltas
+            return {
+                "frases": len(self.frases.itens),
+                "palavras": len(self.palavras.itens),
+                "acertos": self.acertos,
+                "montadas": self.montadas,
+                "faltas": self.faltas,
+                "taxa_acerto": round((self.acertos + self.montadas) / consultas, 4) if consultas else None,
+                "tempo_fonemizacao_s": round(self.tempo_fonemizacao, 3),
+            }
@@ -0,0 +1,256 @@
+"""
+Gateway
+Encaminha /api/generate-audio e /api/transcribe-audio para outras instâncias do serviço
+O peer é escolhido por hashing consistente da requisição (mesmo texto/áudio vai para o
+mesmo peer, mantendo o cache dele quente), desde que sua carga, lida de /capacity,
+não fique muito acima da do peer menos carregado
+"""
+
+import bisect
+import hashlib
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ============================================
+# HASHING CONSISTENTE
+# ============================================
+
+def _posicao(valor: str) -> int:
+    return int.from_bytes(hashlib.md5(valor.encode("utf-8")).digest()[:8], "big")
+
+
+class AnelHash:
+    """Anel de hashing consistente com nós virtuais (adicionar um peer remapeia só ~1/N das chaves)"""
+
+    def __init__(self, nos: List[str], replicas: int = 100):
+        self.nos = list(nos)
+        self._anel = sorted((_posicao(f"{no}#{i}"), no) for no in self.nos for i in range(replicas))
+        self._posicoes = [posicao for posicao, _ in self._anel]
+
+    def candidatos(self, chave: str) -> List[str]:
+        """Todos os nós, na ordem em que aparecem no anel a partir da chave"""
+        if not self._anel:
+            return []
+        inicio = bisect.bisect(self._posicoes, _posicao(chave))
+        ordem: List[str] = []
+        for deslocamento in range(len(self._anel)):
+            no = self._anel[(inicio + deslocamento) % len(self._anel)][1]
+            if no not in ordem:
+                ordem.append(no)
+                if len(ordem) == len(self.nos):
+                    break
+        return ordem
+
+
+def chave_tts(texto: str, voz: str, velocidade: float) -> str:
+    """Chave de roteamento do TTS: texto normalizado (espaços), voz e velocidade"""
+    normalizado = " ".join(texto.split())
+    return hashlib.sha256(f"{voz}|{velocidade:.3f}|{normalizado}".encode("utf-8")).hexdigest()
+
+
+def chave_audio(audio: bytes) -> str:
+    return hashlib.sha256(audio).hexdigest()
+
+# ============================================
+# PEERS
+# ============================================
+
+class Peer:
+    """Estado de uma instância remota: saúde, última capacidade lida e requisições em voo"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.saudavel = False
+        self.capacidade: Dict = {}
+        self.erro: Optional[str] = None
+        self.ultimo_contato: Optional[float] = None
+        # Encaminhadas e ainda sem resposta, por motor (corrige a capacidade entre consultas)
+        self.em_voo: Dict[str, int] = {}
+
+    def carga(self, motor: str) -> float:
+        """Espera estimada (s) no `motor` deste peer, somando o que já encaminhamos desde a última consulta"""
+        estado = self.capacidade.get("motores", {}).get(motor, {})
+        espera = estado.get("espera_estimada") or 0.0
+        duracao = estado.get("duracao_media") or 0.0
+        vagas = estado.get("vagas") or 1
+        return espera + self.em_voo.get(motor, 0) * duracao / vagas
+
+    def como_dict(self) -> Dict:
+        return {
+            "url": self.url,
+            "saudavel": self.saudavel,
+            "erro": self.erro,
+            "ultimo_contato": self.ultimo_contato,
+            "em_voo": dict(self.em_voo),
+            "espera_estimada": self.capacidade.get("espera_estimada"),
+            "motores": self.capacidade.get("motores"),
+        }
+
+
+class ErroGateway(Exception):
+    """Nenhum peer saudável conseguiu atender a requisição"""
+
+# ============================================
+# GATEWAY
+# ============================================
+
+class Gateway:
+    """
+    Pool de conexões keep-alive para os peers, consulta periódica de /capacity
+    e escolha do peer para cada requisição
+    """
+
+    def __init__(self, urls: List[str], intervalo: float = 1.0, tolerancia: float = 1.0,
+                 timeout: float = 300.0, conexoes: int = 16):
+        self.peers = {url.rstrip("/"): Peer(url) for url in urls}
+        self.anel = AnelHash(list(self.peers))
+        self.intervalo = intervalo
+        self.tolerancia = tolerancia  # Segundos de espera a mais aceitos para manter o peer do hash
+        self.timeout = timeout
+        self._trava = threading.Lock()
+        self._parar = threading.Event()
+
+        # Uma única Session: o HTTPAdapter mantém um pool de conexões por host
+        self.sessao = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=len(self.peers), pool_maxsize=conexoes)
+        self.sessao.mount("http://", adaptador)
+        self.sessao.mount("https://", adaptador)
+
+    def iniciar(self):
+        self.consultar_todos()
+        threading.Thread(target=self._laco_consulta, name="gateway-capacidade", daemon=True).start()
+        saudaveis = sum(peer.saudavel for peer in self.peers.values())
+        print(f"🔀 Gateway com {len(self.peers)} peers ({saudaveis} saudáveis)")
+
+    def parar(self):
+        self._parar.set()
+        self.sessao.close()
+
+    def _laco_consulta(self):
+        while not self._parar.wait(self.intervalo):
+            self.consultar_todos()
+
+    def consultar_todos(self):
+        for peer in list(self.peers.values()):
+            self._consultar(peer)
+
+    def _consultar(self, peer: Peer):
+        try:
+            resposta = self.sessao.get(f"{peer.url}/capacity", timeout=min(self.intervalo * 2, 5))
+            resposta.raise_for_status()
+            capacidade = resposta.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            if peer.saudavel:
+                print(f"⚠️ Peer {peer.url} fora de rotação: {e}")
+            with self._trava:
+                peer.saudavel = False
+                peer.erro = str(e)
+            return
+
+        with self._trava:
+            if not peer.saudavel and capacidade.get("pronto"):
+                print(f"✓ Peer {peer.url} em rotação")
+            peer.capacidade = capacidade
+            peer.saudavel = bool(capacidade.get("pronto"))
+            peer.erro = None if peer.saudavel else f"estado: {capacidade.get('estado')}"
+            peer.ultimo_contato = time.time()
+            # A capacidade nova já inclui o que estava em voo
+            peer.em_voo = {motor: 0 for motor in peer.em_voo}
+
+    def escolher(self, motor: str, chave: str) -> List[Peer]:
+        """
+        Peers saudáveis em ordem de preferência: o primeiro na ordem do anel cuja carga
+        não passe da menor carga + tolerância; depois os demais, do menos carregado
+        """
+        with self._trava:
+            candidatos = [self.peers[url] for url in self.anel.candidatos(chave) if self.peers[url].saudavel]
+            if not candidatos:
+                return []
+            cargas = {peer.url: peer.carga(motor) for peer in candidatos}
+        limite = min(cargas.values()) + self.tolerancia
+        preferido = next(peer for peer in candidatos if cargas[peer.url] <= limite)
+        restantes = sorted((peer for peer in candidatos if peer is not preferido), key=lambda peer: cargas[peer.url])
+        return [preferido] + restantes
+
+    def encaminhar(self, motor: str, chave: str, caminho: str, timeout: Optional[float] = None,
+                   **kwargs) -> "tuple[requests.Response, Peer]":
+        """
+        POST `caminho` no peer escolhido; tenta o próximo se a conexão falhar ou o peer
+        responder 503 (drenando). Outras respostas de erro são repassadas ao cliente
+        `timeout` (ex.: prazo restante da requisição) limita o timeout padrão do gateway
+        """
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        tentativas = self.escolher(motor, chave)
+        if not tentativas:
+            raise ErroGateway("Nenhum peer saudável")
+
+        ultimo_erro = None
+        for peer in tentativas:
+            with self._trava:
+                peer.em_voo[motor] = peer.em_voo.get(motor, 0) + 1
+            try:
+                resposta = self.sessao.post(f"{peer.url}{caminho}", timeout=timeout, **kwargs)
+            except requests.exceptions.RequestException as e:
+                if isinstance(e, requests.exceptions.ReadTimeout) and timeout < self.timeout:
+                    raise  # Esgotou o prazo da requisição, não o peer: não tentar outro
+                ultimo_erro = e
+                print(f"⚠️ Falha ao encaminhar para {peer.url}: {e}")
+                with self._trava:
+                    peer.saudavel = False
+                    peer.erro = str(e)
+                continue
+            finally:
+                with self._trava:
+                    peer.em_voo[motor] = max(peer.em_voo.get(motor, 0) - 1, 0)
+
+            if resposta.status_code == 503:
+                ultimo_erro = f"{peer.url} respondeu 503"
+                continue
+            return resposta, peer
+
+        raise ErroGateway(f"Todos os peers falharam (último erro: {ultimo_erro})")
+
+    def buscar(self, chave: str, caminho: str, timeout: Optional[float] = None,
+               **kwargs) -> "tuple[requests.Response, Peer]":
+        """
+        GET `caminho` de um recurso que só um peer tem (ex.: um áudio do cache dele), sem saber
+        qual: os peers saudáveis são consultados na ordem do anel a partir da chave até um não
+        responder 404
+        """
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        with self._trava:
+            saudaveis = {url for url, peer in self.peers.items() if peer.saudavel}
+        ultima = None
+        for url in self.anel.candidatos(chave):
+            if url not in saudaveis:
+                continue
+            try:
+                resposta = self.sessao.get(f"{url}{caminho}", timeout=timeout, **kwargs)
+            except requests.exceptions.RequestException as e:
+                print(f"⚠️ Falha ao consultar {url}: {e}")
+                continue
+            ultima = resposta, self.peers[url]
+            if resposta.status_code != 404:
+                break
+        if ultima is None:
+            raise ErroGateway("Nenhum peer saudável")
+        return ultima
+
+    def estado(self) -> List[Dict]:
+        with self._trava:
+            return [peer.como_dict() for peer in self.peers.values()]
+
+    def capacidade(self) -> Dict:
+        """Resumo para um balanceador à frente do gateway: pronto se algum peer estiver"""
+        peers = self.estado()
+        esperas = [peer["espera_estimada"] or 0.0 for peer in peers if peer["saudavel"]]
+        return {
+            "pronto": bool(esperas),
+            "peers_saudaveis": len(esperas),
+            "espera_estimada": min(esperas, default=None),
+            "peers": peers,
+        }
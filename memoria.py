@@ -0,0 +1,196 @@
+"""
+Contabilidade de Memória
+RSS do processo, estatísticas do alocador do torch e snapshots do tracemalloc com diffs
+Usado pelas rotas /admin/memory para investigar crescimento de memória em execuções longas
+"""
+
+import sys
+import threading
+import tracemalloc
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+# Frames ignorados nos snapshots (ruído do próprio tracemalloc e do import system)
+FILTROS_SNAPSHOT = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def memoria_processo(pid: Optional[int] = None) -> Dict[str, Optional[int]]:
+    """RSS atual e pico (bytes) deste processo ou de `pid`, via psutil quando disponível ou /proc no Linux"""
+    try:
+        import psutil
+        info = psutil.Process(pid).memory_info()
+        pico = getattr(info, "peak_wset", None)  # Windows
+        if pico is None and pid is None:
+            pico = _pico_rusage()
+        return {"rss": info.rss, "vms": info.vms, "rss_pico": pico}
+    except ImportError:
+        pass
+
+    try:
+        valores = _ler_proc(pid, "status", ("VmRSS", "VmHWM", "VmSize"))
+        return {"rss": valores.get("VmRSS"), "vms": valores.get("VmSize"), "rss_pico": valores.get("VmHWM")}
+    except OSError:
+        return {"rss": None, "vms": None, "rss_pico": _pico_rusage() if pid is None else None}
+
+
+def memoria_compartilhada(pid: Optional[int] = None) -> Dict[str, Optional[int]]:
+    """
+    PSS e páginas compartilhadas/privadas (bytes), via /proc/<pid>/smaps_rollup (Linux)
+    Mostra quanto dos pesos herdados por fork continua compartilhado entre os workers
+    """
+    try:
+        valores = _ler_proc(pid, "smaps_rollup", ("Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"))
+    except OSError:
+        return {}
+    return {
+        "pss": valores.get("Pss"),
+        "compartilhada": valores.get("Shared_Clean", 0) + valores.get("Shared_Dirty", 0),
+        "privada": valores.get("Private_Clean", 0) + valores.get("Private_Dirty", 0),
+    }
+
+
+def _ler_proc(pid: Optional[int], arquivo: str, chaves) -> Dict[str, int]:
+    valores = {}
+    with open(f"/proc/{pid or 'self'}/{arquivo}", encoding="ascii") as f:
+        for linha in f:
+            chave, _, resto = linha.partition(":")
+            if chave in chaves:
+                valores[chave] = int(resto.split()[0]) * 1024
+    return valores
+
+
+def _pico_rusage() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico if sys.platform == "darwin" else pico * 1024  # macOS em bytes, Linux em KiB
+
+
+def estatisticas_torch(torch) -> Dict:
+    """Memória do alocador CUDA do torch (vazio se não houver GPU)"""
+    if not torch.cuda.is_available():
+        return {"cuda": False}
+    return {
+        "cuda": True,
+        "alocado": torch.cuda.memory_allocated(),
+        "alocado_pico": torch.cuda.max_memory_allocated(),
+        "reservado": torch.cuda.memory_reserved(),
+        "reservado_pico": torch.cuda.max_memory_reserved(),
+        "alocacoes_ativas": torch.cuda.memory_stats().get("active.all.current", 0),
+    }
+
+
+def estado_tracemalloc() -> Dict:
+    if not tracemalloc.is_tracing():
+        return {"ativo": False}
+    atual, pico = tracemalloc.get_traced_memory()
+    return {
+        "ativo": True,
+        "quadros": tracemalloc.get_traceback_limit(),
+        "atual": atual,
+        "pico": pico,
+        "sobrecarga": tracemalloc.get_tracemalloc_memory(),
+    }
+
+
+class PicosPorEtapa:
+    """Maior alocação observada (tracemalloc) em cada etapa de cada rota"""
+
+    def __init__(self):
+        self._picos: Dict[str, Dict[str, int]] = {}
+        self._trava = threading.Lock()
+
+    def registrar(self, rota: str, etapa: str, pico: int):
+        chave = f"{rota} {etapa}"
+        with self._trava:
+            registro = self._picos.setdefault(chave, {"maximo": 0, "ultimo": 0, "amostras": 0})
+            registro["maximo"] = max(registro["maximo"], pico)
+            registro["ultimo"] = pico
+            registro["amostras"] += 1
+
+    def como_dict(self) -> Dict[str, Dict[str, int]]:
+        with self._trava:
+            return {chave: dict(valor) for chave, valor in sorted(self._picos.items())}
+
+    def limpar(self):
+        with self._trava:
+            self._picos.clear()
+
+
+class GerenciadorSnapshots:
+    """Guarda os últimos snapshots do tracemalloc e calcula diffs entre eles"""
+
+    def __init__(self, limite: int = 10):
+        self.limite = limite
+        self._snapshots: "OrderedDict[str, tuple]" = OrderedDict()
+        self._contador = 0
+        self._trava = threading.Lock()
+
+    def capturar(self) -> Dict:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc não está ativo")
+        snapshot = tracemalloc.take_snapshot().filter_traces(FILTROS_SNAPSHOT)
+        with self._trava:
+            self._contador += 1
+            snapshot_id = str(self._contador)
+            info = {
+                "id": snapshot_id,
+                "data": datetime.now().isoformat(timespec="seconds"),
+                "total": sum(stat.size for stat in snapshot.statistics("filename")),
+                "rss": memoria_processo()["rss"],
+            }
+            self._snapshots[snapshot_id] = (snapshot, info)
+            while len(self._snapshots) > self.limite:
+                self._snapshots.popitem(last=False)
+        return info
+
+    def listar(self):
+        with self._trava:
+            return [info for _, info in self._snapshots.values()]
+
+    def diff(self, antigo: str, novo: str, agrupamento: str = "lineno", limite: int = 25):
+        """Maiores diferenças de alocação de `antigo` para `novo`"""
+        with self._trava:
+            if antigo not in self._snapshots or novo not in self._snapshots:
+                raise KeyError("Snapshot não encontrado")
+            snapshot_antigo, info_antigo = self._snapshots[antigo]
+            snapshot_novo, info_novo = self._snapshots[novo]
+
+        estatisticas = snapshot_novo.compare_to(snapshot_antigo, agrupamento)
+        return {
+            "de": info_antigo,
+            "para": info_novo,
+            "diferenca_total": sum(stat.size_diff for stat in estatisticas),
+            "maiores": [
+                {
+                    "origem": [f"{quadro.filename}:{quadro.lineno}" for quadro in stat.traceback],
+                    "diferenca_bytes": stat.size_diff,
+                    "tamanho_bytes": stat.size,
+                    "diferenca_blocos": stat.count_diff,
+                    "blocos": stat.count,
+                }
+                for stat in estatisticas[:limite]
+            ],
+        }
+
+    def limpar(self):
+        with self._trava:
+            self._snapshots.clear()
+
+
+def iniciar_tracemalloc(quadros: int = 1):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(quadros)
+
+
+def parar_tracemalloc():
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
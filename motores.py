@@ -0,0 +1,743 @@
+"""
+Motores de Inferência
+Whisper (STT) e Piper (TTS) com uma interface comum, usados dentro do serviço HTTP
+ou isolados no servidor de modelos (servidor_modelos.py)
+"""
+
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import requests
+
+import memoria
+from fonemas import MemoFonemas
+from vozes import ModeloVoz, RegistroVozes, VozDesconhecida, interpretar_vozes, modelo_da_voz
+from processamento_audio import escrever_wav
+
+# ============================================
+# CONFIGURAÇÃO PIPER-TTS
+# ============================================
+
+# Diretório para modelos Piper
+PIPER_MODELS_DIR = Path(os.getenv("PIPER_MODELS_DIR", "piper_models"))
+
+# Configuração do modelo de voz alemã
+PIPER_MODEL_URL = "https://huggingface.co/rhasspy/piper-voices/resolve/main/de/de_DE/thorsten/medium/de_DE-thorsten-medium.onnx"
+PIPER_CONFIG_URL = "https://huggingface.co/rhasspy/piper-voices/resolve/main/de/de_DE/thorsten/medium/de_DE-thorsten-medium.onnx.json"
+
+PIPER_MODEL_PATH = PIPER_MODELS_DIR / "de_DE-thorsten-medium.onnx"
+PIPER_CONFIG_PATH = PIPER_MODELS_DIR / "de_DE-thorsten-medium.onnx.json"
+
+# Vozes aceitas em `voice`: nome=modelo (arquivo em PIPER_MODELS_DIR ou caminho de um .onnx)
+PIPER_VOZES = interpretar_vozes(os.getenv("PIPER_VOZES", f"Kore={PIPER_MODEL_PATH.stem}"), PIPER_MODELS_DIR)
+PIPER_VOZ_PADRAO = os.getenv("PIPER_VOZ_PADRAO", next(iter(PIPER_VOZES)))
+if PIPER_VOZ_PADRAO not in PIPER_VOZES:
+    raise ValueError(f"PIPER_VOZ_PADRAO {PIPER_VOZ_PADRAO!r} não está em PIPER_VOZES")
+# Modelos carregados ao mesmo tempo no Piper em processo (os demais carregam no uso)
+PIPER_VOZES_RESIDENTES = int(os.getenv("PIPER_VOZES_RESIDENTES", "2"))
+# Vozes carregadas já ao iniciar (ex.: as duas do diálogo)
+PIPER_VOZES_PRECARREGAR = [voz.strip() for voz in os.getenv("PIPER_VOZES_PRECARREGAR", PIPER_VOZ_PADRAO).split(",") if voz.strip()]
+
+# executavel: um processo do Piper por frase; onnx: piper-tts + onnxruntime neste processo
+PIPER_MODO = os.getenv("PIPER_MODO", "executavel")
+
+# Memória de fonemização do Piper em processo (ver fonemas.py); FONEMAS_CACHE_DIR vazio = só em memória
+FONEMAS_CACHE_DIR = os.getenv("FONEMAS_CACHE_DIR", "cache_fonemas")
+FONEMAS_MAX_FRASES = int(os.getenv("FONEMAS_MAX_FRASES", "50000"))
+FONEMAS_MAX_PALAVRAS = int(os.getenv("FONEMAS_MAX_PALAVRAS", "200000"))
+FONEMAS_MONTAR_PALAVRAS = os.getenv("FONEMAS_MONTAR_PALAVRAS", "1") != "0"
+
+# Piper em processo: frases pendentes (de requisições simultâneas ou do mesmo texto) com o mesmo
+# length_scale passam juntas pelo modelo, até PIPER_LOTE por vez (1 = uma frase por inferência)
+PIPER_LOTE = int(os.getenv("PIPER_LOTE", "8"))
+# Quanto a primeira frase espera por outras antes de a inferência começar
+PIPER_LOTE_JANELA_MS = float(os.getenv("PIPER_LOTE_JANELA_MS", "5"))
+# Threads intra-op de cada sessão do onnxruntime (0 = os núcleos disponíveis ao processo)
+PIPER_ONNX_THREADS = int(os.getenv("PIPER_ONNX_THREADS", "0"))
+
+def vagas_piper(concorrencia: int) -> int:
+    """
+    Sínteses simultâneas que o escalonador do Piper deve admitir
+    Em processo e com lote, as chamadas simultâneas só esperam a vez delas no lote; com menos
+    vagas que PIPER_LOTE, requisições diferentes nunca chegariam a dividir uma inferência
+    """
+    if PIPER_MODO == "onnx" and PIPER_LOTE > 1:
+        return max(concorrencia, PIPER_LOTE)
+    return concorrencia
+
+def nucleos_disponiveis() -> int:
+    """Núcleos que este processo pode usar (a afinidade, onde existir)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+# ============================================
+# CONFIGURAÇÃO WHISPER
+# ============================================
+
+# Nome do modelo (tiny, base, small, medium, large) ou caminho de um checkpoint .pt
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "large")
+# Vazio = cuda se disponível, senão cpu
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE")
+
+# Taxa de amostragem esperada pelo Whisper
+TAXA_AMOSTRAGEM = 16000
+# Janela nativa do Whisper: áudios até este tamanho podem ser decodificados em lote
+JANELA_WHISPER_SEGUNDOS = 30
+# Áudios por lote na decodificação em lote (limitado pela memória da GPU)
+WHISPER_LOTE = int(os.getenv("WHISPER_LOTE", "8"))
+
+# ============================================
+# FUNÇÕES AUXILIARES PIPER
+# ============================================
+
+def download_piper_model():
+    """Baixa o modelo Piper se não existir"""
+    PIPER_MODELS_DIR.mkdir(exist_ok=True)
+    if not PIPER_MODEL_PATH.exists():
+        print("📥 Baixando modelo Piper alemão...")
+
+        # Baixar modelo
+        response = requests.get(PIPER_MODEL_URL, stream=True)
+        with open(PIPER_MODEL_PATH, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=8192):
+                f.write(chunk)
+        print("✓ Modelo baixado")
+
+        # Baixar config
+        response = requests.get(PIPER_CONFIG_URL)
+        with open(PIPER_CONFIG_PATH, 'wb') as f:
+            f.write(response.content)
+        print("✓ Configuração baixada")
+    else:
+        print("✓ Modelo Piper já existe")
+
+def get_piper_executable():
+    """Encontra o executável do Piper no sistema"""
+    # Caminho explícito tem prioridade (ex.: Piper simulado no benchmark)
+    piper_env = os.getenv("PIPER_EXECUTABLE")
+    if piper_env:
+        if Path(piper_env).is_file():
+            return str(Path(piper_env).absolute())
+        raise FileNotFoundError(f"❌ PIPER_EXECUTABLE não encontrado: {piper_env}")
+
+    # Possíveis localizações no Windows
+    possible_paths = [
+        "piper\\piper.exe",  # Diretório local (extraído do ZIP)
+        "piper.exe",  # No PATH
+        str(Path("venv") / "Scripts" / "piper.exe"),
+        str(Path.cwd() / "piper" / "piper.exe"),
+    ]
+
+    for path in possible_paths:
+        path_obj = Path(path)
+        if path_obj.exists() and path_obj.is_file():
+            print(f"✓ Piper encontrado em: {path_obj.absolute()}")
+            return str(path_obj.absolute())
+
+    # Tentar encontrar no PATH do sistema
+    try:
+        result = subprocess.run(
+            ["where", "piper.exe"] if os.name == "nt" else ["which", "piper"],
+            capture_output=True,
+            text=True
+        )
+        if result.returncode == 0:
+            piper_path = result.stdout.strip().split('\n')[0]
+            print(f"✓ Piper encontrado no PATH: {piper_path}")
+            return piper_path
+    except Exception:
+        pass
+
+    raise FileNotFoundError(
+        "❌ Piper não encontrado!\n"
+        "Opções:\n"
+        "1. Execute setup_windows.bat para baixar automaticamente\n"
+        "2. Baixe manualmente de: https://github.com/rhasspy/piper/releases\n"
+        "3. Instale via pip: pip install piper-tts (e adicione ao PATH)"
+    )
+
+# ============================================
+# DECODIFICAÇÃO DE ÁUDIO
+# ============================================
+
+def decodificar_audio(caminho: str) -> np.ndarray:
+    """
+    Decodificar qualquer formato suportado pelo ffmpeg em PCM float32 mono 16 kHz
+    Equivalente a whisper.load_audio, sem exigir torch no processo HTTP
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0",
+        "-i", caminho,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(TAXA_AMOSTRAGEM),
+        "-",
+    ]
+    try:
+        saida = subprocess.run(cmd, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Falha ao decodificar áudio: {e.stderr.decode('utf-8', errors='ignore')}") from e
+    return np.frombuffer(saida, np.int16).flatten().astype(np.float32) / 32768.0
+
+# ============================================
+# CARGA DOS MOTORES
+# ============================================
+
+class CargaMotor:
+    """
+    Fila e execuções de um motor, com a duração média (EWMA) de cada execução
+    Base do endpoint /capacity: permite estimar quanto uma nova requisição vai esperar
+    """
+
+    # Peso da execução mais recente na média
+    SUAVIZACAO = 0.2
+
+    def __init__(self, vagas: Optional[int] = 1):
+        self.vagas = vagas  # Execuções simultâneas (None = sem limite, ex.: API remota)
+        self.na_fila = 0
+        self.em_execucao = 0
+        self.concluidas = 0
+        self.duracao_media: Optional[float] = None
+        self._trava = threading.Lock()
+
+    def entrar(self):
+        with self._trava:
+            self.na_fila += 1
+
+    def iniciar(self) -> float:
+        """Sair da fila e começar a executar; retorna o instante de início para sair()"""
+        with self._trava:
+            self.na_fila -= 1
+            self.em_execucao += 1
+        return time.perf_counter()
+
+    def sair(self, inicio: Optional[float]):
+        """Encerrar a execução iniciada em `inicio` (None = desistiu ainda na fila)"""
+        with self._trava:
+            if inicio is None:
+                self.na_fila -= 1
+                return
+            self.em_execucao -= 1
+            self.concluidas += 1
+            self.registrar_duracao(time.perf_counter() - inicio)
+
+    def registrar_duracao(self, duracao: float):
+        if self.duracao_media is None:
+            self.duracao_media = duracao
+        else:
+            self.duracao_media += self.SUAVIZACAO * (duracao - self.duracao_media)
+
+    def estado(self) -> Dict:
+        return estado_carga(self.na_fila, self.em_execucao, self.vagas, self.duracao_media, self.concluidas)
+
+
+def estado_carga(na_fila: int, em_execucao: int, vagas: Optional[int],
+                 duracao_media: Optional[float], concluidas: int) -> Dict:
+    """Resumo de carga com a espera estimada para uma nova requisição (segundos)"""
+    if vagas is None or em_execucao < vagas:
+        espera = 0.0
+    elif duracao_media is None:
+        espera = None  # Ainda sem execuções para estimar
+    else:
+        # Precisa esperar a fila inteira mais uma conclusão, com `vagas` execuções em paralelo
+        espera = (na_fila + 1) * duracao_media / vagas
+    return {
+        "na_fila": na_fila,
+        "em_execucao": em_execucao,
+        "vagas": vagas,
+        "concluidas": concluidas,
+        "duracao_media": round(duracao_media, 4) if duracao_media is not None else None,
+        "espera_estimada": round(espera, 4) if espera is not None else None,
+    }
+
+# ============================================
+# MOTORES
+# ============================================
+
+class ErroPiper(Exception):
+    """Falha na execução do Piper (mensagem = stderr do processo)"""
+
+
+class MotorWhisper:
+    """Transcrição local com Whisper"""
+
+    def __init__(self, modelo: str = WHISPER_MODEL, dispositivo: Optional[str] = WHISPER_DEVICE):
+        self.nome_modelo = modelo
+        self.dispositivo = dispositivo
+        self.modelo = None
+
+    def carregar(self):
+        import torch
+        import whisper
+
+        if not self.dispositivo:
+            self.dispositivo = "cuda" if torch.cuda.is_available() else "cpu"
+
+        self.modelo = whisper.load_model(self.nome_modelo, device=self.dispositivo)
+        print(f"✓ Whisper carregado ({self.nome_modelo} em {self.dispositivo})")
+
+        # Verificar VRAM disponível
+        if torch.cuda.is_available():
+            print(f"✓ GPU: {torch.cuda.get_device_name(0)}")
+            print(f"✓ VRAM disponível: {torch.cuda.get_device_properties(0).total_memory / 1e9:.2f} GB")
+
+    def configurar_threads(self, threads: int):
+        """Threads intra-op do torch (inter-op = 1), para não disputar núcleos com outros workers"""
+        import torch
+
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # Só pode ser definido antes do primeiro uso do pool inter-op
+
+    def transcrever(self, audio: np.ndarray, idioma: str = "de") -> Dict:
+        """Transcrever PCM float32 16 kHz; retorna text, language e segments"""
+        import torch
+
+        try:
+            result = self.modelo.transcribe(
+                audio,
+                language=idioma,
+                fp16=self.dispositivo == "cuda",  # Usar half-precision se rodando na GPU
+                task="transcribe",
+                verbose=False
+            )
+            return {
+                "text": result["text"].strip(),
+                "language": result.get("language", idioma),
+                "segments": [
+                    {
+                        "start": seg["start"],
+                        "end": seg["end"],
+                        "text": seg["text"]
+                    }
+                    for seg in result.get("segments", [])
+                ]
+            }
+        finally:
+            # Limpar cache CUDA
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def transcrever_lote(self, audios: List[np.ndarray], idioma: str = "de") -> List[Dict]:
+        """
+        Transcrever vários áudios de uma vez; retorna um resultado por áudio, na mesma ordem
+        Áudios de até 30 s passam juntos pelo modelo (um tensor com até WHISPER_LOTE mels);
+        os mais longos usam transcrever(). Um áudio que falha vira {"erro": ...} sem afetar os outros
+        """
+        resultados: List[Optional[Dict]] = [None] * len(audios)
+        curtos = [i for i, audio in enumerate(audios) if len(audio) <= JANELA_WHISPER_SEGUNDOS * TAXA_AMOSTRAGEM]
+        for inicio in range(0, len(curtos), WHISPER_LOTE):
+            grupo = curtos[inicio:inicio + WHISPER_LOTE]
+            try:
+                for i, resultado in zip(grupo, self._decodificar_lote([audios[i] for i in grupo], idioma)):
+                    resultados[i] = resultado
+            except Exception as e:
+                print(f"⚠️ Lote do Whisper falhou ({e}); transcrevendo um a um")
+
+        for i, audio in enumerate(audios):
+            if resultados[i] is None:
+                try:
+                    resultados[i] = self.transcrever(audio, idioma)
+                except Exception as e:
+                    resultados[i] = {"erro": f"{type(e).__name__}: {e}"}
+        return resultados
+
+    def _decodificar_lote(self, audios: List[np.ndarray], idioma: str) -> List[Dict]:
+        """Uma passada de whisper.decode sobre os mels empilhados (sem o fallback de temperatura)"""
+        import torch
+        import whisper
+        from whisper.tokenizer import get_tokenizer
+
+        try:
+            mels = torch.stack([
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(audio)), self.modelo.dims.n_mels)
+                for audio in audios
+            ]).to(self.modelo.device)
+            opcoes = whisper.DecodingOptions(language=idioma, task="transcribe", fp16=self.dispositivo == "cuda")
+            decodificados = whisper.decode(self.modelo, mels, opcoes)
+        finally:
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+        tokenizer = get_tokenizer(
+            self.modelo.is_multilingual,
+            num_languages=getattr(self.modelo, "num_languages", 99),
+            language=idioma,
+            task="transcribe",
+        )
+        return [
+            {
+                "text": resultado.text.strip(),
+                "language": resultado.language or idioma,
+                "segments": self._segmentos(resultado.tokens, tokenizer, len(audio) / TAXA_AMOSTRAGEM),
+            }
+            for audio, resultado in zip(audios, decodificados)
+        ]
+
+    @staticmethod
+    def _segmentos(tokens: List[int], tokenizer, duracao: float) -> List[Dict]:
+        """Segmentos a partir dos pares de timestamps (<|0.00|> texto <|2.40|>) dos tokens"""
+        segmentos, texto, inicio, ultimo = [], [], None, 0.0
+        for token in tokens:
+            if token < tokenizer.timestamp_begin:
+                texto.append(token)
+                continue
+            instante = min((token - tokenizer.timestamp_begin) * 0.02, duracao)
+            if inicio is None:
+                inicio = instante
+            else:
+                if texto:
+                    segmentos.append({"start": inicio, "end": instante, "text": tokenizer.decode(texto)})
+                texto, inicio, ultimo = [], None, instante
+        if texto:
+            # Texto final sem timestamp de fim: vai até o fim do áudio
+            segmentos.append({"start": ultimo if inicio is None else inicio, "end": duracao,
+                              "text": tokenizer.decode(texto)})
+        return segmentos
+
+    def info(self) -> Dict:
+        import torch
+        return {
+            "modelo": self.nome_modelo,
+            "dispositivo": self.dispositivo,
+            "gpu": torch.cuda.is_available(),
+            "carregado": self.modelo is not None,
+        }
+
+    def memoria(self) -> Dict:
+        import torch
+        return memoria.estatisticas_torch(torch)
+
+
+class MotorPiper:
+    """Síntese de voz com o executável do Piper"""
+
+    def __init__(self):
+        self.executavel: Optional[str] = None
+
+    def carregar(self):
+        # Baixar modelo Piper se necessário
+        try:
+            download_piper_model()
+            self.executavel = get_piper_executable()
+            print(f"✓ Piper executável: {self.executavel}")
+        except Exception as e:
+            print(f"⚠️ Aviso Piper: {e}")
+            self.executavel = None
+
+    @property
+    def disponivel(self) -> bool:
+        return self.executavel is not None
+
+    def configurar_threads(self, threads: int):
+        pass  # Cada frase é um processo do Piper, que herda a afinidade de núcleos de quem o cria
+
+    def precarregar(self, vozes: List[str]) -> List[str]:
+        # Cada execução carrega o modelo: nada a pré-carregar, só validar
+        for voz in vozes:
+            modelo_da_voz(PIPER_VOZES, voz)
+        return []
+
+    def sintetizar(self, texto: str, length_scale: float = 1.0, voz: str = PIPER_VOZ_PADRAO) -> bytes:
+        """Sintetizar `texto` com a voz `voz` e devolver o WAV gerado"""
+        modelo = modelo_da_voz(PIPER_VOZES, voz)
+        # Criar arquivo temporário para o áudio
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
+            output_path = temp_file.name
+
+        # Executar Piper via linha de comando com length-scale
+        cmd = [
+            self.executavel,
+            "--model", str(modelo.modelo),
+            "--config", str(modelo.config),
+            "--output_file", output_path,
+            "--length_scale", str(length_scale)  # Controle de velocidade
+        ]
+
+        try:
+            subprocess.run(
+                cmd,
+                input=texto.encode('utf-8'),
+                capture_output=True,
+                check=True
+            )
+
+            # Verificar se o arquivo foi criado
+            if not Path(output_path).exists() or Path(output_path).stat().st_size == 0:
+                raise ErroPiper("Arquivo de áudio não foi gerado")
+
+            with open(output_path, "rb") as audio_file:
+                return audio_file.read()
+
+        except subprocess.CalledProcessError as e:
+            print(f"Erro ao executar Piper: {e}")
+            print(f"STDOUT: {e.stdout.decode('utf-8', errors='ignore')}")
+            print(f"STDERR: {e.stderr.decode('utf-8', errors='ignore')}")
+            raise ErroPiper(e.stderr.decode('utf-8', errors='ignore')) from e
+
+        finally:
+            # Limpar arquivo temporário
+            if Path(output_path).exists():
+                os.unlink(output_path)
+
+    def info(self) -> Dict:
+        return {
+            "modelo": PIPER_VOZES[PIPER_VOZ_PADRAO].id,
+            "disponivel": self.disponivel,
+            "modo": "executavel",
+            "vozes": {nome: modelo.id for nome, modelo in PIPER_VOZES.items()},
+        }
+
+
+class _FrasePendente:
+    __slots__ = ("ids", "length_scale", "pronta", "audio", "erro")
+
+    def __init__(self, ids: List[int], length_scale: float):
+        self.ids = ids
+        self.length_scale = length_scale
+        self.pronta = threading.Event()
+        self.audio: Optional[np.ndarray] = None
+        self.erro: Optional[BaseException] = None
+
+
+def aparar_silencio_final(audio: np.ndarray, limiar: float = 1e-3, margem: int = 256) -> np.ndarray:
+    """Cortar o fim quase nulo (enchimento do lote), mantendo `margem` amostras após o último som"""
+    sons = np.flatnonzero(np.abs(audio) > limiar * max(float(np.max(np.abs(audio))), 1e-8))
+    if not sons.size:
+        return audio[:0]
+    return audio[:min(sons[-1] + 1 + margem, len(audio))]
+
+
+class LoteadorPiper:
+    """
+    Junta frases pendentes numa única inferência do VITS (IDs preenchidos até a maior frase)
+
+    O modelo exportado pelo Piper recebe um só vetor de escalas por execução, então o lote
+    reúne frases com o mesmo length_scale. Ele também não devolve o tamanho de cada áudio:
+    se o modelo tiver a saída de alinhamento (amostras por fonema), o áudio é cortado no
+    tamanho exato; senão, o enchimento no fim de cada item é aparado como silêncio
+    """
+
+    def __init__(self, voz, maximo: int = PIPER_LOTE, janela: float = PIPER_LOTE_JANELA_MS / 1000):
+        self.voz = voz
+        self.maximo = maximo
+        self.janela = janela
+        self._pendentes: List[_FrasePendente] = []
+        self._condicao = threading.Condition()
+        self._fechado = False
+        self.lotes = 0
+        self.frases = 0
+        threading.Thread(target=self._laco, daemon=True, name="piper-lote").start()
+
+    def sintetizar(self, ids_frases: List[List[int]], length_scale: float) -> List[np.ndarray]:
+        """Áudio (float) de cada frase, na ordem de `ids_frases`"""
+        frases = [_FrasePendente(ids, length_scale) for ids in ids_frases]
+        with self._condicao:
+            fechado = self._fechado
+            if not fechado:
+                self._pendentes.extend(frases)
+                self._condicao.notify()
+        if fechado:
+            # Voz descarregada depois que a síntese já a tinha obtido: inferência direta, fora da trava
+            return [self._inferir([frase])[0] for frase in frases]
+        for frase in frases:
+            frase.pronta.wait()
+            if frase.erro is not None:
+                raise frase.erro
+        return [frase.audio for frase in frases]
+
+    def fechar(self):
+        """Encerrar a thread depois de atender as frases já pendentes"""
+        with self._condicao:
+            self._fechado = True
+            self._condicao.notify()
+
+    def _proximo_lote(self) -> Optional[List[_FrasePendente]]:
+        with self._condicao:
+            while not self._pendentes:
+                if self._fechado:
+                    return None
+                self._condicao.wait()
+            # Janela curta para outras requisições chegarem (a não ser que o lote já esteja cheio)
+            limite = time.monotonic() + self.janela
+            while len(self._pendentes) < self.maximo and time.monotonic() < limite:
+                self._condicao.wait(limite - time.monotonic())
+            escala = self._pendentes[0].length_scale
+            lote = [frase for frase in self._pendentes if frase.length_scale == escala][:self.maximo]
+            self._pendentes = [frase for frase in self._pendentes if frase not in lote]
+            return lote
+
+    def _laco(self):
+        while True:
+            lote = self._proximo_lote()
+            if lote is None:
+                return
+            try:
+                for frase, audio in zip(lote, self._inferir(lote)):
+                    frase.audio = audio
+            except Exception as e:
+                for frase in lote:
+                    frase.erro = ErroPiper(f"Falha na inferência do Piper: {e}")
+            self.lotes += 1
+            self.frases += len(lote)
+            for frase in lote:
+                frase.pronta.set()
+
+    def _inferir(self, lote: List[_FrasePendente]) -> List[np.ndarray]:
+        config = self.voz.config
+        tamanhos = np.array([len(frase.ids) for frase in lote], dtype=np.int64)
+        ids = np.zeros((len(lote), int(tamanhos.max())), dtype=np.int64)  # 0 = PAD
+        for indice, frase in enumerate(lote):
+            ids[indice, :len(frase.ids)] = frase.ids
+        entradas = {
+            "input": ids,
+            "input_lengths": tamanhos,
+            "scales": np.array([config.noise_scale, lote[0].length_scale, config.noise_w_scale], dtype=np.float32),
+        }
+        if config.num_speakers > 1:
+            entradas["sid"] = np.full(len(lote), getattr(config, "default_speaker_id", 0), dtype=np.int64)
+
+        saidas = self.voz.session.run(None, entradas)
+        audios = saidas[0].reshape(len(lote), -1)
+        if len(lote) == 1:
+            return [audios[0]]
+        if len(saidas) > 1:
+            # Modelo com alinhamento: amostras por ID de fonema, somadas só até o tamanho real
+            amostras = saidas[1].reshape(len(lote), -1) * getattr(config, "hop_length", 256)
+            return [audios[i, :int(amostras[i, :tamanhos[i]].sum())] for i in range(len(lote))]
+        return [aparar_silencio_final(audio) for audio in audios]
+
+    def estado(self) -> Dict:
+        return {
+            "lotes": self.lotes,
+            "frases": self.frases,
+            "frases_por_lote": round(self.frases / self.lotes, 2) if self.lotes else None,
+        }
+
+
+class _VozOnnx:
+    """Uma voz carregada: sessão ONNX, lote e memória de fonemas do modelo"""
+
+    def __init__(self, modelo: ModeloVoz, threads: int):
+        import onnxruntime
+        from piper import PiperVoice
+        from piper.config import PiperConfig
+
+        with open(modelo.config, "r", encoding="utf-8") as arquivo:
+            config = PiperConfig.from_dict(json.load(arquivo))
+        opcoes = onnxruntime.SessionOptions()
+        # Sem arena, a memória das ativações volta ao sistema entre inferências: com várias
+        # vozes residentes, cada sessão ocupa perto do tamanho dos pesos, não o do maior pico
+        opcoes.enable_cpu_mem_arena = False
+        # O padrão do onnxruntime é um pool do tamanho da máquina inteira por sessão: com vários
+        # processos (workers pré-fork, pré-aquecimento) eles disputariam os mesmos núcleos
+        opcoes.intra_op_num_threads = threads
+        opcoes.inter_op_num_threads = 1
+        sessao = onnxruntime.InferenceSession(str(modelo.modelo), sess_options=opcoes,
+                                              providers=["CPUExecutionProvider"])
+        self.voz = PiperVoice(session=sessao, config=config)
+        self.loteador = LoteadorPiper(self.voz) if PIPER_LOTE > 1 else None
+        arquivo = Path(FONEMAS_CACHE_DIR) / f"{modelo.id}.db" if FONEMAS_CACHE_DIR else None
+        self.fonemas = MemoFonemas(arquivo, FONEMAS_MAX_FRASES, FONEMAS_MAX_PALAVRAS, FONEMAS_MONTAR_PALAVRAS)
+
+    def fechar(self):
+        if self.loteador:
+            self.loteador.fechar()
+
+    def estado(self) -> Dict:
+        return {
+            "fonemas": self.fonemas.estado(),
+            "lotes": self.loteador.estado() if self.loteador else None,
+        }
+
+
+class MotorPiperOnnx:
+    """
+    Síntese de voz no próprio processo (piper-tts + onnxruntime): sem criar processo nem
+    carregar o modelo a cada frase, com a fonemização memorizada (MemoFonemas) e uma
+    sessão por voz do registro, carregada no primeiro uso (RegistroVozes)
+    """
+
+    def __init__(self):
+        self.vozes: Optional[RegistroVozes] = None
+        self._pid = None
+        self._trava = threading.Lock()
+        self.threads = PIPER_ONNX_THREADS or nucleos_disponiveis()
+
+    def carregar(self):
+        try:
+            download_piper_model()
+            self._registro_do_processo()
+            print(f"✓ Piper em processo (onnxruntime): vozes {', '.join(PIPER_VOZES)}")
+        except Exception as e:
+            print(f"⚠️ Aviso Piper: {e}")
+            self.vozes = None
+
+    def _registro_do_processo(self) -> RegistroVozes:
+        # Sessões do onnxruntime e a thread do lote não sobrevivem bem ao fork:
+        # cada worker pré-fork carrega as suas vozes
+        with self._trava:
+            if self._pid != os.getpid():
+                threads = self.threads
+                self.vozes = RegistroVozes(PIPER_VOZES, lambda modelo: _VozOnnx(modelo, threads),
+                                           PIPER_VOZES_RESIDENTES)
+                self._pid = os.getpid()
+                self.vozes.precarregar(PIPER_VOZES_PRECARREGAR)
+            return self.vozes
+
+    @property
+    def disponivel(self) -> bool:
+        return self.vozes is not None
+
+    def configurar_threads(self, threads: int):
+        """Threads intra-op das sessões carregadas a partir de agora (ex.: num worker, antes do primeiro uso)"""
+        self.threads = PIPER_ONNX_THREADS or max(1, threads)
+
+    def precarregar(self, vozes: List[str]) -> List[str]:
+        return self._registro_do_processo().precarregar(vozes)
+
+    def sintetizar(self, texto: str, length_scale: float = 1.0, voz: str = PIPER_VOZ_PADRAO) -> bytes:
+        """Sintetizar `texto` com a voz `voz` e devolver o WAV gerado (uma inferência por frase ou lote)"""
+        from piper import SynthesisConfig
+
+        carregada = self._registro_do_processo().obter(voz)
+        ids_frases = carregada.fonemas.ids(texto, carregada.voz.phonemize, carregada.voz.phonemes_to_ids)
+        if carregada.loteador is not None:
+            audios = carregada.loteador.sintetizar(ids_frases, length_scale)
+        else:
+            configuracao = SynthesisConfig(length_scale=length_scale)
+            audios = [carregada.voz.phoneme_ids_to_audio(ids, configuracao) for ids in ids_frases]
+        partes = []
+        for audio in audios:
+            # Mesma normalização de PiperVoice.synthesize
+            pico = np.max(np.abs(audio)) if audio.size else 0.0
+            partes.append(audio / pico if pico > 1e-8 else np.zeros_like(audio))
+        if not partes:
+            raise ErroPiper("Texto sem fonemas para sintetizar")
+        return escrever_wav(np.concatenate(partes).astype(np.float32), carregada.voz.config.sample_rate)
+
+    def info(self) -> Dict:
+        return {
+            "modelo": PIPER_VOZES[PIPER_VOZ_PADRAO].id,
+            "disponivel": self.disponivel,
+            "modo": "onnx",
+            # Por modelo carregado: memória de fonemas e lotes
+            "vozes": self.vozes.estado() if self.vozes is not None else None,
+        }
+
+
+def criar_motor_piper():
+    """Motor do Piper conforme PIPER_MODO"""
+    if PIPER_MODO == "onnx":
+        return MotorPiperOnnx()
+    if PIPER_MODO != "executavel":
+        raise ValueError(f"PIPER_MODO inválido: {PIPER_MODO!r} (use executavel ou onnx)")
+    return MotorPiper()
@@ -0,0 +1,138 @@
+"""
+Perfilador por Amostragem
+Amostra periodicamente as pilhas das threads que trabalham para uma requisição
+e grava o resultado nos formatos speedscope (JSON) e collapsed stacks (flamegraph.pl)
+Sem dependências externas: usa sys._current_frames()
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+
+class PerfiladorAmostragem:
+    """Coleta amostras de pilha das threads registradas enquanto estiver ativo"""
+
+    def __init__(self, nome: str, intervalo: float = 0.005):
+        self.nome = nome
+        self.intervalo = intervalo
+        self.id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.amostras: Counter = Counter()
+        self.total_amostras = 0
+        self._threads = Counter()
+        self._trava = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self._inicio = None
+        self._fim = None
+
+    # ---------- Registro de threads ----------
+
+    def registrar(self, ident: int):
+        with self._trava:
+            self._threads[ident] += 1
+
+    def desregistrar(self, ident: int):
+        with self._trava:
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+
+    @contextmanager
+    def thread_atual(self):
+        """Incluir a thread corrente nas amostras durante o bloco"""
+        ident = threading.get_ident()
+        self.registrar(ident)
+        try:
+            yield
+        finally:
+            self.desregistrar(ident)
+
+    # ---------- Ciclo de vida ----------
+
+    def iniciar(self):
+        self._inicio = time.perf_counter()
+        self._thread = threading.Thread(target=self._amostrar, name=f"perfilador-{self.id}", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._thread:
+            self._thread.join()
+        self._fim = time.perf_counter()
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            quadros = sys._current_frames()
+            with self._trava:
+                idents = list(self._threads)
+            for ident in idents:
+                quadro = quadros.get(ident)
+                if quadro is None:
+                    continue
+                pilha = []
+                while quadro is not None:
+                    codigo = quadro.f_code
+                    pilha.append((codigo.co_name, codigo.co_filename, codigo.co_firstlineno))
+                    quadro = quadro.f_back
+                pilha.reverse()  # raiz -> folha
+                self.amostras[tuple(pilha)] += 1
+                self.total_amostras += 1
+
+    # ---------- Exportação ----------
+
+    def para_speedscope(self) -> dict:
+        """Perfil no formato 'sampled' do speedscope (https://www.speedscope.app)"""
+        indices = {}
+        quadros = []
+        amostras = []
+        pesos = []
+        for pilha, quantidade in self.amostras.items():
+            caminho = []
+            for nome, arquivo, linha in pilha:
+                chave = (nome, arquivo, linha)
+                if chave not in indices:
+                    indices[chave] = len(quadros)
+                    quadros.append({"name": f"{nome} ({os.path.basename(arquivo)}:{linha})", "file": arquivo, "line": linha})
+                caminho.append(indices[chave])
+            amostras.append(caminho)
+            pesos.append(quantidade * self.intervalo)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.nome,
+            "exporter": "servico_tts_e_stt",
+            "shared": {"frames": quadros},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.nome,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(pesos),
+                "samples": amostras,
+                "weights": pesos,
+            }],
+        }
+
+    def para_collapsed(self) -> str:
+        """Pilhas colapsadas ('a;b;c N'), entrada do flamegraph.pl e do speedscope"""
+        linhas = []
+        for pilha, quantidade in self.amostras.most_common():
+            nomes = ";".join(f"{nome} ({os.path.basename(arquivo)}:{linha})" for nome, arquivo, linha in pilha)
+            linhas.append(f"{nomes} {quantidade}")
+        return "\n".join(linhas) + "\n"
+
+    def salvar(self, diretorio: Path) -> Path:
+        """Gravar {id}.speedscope.json e {id}.collapsed.txt; retorna o caminho do JSON"""
+        diretorio.mkdir(parents=True, exist_ok=True)
+        caminho = diretorio / f"{self.id}.speedscope.json"
+        caminho.write_text(json.dumps(self.para_speedscope()), encoding="utf-8")
+        (diretorio / f"{self.id}.collapsed.txt").write_text(self.para_collapsed(), encoding="utf-8")
+        return caminho
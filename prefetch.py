@@ -0,0 +1,88 @@
+"""
+Fila de Pré-Geração (Prefetch)
+Dicas do cliente sobre as frases que ele vai pedir em seguida (ex.: as frases da lição que
+acabou de abrir), sintetizadas em segundo plano para que o pedido de verdade saia do cache
+
+A fila é limitada e as dicas envelhecem: cheia, descarta as mais antigas; uma dica que
+esperou mais que `validade` segundos (o motor ficou ocupado com pedidos de verdade) é
+descartada ao sair da fila em vez de ocupar o motor com uma frase que talvez ninguém peça mais
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+
+class FilaPrefetch:
+    """Dicas por chave de cache, da mais antiga para a mais recente, sem repetições"""
+
+    def __init__(self, limite: int, validade: float):
+        self.limite = limite
+        self.validade = validade
+        self._dicas: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._nova_dica = asyncio.Event()
+        self.recebidas = 0
+        self.descartadas = 0
+        self.vencidas = 0
+        # Resultado das dicas retiradas (contados por quem as processa)
+        self.geradas = 0
+        self.ja_em_cache = 0
+        self.falhas = 0
+
+    def __len__(self) -> int:
+        return len(self._dicas)
+
+    def contem(self, chave: str) -> bool:
+        return chave in self._dicas
+
+    def adicionar(self, chave: str, item: Any) -> int:
+        """Enfileirar a dica (se ainda não estiver na fila); retorna quantas antigas foram descartadas"""
+        if chave in self._dicas:
+            return 0
+        self._dicas[chave] = (item, time.monotonic())
+        self.recebidas += 1
+        descartadas = 0
+        while len(self._dicas) > self.limite:
+            self._dicas.popitem(last=False)
+            descartadas += 1
+        self.descartadas += descartadas
+        self._nova_dica.set()
+        return descartadas
+
+    def vencida(self, criada: float) -> bool:
+        return time.monotonic() - criada > self.validade
+
+    def retirar_vencidas(self) -> int:
+        """Descartar as dicas que passaram da validade"""
+        vencidas = 0
+        while self._dicas:
+            chave, (_, criada) = next(iter(self._dicas.items()))
+            if not self.vencida(criada):
+                break
+            del self._dicas[chave]
+            vencidas += 1
+        self.vencidas += vencidas
+        return vencidas
+
+    async def retirar(self) -> Tuple[str, Any, float]:
+        """Próxima dica ainda válida e o instante em que chegou (aguarda se a fila estiver vazia)"""
+        while True:
+            self.retirar_vencidas()
+            if self._dicas:
+                chave, (item, criada) = self._dicas.popitem(last=False)
+                return chave, item, criada
+            self._nova_dica.clear()
+            await self._nova_dica.wait()
+
+    def estado(self) -> Dict:
+        return {
+            "na_fila": len(self._dicas),
+            "limite": self.limite,
+            "recebidas": self.recebidas,
+            "descartadas": self.descartadas,
+            "vencidas": self.vencidas,
+            "geradas": self.geradas,
+            "ja_em_cache": self.ja_em_cache,
+            "falhas": self.falhas,
+        }
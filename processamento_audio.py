@@ -0,0 +1,122 @@
+"""
+Processamento de Áudio (PCM)
+Leitura e escrita de WAV e montagem de faixas a partir dos áudios gerados pelo Piper,
+em numpy e sem depender do ffmpeg
+"""
+
+import io
+import wave
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+def ler_wav(dados: bytes) -> Tuple[np.ndarray, int]:
+    """WAV PCM 16 bits -> (amostras int16 mono, taxa de amostragem)"""
+    with wave.open(io.BytesIO(dados), "rb") as arquivo:
+        if arquivo.getsampwidth() != 2:
+            raise ValueError(f"WAV com {arquivo.getsampwidth() * 8} bits; esperado 16")
+        taxa = arquivo.getframerate()
+        canais = arquivo.getnchannels()
+        pcm = np.frombuffer(arquivo.readframes(arquivo.getnframes()), dtype=np.int16)
+    if canais > 1:
+        pcm = pcm.reshape(-1, canais).mean(axis=1).astype(np.int16)
+    return pcm, taxa
+
+
+def escrever_wav(pcm: np.ndarray, taxa: int) -> bytes:
+    """Amostras mono (int16, ou float em [-1, 1]) -> WAV PCM 16 bits"""
+    if pcm.dtype != np.int16:
+        pcm = (np.clip(pcm, -1.0, 1.0) * 32767).astype(np.int16)
+    saida = io.BytesIO()
+    with wave.open(saida, "wb") as arquivo:
+        arquivo.setnchannels(1)
+        arquivo.setsampwidth(2)
+        arquivo.setframerate(taxa)
+        arquivo.writeframes(pcm.tobytes())
+    return saida.getvalue()
+
+
+def reamostrar(pcm: np.ndarray, origem: int, destino: int) -> np.ndarray:
+    """Reamostragem linear (suficiente para juntar vozes com taxas diferentes numa faixa)"""
+    if origem == destino:
+        return pcm
+    posicoes = np.arange(int(len(pcm) * destino / origem)) * (origem / destino)
+    return np.interp(posicoes, np.arange(len(pcm)), pcm.astype(np.float32)).astype(pcm.dtype)
+
+
+def concatenar_wavs(wavs: List[bytes], pausa: float = 0.0) -> Tuple[bytes, List[Dict]]:
+    """
+    Juntar os WAVs numa única faixa, com `pausa` segundos de silêncio entre eles
+    Retorna a faixa e o início/fim (s) de cada parte, na taxa do primeiro WAV
+    """
+    partes, limites = [], []
+    taxa = None
+    posicao = 0
+    for indice, dados in enumerate(wavs):
+        pcm, taxa_parte = ler_wav(dados)
+        taxa = taxa or taxa_parte
+        pcm = reamostrar(pcm, taxa_parte, taxa)
+        if indice and pausa > 0:
+            silencio = np.zeros(int(pausa * taxa), dtype=np.int16)
+            partes.append(silencio)
+            posicao += len(silencio)
+        partes.append(pcm)
+        limites.append({"start": round(posicao / taxa, 3), "end": round((posicao + len(pcm)) / taxa, 3)})
+        posicao += len(pcm)
+
+    pcm = np.concatenate(partes) if partes else np.zeros(0, dtype=np.int16)
+    return escrever_wav(pcm, taxa or 22050), limites
+
+
+def esticar_tempo(pcm: np.ndarray, taxa: int, fator: float) -> np.ndarray:
+    """
+    Mudar a velocidade da fala sem mudar o tom (WSOLA): `fator` 2.0 dura metade, 0.5 o dobro
+    Quadros de 30 ms são lidos a passos de `fator` x meio quadro e sobrepostos a passos de
+    meio quadro; cada um é deslocado até ±7,5 ms para o ponto mais parecido com a continuação
+    natural do anterior, o que evita os cliques e o eco de juntar ondas fora de fase
+
+    A escolha de cada quadro depende da do anterior, então a busca continua quadro a quadro;
+    a correlação é feita por FFT, com os espectros de todas as regiões de busca calculados de uma vez
+    """
+    if fator == 1.0:
+        return pcm
+    quadro = int(0.03 * taxa) // 2 * 2
+    passo = quadro // 2
+    tolerancia = quadro // 4
+    if len(pcm) < 2 * quadro:
+        return pcm
+
+    # Margem de silêncio nas pontas para a busca e a continuação nunca saírem do sinal; no início,
+    # mais meio quadro: o primeiro quadro começa antes do áudio e a rampa descartada é só silêncio
+    x = np.pad(pcm.astype(np.float32), (tolerancia + passo, quadro + passo + 2 * tolerancia))
+    n_saida = int(len(pcm) / fator)
+    n_quadros = (n_saida - 1) // passo + 2
+
+    # Início da região de busca (2 x tolerância + quadro) de cada quadro, em torno da posição ideal
+    ideais = tolerancia + np.round(np.arange(n_quadros) * passo * fator).astype(np.int64)
+    inicios = np.minimum(ideais, tolerancia + len(pcm)) - tolerancia
+    n_fft = 1 << int(np.ceil(np.log2(2 * tolerancia + 2 * quadro)))
+    espectros = np.fft.rfft(x[inicios[:, None] + np.arange(2 * tolerancia + quadro)], n_fft)
+
+    posicoes = np.empty(n_quadros, dtype=np.int64)
+    posicoes[0] = tolerancia
+    for k in range(1, n_quadros):
+        inicio = posicoes[k - 1] + passo
+        continuacao = np.fft.rfft(x[inicio:inicio + quadro], n_fft)
+        correlacao = np.fft.irfft(espectros[k] * continuacao.conj(), n_fft)[:2 * tolerancia + 1]
+        posicoes[k] = inicios[k] + int(np.argmax(correlacao))
+
+    # Janela de Hann periódica: com sobreposição de meio quadro, as janelas somam 1
+    janela = np.hanning(quadro + 1)[:-1].astype(np.float32)
+    quadros = x[posicoes[:, None] + np.arange(quadro)] * janela
+    saida = np.zeros(n_quadros * passo + quadro, dtype=np.float32)
+    np.add.at(saida, np.arange(n_quadros)[:, None] * passo + np.arange(quadro), quadros)
+    saida = saida[passo:passo + n_saida]  # Descartar a rampa da primeira janela (antes do áudio)
+
+    return np.clip(saida, -32768, 32767).astype(np.int16)
+
+
+def esticar_wav(dados: bytes, fator: float) -> bytes:
+    pcm, taxa = ler_wav(dados)
+    return escrever_wav(esticar_tempo(pcm, taxa, fator), taxa)
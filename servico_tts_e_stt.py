@@ -5,23 +5,51 @@ Usando Piper-TTS para Python 3.13+
 COM CONTROLE DE VELOCIDADE DA FALA
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Request, Depends, Query
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
-import whisper
-import torch
-from typing import List, Dict, Optional
+from typing import Annotated, List, Dict, Optional, Tuple
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager, nullcontext
+from contextvars import ContextVar, copy_context
+import asyncio
+import hmac
+import io
+import json
+import random
+import re
+import threading
 import tempfile
+import zipfile
+import tracemalloc
+import time
 import os
 import base64
+import secrets
+import shutil
 import subprocess
-import json
-import wave
-import requests
+import sys
+from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
 from openai import OpenAI
+import requests
+from perfilador import PerfiladorAmostragem
+from motores import (
+    CargaMotor, MotorWhisper, PIPER_VOZES, PIPER_VOZ_PADRAO, criar_motor_piper, ErroPiper, PIPER_MODEL_PATH, TAXA_AMOSTRAGEM, WHISPER_LOTE, decodificar_audio,
+    vagas_piper
+)
+from servidor_modelos import ClienteModelos, interpretar_endereco
+from gateway import ErroGateway, Gateway, chave_audio, chave_tts
+from escalonador import EscalonadorAsync, PRIORIDADE_PADRAO, PRIORIDADES, PrazoEsgotado, validar_prioridade
+from coalescencia import ChamadasEmVoo
+from cache_tts import CacheAudio, chave_cache
+from prefetch import FilaPrefetch
+from vozes import VozDesconhecida, modelo_da_voz
+from processamento_audio import concatenar_wavs, esticar_wav
+from trabalhos import FilaTrabalhos, CONCLUIDO, FALHOU, FINAIS
+import memoria
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -31,7 +59,23 @@ SERVICE_PORT = int(os.getenv("SERVICE_PORT", "3015"))
 SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3005,http://localhost:5173,http://localhost:3010").split(",")
 
-app = FastAPI(title="Local LLM Service")
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    """Carregar os modelos (ou conectar ao servidor de modelos) ao iniciar cada worker"""
+    await run_in_threadpool(inicializar_motores)
+    tarefas = []
+    if fila_trabalhos:
+        tarefas = [asyncio.create_task(processar_fila_trabalhos()), asyncio.create_task(renovar_concessoes())]
+    if fila_prefetch is not None:
+        tarefas += [asyncio.create_task(processar_prefetch()) for _ in range(PREFETCH_CONCORRENCIA)]
+    definir_estado("pronto")
+    yield
+    for tarefa in tarefas:
+        tarefa.cancel()
+    if gateway:
+        gateway.parar()
+
+app = FastAPI(title="Local LLM Service", lifespan=ciclo_de_vida)
 
 # Configurar CORS para permitir requests do frontend
 app.add_middleware(
@@ -40,6 +84,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile-Id", "X-Gateway-Peer", "ETag"],
 )
 
 # ============================================
@@ -48,112 +93,789 @@ app.add_middleware(
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 MODELO_TRANSCRICAO_OPENAI = os.getenv("MODELO_TRANSCRICAO_OPENAI", "whisper-1")
+# Permite apontar para um servidor compatível (ex.: simulador do benchmark)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
 
 if OPENAI_API_KEY:
-    client_openai = OpenAI(api_key=OPENAI_API_KEY)
+    client_openai = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
 else:
     client_openai = None
 
 # ============================================
-# CONFIGURAÇÃO PIPER-TTS
+# MOTORES (LOCAIS OU NO SERVIDOR DE MODELOS)
 # ============================================
 
-# Diretório para modelos Piper
-PIPER_MODELS_DIR = Path("piper_models")
-PIPER_MODELS_DIR.mkdir(exist_ok=True)
+# Com MODEL_SERVER_ADDRESS definido, Whisper e Piper ficam no servidor_modelos.py
+# e este processo (ou cada worker HTTP) só decodifica, codifica e fala com a OpenAI
+MODEL_SERVER_ADDRESS = os.getenv("MODEL_SERVER_ADDRESS")
+MODEL_SERVER_AUTHKEY = os.getenv("MODEL_SERVER_AUTHKEY", "")
 
-# Configuração do modelo de voz alemã
-PIPER_MODEL_URL = "https://huggingface.co/rhasspy/piper-voices/resolve/main/de/de_DE/thorsten/medium/de_DE-thorsten-medium.onnx"
-PIPER_CONFIG_URL = "https://huggingface.co/rhasspy/piper-voices/resolve/main/de/de_DE/thorsten/medium/de_DE-thorsten-medium.onnx.json"
+# Workers HTTP do uvicorn; acima de 1 os modelos passam para o servidor de modelos
+HTTP_WORKERS = int(os.getenv("HTTP_WORKERS", "1"))
+# Workers de inferência pré-fork no servidor de modelos (0 = desligado; ver servidor_modelos.py)
+MODEL_SERVER_WORKERS = int(os.getenv("MODEL_SERVER_WORKERS", "0"))
 
-PIPER_MODEL_PATH = PIPER_MODELS_DIR / "de_DE-thorsten-medium.onnx"
-PIPER_CONFIG_PATH = PIPER_MODELS_DIR / "de_DE-thorsten-medium.onnx.json"
+# Preenchidos na inicialização (ver ciclo_de_vida)
+motor_stt = None
+motor_tts = None
 
 # ============================================
-# FUNÇÕES AUXILIARES PIPER
+# MODO GATEWAY
 # ============================================
 
-def download_piper_model():
-    """Baixa o modelo Piper se não existir"""
-    if not PIPER_MODEL_PATH.exists():
-        print("📥 Baixando modelo Piper alemão...")
-        
-        # Baixar modelo
-        response = requests.get(PIPER_MODEL_URL, stream=True)
-        with open(PIPER_MODEL_PATH, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        print("✓ Modelo baixado")
-        
-        # Baixar config
-        response = requests.get(PIPER_CONFIG_URL)
-        with open(PIPER_CONFIG_PATH, 'wb') as f:
-            f.write(response.content)
-        print("✓ Configuração baixada")
+# Com GATEWAY_PEERS definido, esta instância não carrega modelos: encaminha TTS e
+# transcrição local para as instâncias listadas (ver gateway.py)
+GATEWAY_PEERS = [url.strip() for url in os.getenv("GATEWAY_PEERS", "").split(",") if url.strip()]
+# Intervalo entre consultas a /capacity de cada peer
+GATEWAY_INTERVALO = float(os.getenv("GATEWAY_INTERVALO", "1.0"))
+# Segundos de espera a mais aceitos para manter o peer do hash (e o cache dele)
+GATEWAY_TOLERANCIA = float(os.getenv("GATEWAY_TOLERANCIA", "1.0"))
+GATEWAY_TIMEOUT = float(os.getenv("GATEWAY_TIMEOUT", "300"))
+
+gateway = Gateway(
+    GATEWAY_PEERS,
+    intervalo=GATEWAY_INTERVALO,
+    tolerancia=GATEWAY_TOLERANCIA,
+    timeout=GATEWAY_TIMEOUT,
+) if GATEWAY_PEERS else None
+
+def inicializar_motores():
+    """Carregar os modelos neste processo ou conectar ao servidor de modelos"""
+    global motor_stt, motor_tts
+
+    if gateway:
+        gateway.iniciar()
+        return
+
+    if MODEL_SERVER_ADDRESS:
+        print(f"🔗 Conectando ao servidor de modelos em {MODEL_SERVER_ADDRESS}...")
+        cliente = ClienteModelos(
+            interpretar_endereco(MODEL_SERVER_ADDRESS),
+            MODEL_SERVER_AUTHKEY.encode("utf-8"),
+            ao_esperar=registrar_espera_remota,
+            prioridade=prioridade_atual,
+            prazo=tempo_restante,
+        )
+        cliente.aguardar()
+        motor_stt = motor_tts = cliente
+        print("✓ Servidor de modelos conectado")
+        return
+
+    print("Carregando modelos...")
+    motor_tts = criar_motor_piper()
+    motor_tts.carregar()
+    motor_stt = MotorWhisper()
+    motor_stt.carregar()
+
+def info_motores() -> Dict:
+    """Informações dos motores no formato {"whisper": {...}, "piper": {...}}"""
+    if MODEL_SERVER_ADDRESS:
+        return motor_stt.info()
+    return {"whisper": motor_stt.info(), "piper": motor_tts.info()}
+
+# ============================================
+# CONCORRÊNCIA DOS MOTORES
+# ============================================
+
+# A vez em cada motor é dada por prioridade (interactive, normal, bulk; ver escalonador.py),
+# escolhida pelo cabeçalho X-Priority ou pela rota
+
+# O modelo Whisper não é thread-safe: uma transcrição por vez
+escalonador_whisper = EscalonadorAsync(1)
+
+# Piper roda como subprocesso, então algumas execuções simultâneas são aceitáveis
+# (em processo e com lote, ao menos PIPER_LOTE, para requisições simultâneas dividirem a inferência)
+PIPER_CONCORRENCIA = vagas_piper(int(os.getenv("PIPER_CONCORRENCIA", "2")))
+escalonador_piper = EscalonadorAsync(PIPER_CONCORRENCIA)
+
+# Com servidor de modelos, a fila fica lá (a espera chega via registrar_espera_remota)
+if MODEL_SERVER_ADDRESS:
+    escalonador_whisper = escalonador_piper = None
+
+_prioridade_atual: ContextVar[str] = ContextVar("prioridade_atual", default=PRIORIDADE_PADRAO)
+
+# Execução compartilhada por requisições idênticas (ver coalescer) em que a tarefa atual roda
+_compartilhada_atual: ContextVar[Optional["ExecucaoCompartilhada"]] = ContextVar("compartilhada_atual", default=None)
+
+def prioridade_atual() -> str:
+    """Prioridade da requisição (ou tarefa de fundo) em execução"""
+    compartilhada = _compartilhada_atual.get()
+    if compartilhada is not None:
+        return compartilhada.prioridade
+    return _prioridade_atual.get()
+
+# Prazo da requisição (time.monotonic), pelo cabeçalho X-Request-Timeout; None = sem prazo
+_prazo_atual: ContextVar[Optional[float]] = ContextVar("prazo_atual", default=None)
+
+def tempo_restante() -> Optional[float]:
+    """Segundos até o prazo da requisição atual (None = sem prazo)"""
+    prazo = _prazo_atual.get()
+    return None if prazo is None else prazo - time.monotonic()
+
+# Fila e execuções de cada motor neste processo (ver /capacity)
+cargas_motores = {
+    "whisper": CargaMotor(1),
+    "piper": CargaMotor(PIPER_CONCORRENCIA),
+    "openai": CargaMotor(None),
+}
+
+# ============================================
+# PRONTIDÃO E CAPACIDADE
+# ============================================
+
+# Estados do nó: iniciando -> pronto <-> drenando | recarregando
+# Fora de "pronto", /ready responde 503 para o balanceador tirar o nó de rotação
+ESTADO_NO = "iniciando"
+# Tempo máximo esperando os motores esvaziarem antes de recarregar os modelos
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "120"))
+
+# Requisições /api em andamento neste processo
+requisicoes_em_andamento = 0
+
+def definir_estado(estado: str):
+    global ESTADO_NO
+    ESTADO_NO = estado
+    print(f"🚦 Estado do nó: {estado}")
+
+def motores_ociosos() -> bool:
+    """Nenhuma requisição de Whisper ou Piper na fila ou em execução neste processo"""
+    return all(
+        cargas_motores[nome].na_fila + cargas_motores[nome].em_execucao == 0
+        for nome in ("whisper", "piper")
+    )
+
+# ============================================
+# MEDIÇÃO DE ETAPAS (Server-Timing)
+# ============================================
+
+# Etapas reportadas no cabeçalho Server-Timing:
+# - queue: espera pela vez no motor (Whisper/Piper)
+# - decode: leitura do upload e decodificação do áudio
+# - inference: execução do modelo
+# - encode: montagem da resposta (base64/JSON)
+# - remote: ida e volta até a OpenAI
+# - gateway: rede e repasse até o peer (modo gateway; as etapas do peer aparecem à parte)
+# - coalesced: espera pelo resultado de uma requisição idêntica já em execução
+# - cache: consulta ao cache de áudio do TTS
+# - stretch: mudança de velocidade da versão 1.0x (speed_mode=stretch)
+#
+# Com o tracemalloc ativo (/admin/memory/tracemalloc ou PYTHONTRACEMALLOC=1), cada etapa
+# também registra o pico de alocação. O pico do tracemalloc é global ao processo, então
+# com requisições simultâneas o valor é um limite superior, não uma medida exata.
+
+# Maior alocação observada em cada etapa de cada rota
+picos_etapas = memoria.PicosPorEtapa()
+snapshots_memoria = memoria.GerenciadorSnapshots()
+
+class MedidorEtapas:
+    """Acumula a duração (e o pico de memória, se rastreado) de cada etapa de uma requisição"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.duracoes: Dict[str, float] = {}
+        self.picos: Dict[str, int] = {}
+
+    @contextmanager
+    def etapa(self, nome: str):
+        rastreando = tracemalloc.is_tracing()
+        if rastreando:
+            memoria_antes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.duracoes[nome] = self.duracoes.get(nome, 0.0) + time.perf_counter() - inicio
+            if rastreando:
+                pico = tracemalloc.get_traced_memory()[1] - memoria_antes
+                self.picos[nome] = max(self.picos.get(nome, 0), pico)
+
+    def transferir(self, origem: str, destino: str, duracao: float):
+        """Reclassificar parte de uma etapa (ex.: espera remota contada dentro de 'inference')"""
+        self.duracoes[origem] = self.duracoes.get(origem, 0.0) - duracao
+        self.duracoes[destino] = self.duracoes.get(destino, 0.0) + duracao
+
+    def incorporar(self, cabecalho: str, origem: str):
+        """Trazer as etapas do Server-Timing de outro serviço para dentro de `origem` (ex.: peer do gateway)"""
+        for parte in cabecalho.split(","):
+            nome, _, parametros = parte.strip().partition(";")
+            if not nome or nome == "total" or not parametros.startswith("dur="):
+                continue
+            try:
+                self.transferir(origem, nome, float(parametros[4:]) / 1000)
+            except ValueError:
+                continue
+
+    def server_timing(self) -> str:
+        """Formata as durações (em ms) no padrão do cabeçalho Server-Timing"""
+        partes = [f"{nome};dur={duracao * 1000:.1f}" for nome, duracao in self.duracoes.items()]
+        partes.append(f"total;dur={(time.perf_counter() - self.inicio) * 1000:.1f}")
+        return ", ".join(partes)
+
+_medidor_atual: ContextVar[Optional[MedidorEtapas]] = ContextVar("medidor_atual", default=None)
+
+def medir_etapa(nome: str):
+    """Mede uma etapa da requisição atual (no-op fora de uma requisição)"""
+    medidor = _medidor_atual.get()
+    if medidor is None:
+        return nullcontext()
+    return medidor.etapa(nome)
+
+def registrar_espera_remota(espera: float):
+    """Espera na fila do servidor de modelos: sai de 'inference' e entra em 'queue'"""
+    medidor = _medidor_atual.get()
+    if medidor is not None:
+        medidor.transferir("inference", "queue", espera)
+
+@asynccontextmanager
+async def aguardar_vez(escalonador: Optional[EscalonadorAsync], carga: CargaMotor):
+    """Aguarda a vez no motor (pela prioridade atual), medindo a espera como etapa 'queue' e contabilizando a carga"""
+    # Com prazo, só vale começar se ainda der tempo de terminar (pela duração média do motor)
+    prazo = _prazo_atual.get()
+    if prazo is not None:
+        prazo -= carga.duracao_media or 0.0
+    carga.entrar()
+    execucao = None
+    try:
+        if escalonador is None:
+            if prazo is not None and time.monotonic() >= prazo:
+                raise PrazoEsgotado("Prazo insuficiente para executar")
+            execucao = carga.iniciar()
+            yield
+            return
+        with medir_etapa("queue"):
+            await escalonador.adquirir(prioridade_atual(), prazo, dono=_compartilhada_atual.get())
+        try:
+            execucao = carga.iniciar()
+            yield
+        finally:
+            escalonador.liberar()
+    finally:
+        carga.sair(execucao)
+
+# ============================================
+# CANCELAMENTO (CLIENTE DESCONECTADO OU PRAZO ESGOTADO)
+# ============================================
+
+class ClienteDesconectado(Exception):
+    """O cliente fechou a conexão antes da resposta"""
+
+async def aguardar_desconexao(conexao: Request):
+    """Retorna quando o cliente desconectar (chamar só depois de ler o corpo da requisição)"""
+    # Request.is_disconnected() não enxerga a desconexão através dos middlewares HTTP;
+    # esperar a próxima mensagem do receive enxerga
+    while (await conexao.receive())["type"] != "http.disconnect":
+        pass
+
+async def enquanto_necessaria(conexao: Request, trabalho):
+    """
+    Executar a corrotina `trabalho` cancelando-a se o cliente desconectar ou o prazo esgotar
+    Na fila, o cancelamento é imediato; uma inferência em andamento termina a chamada atual
+    do motor (o trecho atual, em transcrições longas) e não começa a próxima
+    """
+    tarefa = asyncio.ensure_future(trabalho)
+    # Se a tarefa falhar depois de abandonada, ninguém mais lê a exceção
+    tarefa.add_done_callback(lambda t: t.cancelled() or t.exception())
+    desconexao = asyncio.ensure_future(aguardar_desconexao(conexao))
+    try:
+        concluidas, _ = await asyncio.wait({tarefa, desconexao}, timeout=tempo_restante(),
+                                           return_when=asyncio.FIRST_COMPLETED)
+        if tarefa in concluidas:
+            return tarefa.result()
+        if desconexao in concluidas:
+            print(f"⏹️ Cliente desconectou: cancelando {conexao.url.path}")
+            raise ClienteDesconectado()
+        print(f"⏹️ Prazo esgotado: cancelando {conexao.url.path}")
+        raise PrazoEsgotado("Prazo da requisição esgotado")
+    finally:
+        desconexao.cancel()
+        if not tarefa.done():
+            tarefa.cancel()
+
+@app.exception_handler(PrazoEsgotado)
+async def responder_prazo_esgotado(request: Request, exc: PrazoEsgotado):
+    return JSONResponse({"detail": str(exc)}, status_code=504)
+
+@app.exception_handler(VozDesconhecida)
+async def responder_voz_desconhecida(request: Request, exc: VozDesconhecida):
+    return JSONResponse({"detail": str(exc)}, status_code=400)
+
+@app.exception_handler(ClienteDesconectado)
+async def responder_cliente_desconectado(request: Request, exc: ClienteDesconectado):
+    # Ninguém vai ler esta resposta; 499 só aparece nos logs
+    return Response(status_code=499)
+
+# ============================================
+# COALESCÊNCIA DE REQUISIÇÕES IDÊNTICAS
+# ============================================
+
+# Requisições idênticas simultâneas (mesmo texto/velocidade/voz ou mesmo áudio/opções)
+# compartilham uma única execução do motor
+COALESCENCIA = os.getenv("COALESCENCIA", "1") != "0"
+chamadas_em_voo = ChamadasEmVoo()
+
+class ExecucaoCompartilhada:
+    """A execução coalescida roda com a maior prioridade entre as requisições que a aguardam"""
+
+    __slots__ = ("prioridade",)
+
+    def __init__(self, prioridade: str):
+        self.prioridade = prioridade
+
+    def promover(self, prioridade: str):
+        if PRIORIDADES.index(prioridade) >= PRIORIDADES.index(self.prioridade):
+            return
+        self.prioridade = prioridade
+        # Se já estiver na fila de um motor, sobe de classe lá também
+        for escalonador in (escalonador_whisper, escalonador_piper):
+            if escalonador is not None:
+                escalonador.promover(self, prioridade)
+
+async def coalescer(chave: str, funcao, *args):
+    """
+    Executar `funcao(*args)` ou aguardar a execução idêntica em voo (etapa 'coalesced')
+    A execução não herda o prazo de quem a iniciou: cada requisição espera até o seu próprio
+    prazo, e a execução só é cancelada quando todas desistem
+    """
+    if not COALESCENCIA:
+        return await funcao(*args)
+    compartilhada = chamadas_em_voo.dados(chave)
+    contexto = None
+    if compartilhada is not None:
+        compartilhada.promover(prioridade_atual())
+        etapa = medir_etapa("coalesced")
     else:
-        print("✓ Modelo Piper já existe")
-
-def get_piper_executable():
-    """Encontra o executável do Piper no sistema"""
-    # Possíveis localizações no Windows
-    possible_paths = [
-        "piper\\piper.exe",  # Diretório local (extraído do ZIP)
-        "piper.exe",  # No PATH
-        str(Path("venv") / "Scripts" / "piper.exe"),
-        str(Path.cwd() / "piper" / "piper.exe"),
+        compartilhada = ExecucaoCompartilhada(prioridade_atual())
+        contexto = copy_context()
+        contexto.run(_prazo_atual.set, None)
+        contexto.run(_compartilhada_atual.set, compartilhada)
+        etapa = nullcontext()
+    with etapa:
+        resultado, _ = await chamadas_em_voo.executar(
+            chave, funcao, *args, prazo=_prazo_atual.get(), contexto=contexto, dados=compartilhada
+        )
+    return resultado
+
+# ============================================
+# CACHE DE ÁUDIO (TTS)
+# ============================================
+
+# Áudios gerados ficam em disco, por texto/voz/velocidade, e frases repetidas não voltam ao Piper
+# (no modo gateway o cache fica em cada peer; TTS_CACHE_MAX_MB=0 desativa). O subdiretório é o do
+# modelo padrão para todas as vozes: o modelo de cada uma já entra na chave (ver cache_tts)
+TTS_CACHE_DIR = Path(os.getenv("TTS_CACHE_DIR", "cache_tts"))
+TTS_CACHE_MAX_MB = float(os.getenv("TTS_CACHE_MAX_MB", "1024"))
+cache_tts = CacheAudio(
+    TTS_CACHE_DIR, PIPER_MODEL_PATH.stem, int(TTS_CACHE_MAX_MB * 1024 * 1024)
+) if TTS_CACHE_MAX_MB > 0 and not GATEWAY_PEERS else None
+
+# Como gerar velocidades diferentes de 1.0:
+# - resynthesis: o Piper gera de novo com length_scale = 1/velocidade (melhor qualidade)
+# - stretch: a versão 1.0x (do cache, ou gerada uma vez) é esticada/comprimida sem mudar o tom
+#   (WSOLA, ver processamento_audio.esticar_tempo), em milissegundos e sem passar pelo Piper
+# A requisição escolhe com speed_mode; TTS_MODO_VELOCIDADE é o padrão
+MODOS_VELOCIDADE = ("resynthesis", "stretch")
+TTS_MODO_VELOCIDADE = os.getenv("TTS_MODO_VELOCIDADE", "resynthesis")
+if TTS_MODO_VELOCIDADE not in MODOS_VELOCIDADE:
+    raise ValueError(f"TTS_MODO_VELOCIDADE inválido: {TTS_MODO_VELOCIDADE!r} (use {', '.join(MODOS_VELOCIDADE)})")
+
+def estica_velocidade(velocidade: float, modo: Optional[str]) -> bool:
+    return (modo or TTS_MODO_VELOCIDADE) == "stretch" and velocidade != 1.0
+
+async def guardar_no_cache(chave: str, audio_bytes: bytes) -> bytes:
+    if cache_tts is not None:
+        await run_in_threadpool(cache_tts.guardar, chave, audio_bytes)
+    return audio_bytes
+
+async def sintetizar_e_guardar(chave: str, texto: str, voz: str, velocidade: float) -> bytes:
+    return await guardar_no_cache(chave, await sintetizar_local(texto, voz, velocidade, 1.0 / velocidade))
+
+async def esticar_e_guardar(chave: str, texto: str, voz: str, velocidade: float) -> bytes:
+    base = await obter_audio_tts(texto, voz, 1.0)
+    with medir_etapa("stretch"):
+        audio_bytes = await run_in_threadpool(esticar_wav, base, velocidade)
+    return await guardar_no_cache(chave, audio_bytes)
+
+def chave_cache_tts(texto: str, voz: str, velocidade: float, modo: Optional[str] = None) -> str:
+    modelo = modelo_da_voz(PIPER_VOZES, voz).id
+    return chave_cache(texto, voz, modelo, velocidade, estica_velocidade(velocidade, modo))
+
+async def obter_audio_tts(texto: str, voz: str, velocidade: float, modo: Optional[str] = None) -> bytes:
+    """WAV do texto: do cache (etapa 'cache') ou do Piper, compartilhando execuções idênticas em voo"""
+    modelo_da_voz(PIPER_VOZES, voz)  # Voz fora do registro: 400 antes de qualquer trabalho
+    chave = chave_cache_tts(texto, voz, velocidade, modo)
+    if cache_tts is not None:
+        with medir_etapa("cache"):
+            audio_bytes = await run_in_threadpool(cache_tts.obter, chave)
+        if audio_bytes is not None:
+            return audio_bytes
+    return await gerar_audio_tts(chave, texto, voz, velocidade, modo)
+
+async def gerar_audio_tts(chave: str, texto: str, voz: str, velocidade: float, modo: Optional[str] = None) -> bytes:
+    if estica_velocidade(velocidade, modo):
+        return await coalescer("stretch|" + chave, esticar_e_guardar, chave, texto, voz, velocidade)
+    return await coalescer("piper|" + chave, sintetizar_e_guardar, chave, texto, voz, velocidade)
+
+async def garantir_audio_tts(texto: str, voz: str, velocidade: float, modo: Optional[str] = None) -> Tuple[str, str]:
+    """Chave e versão (sha256) do WAV no cache, gerando-o se preciso (já em cache, só é lido para o hash)"""
+    chave = chave_cache_tts(texto, voz, velocidade, modo)
+    with medir_etapa("cache"):
+        caminho = await run_in_threadpool(cache_tts.localizar, chave)
+        versao = await run_in_threadpool(cache_tts.versao, chave) if caminho is not None else None
+    if versao is None:
+        await gerar_audio_tts(chave, texto, voz, velocidade, modo)
+        versao = await run_in_threadpool(cache_tts.versao, chave)
+        if versao is None:
+            # Apagado por fora entre a gravação e o hash
+            raise HTTPException(status_code=503, detail="Áudio saiu do cache logo depois de gerado; tente de novo")
+    return chave, versao
+
+@app.middleware("http")
+async def definir_prioridade(request: Request, call_next):
+    """Prioridade da requisição pelo cabeçalho X-Priority (interactive, normal ou bulk)"""
+    cabecalho = request.headers.get("X-Priority")
+    if cabecalho is None:
+        return await call_next(request)
+    try:
+        prioridade = validar_prioridade(cabecalho)
+    except ValueError as e:
+        return JSONResponse({"detail": str(e)}, status_code=400)
+    token = _prioridade_atual.set(prioridade)
+    try:
+        return await call_next(request)
+    finally:
+        _prioridade_atual.reset(token)
+
+@app.middleware("http")
+async def definir_prazo(request: Request, call_next):
+    """Prazo da requisição pelo cabeçalho X-Request-Timeout (segundos a partir da chegada)"""
+    cabecalho = request.headers.get("X-Request-Timeout")
+    if cabecalho is None:
+        return await call_next(request)
+    try:
+        segundos = float(cabecalho)
+        if not segundos > 0:
+            raise ValueError
+    except ValueError:
+        return JSONResponse({"detail": f"X-Request-Timeout inválido: {cabecalho!r}"}, status_code=400)
+    token = _prazo_atual.set(time.monotonic() + segundos)
+    try:
+        return await call_next(request)
+    finally:
+        _prazo_atual.reset(token)
+
+@app.middleware("http")
+async def adicionar_server_timing(request: Request, call_next):
+    """Adiciona o cabeçalho Server-Timing com as etapas medidas em cada resposta"""
+    global requisicoes_em_andamento
+    medidor = MedidorEtapas()
+    token = _medidor_atual.set(medidor)
+    contar = request.url.path.startswith("/api/")
+    if contar:
+        requisicoes_em_andamento += 1
+    try:
+        response = await call_next(request)
+    finally:
+        _medidor_atual.reset(token)
+        if contar:
+            requisicoes_em_andamento -= 1
+    response.headers["Server-Timing"] = medidor.server_timing()
+    for nome, pico in medidor.picos.items():
+        picos_etapas.registrar(request.url.path, nome, pico)
+    return response
+
+# ============================================
+# PERFILAMENTO SOB DEMANDA
+# ============================================
+
+# Token exigido pelas rotas /admin e pelo cabeçalho X-Profile (sem token, ficam desativados)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+PROFILING_DIR = Path(os.getenv("PROFILING_DIR", "perfis"))
+# Fração das requisições /api perfiladas automaticamente (0 = só sob demanda)
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+
+_perfil_atual: ContextVar[Optional[PerfiladorAmostragem]] = ContextVar("perfil_atual", default=None)
+
+def token_admin_valido(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+def verificar_admin(request: Request):
+    """Dependência das rotas /admin: exige o cabeçalho X-Admin-Token"""
+    if not token_admin_valido(request.headers.get("X-Admin-Token")):
+        raise HTTPException(status_code=403, detail="Token de administração inválido ou não configurado")
+
+def deve_perfilar(request: Request) -> bool:
+    if not request.url.path.startswith("/api/"):
+        return False
+    if request.headers.get("X-Profile") == "1" and token_admin_valido(request.headers.get("X-Admin-Token")):
+        return True
+    return PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE
+
+async def executar_bloqueante(func, *args, **kwargs):
+    """Executar código bloqueante no threadpool, incluindo a thread no perfil ativo"""
+    perfil = _perfil_atual.get()
+    if perfil is None:
+        return await run_in_threadpool(func, *args, **kwargs)
+
+    def executar():
+        with perfil.thread_atual():
+            return func(*args, **kwargs)
+
+    return await run_in_threadpool(executar)
+
+@app.middleware("http")
+async def perfilar_requisicao(request: Request, call_next):
+    """Perfilar a requisição por amostragem quando pedido (X-Profile) ou sorteado"""
+    if not deve_perfilar(request):
+        return await call_next(request)
+
+    perfil = PerfiladorAmostragem(f"{request.method} {request.url.path}", PROFILING_INTERVAL_MS / 1000)
+    perfil.registrar(threading.get_ident())  # Thread do event loop (decode/encode)
+    token = _perfil_atual.set(perfil)
+    perfil.iniciar()
+    try:
+        response = await call_next(request)
+    finally:
+        perfil.parar()
+        _perfil_atual.reset(token)
+        await run_in_threadpool(perfil.salvar, PROFILING_DIR)
+        print(f"🔬 Perfil salvo: {perfil.id} ({perfil.total_amostras} amostras)")
+    response.headers["X-Profile-Id"] = perfil.id
+    return response
+
+# ============================================
+# TRABALHOS EM SEGUNDO PLANO
+# ============================================
+
+# Transcrições longas via /api/jobs: o upload vai para disco, o trabalho para uma fila
+# SQLite e é transcrito em trechos, cada um gravado ao terminar (ver trabalhos.py)
+JOBS_DIR = Path(os.getenv("JOBS_DIR", "trabalhos"))
+# Duração de cada trecho (30 s = janela nativa do Whisper)
+JOBS_TRECHO_SEGUNDOS = float(os.getenv("JOBS_TRECHO_SEGUNDOS", "30"))
+# Sem renovação por este tempo, o trabalho pode ser assumido por outro processo
+JOBS_CONCESSAO = float(os.getenv("JOBS_CONCESSAO", "30"))
+JOBS_CALLBACK_TENTATIVAS = int(os.getenv("JOBS_CALLBACK_TENTATIVAS", "3"))
+# 1 = devolver o Whisper entre trechos (requisições mais prioritárias passam à frente);
+# 0 = manter o Whisper durante o trabalho inteiro
+JOBS_PREEMPCAO = os.getenv("JOBS_PREEMPCAO", "1") != "0"
+# Trabalhos em segundo plano disputam os motores como bulk
+PRIORIDADE_TRABALHOS = "bulk"
+
+# Intervalo para procurar trabalhos criados por outros processos ou abandonados
+INTERVALO_FILA_TRABALHOS = 2.0
+
+# O gateway não transcreve: sem fila local
+fila_trabalhos = FilaTrabalhos(JOBS_DIR, JOBS_CONCESSAO) if not gateway else None
+novo_trabalho = asyncio.Event()
+
+def formatar_trabalho(trabalho: Dict) -> Dict:
+    """Representação pública de um trabalho (GET /api/jobs/{id} e callbacks)"""
+    def data(valor):
+        return datetime.fromtimestamp(valor).isoformat(timespec="seconds") if valor else None
+
+    duracao = trabalho["duracao"]
+    progresso = 1.0 if trabalho["estado"] == CONCLUIDO else (trabalho["processado"] / duracao if duracao else 0.0)
+    resposta = {
+        "id": trabalho["id"],
+        "status": trabalho["estado"],
+        "progress": round(min(progresso, 1.0), 4),
+        "duration": duracao,
+        "processed": trabalho["processado"],
+        "text": trabalho["texto"],
+        "language": trabalho["idioma"],
+        "error": trabalho["erro"],
+        "created": data(trabalho["criado"]),
+        "updated": data(trabalho["atualizado"]),
+    }
+    if trabalho["callback_url"]:
+        resposta["callback"] = {"url": trabalho["callback_url"], "status": trabalho["callback_estado"]}
+    if "segmentos" in trabalho:
+        resposta["segments"] = trabalho["segmentos"]
+    return resposta
+
+async def processar_fila_trabalhos():
+    """Laço em segundo plano: assume o próximo trabalho da fila e o transcreve"""
+    _prioridade_atual.set(PRIORIDADE_TRABALHOS)  # Vale só para esta tarefa
+    while True:
+        try:
+            trabalho = await run_in_threadpool(fila_trabalhos.assumir_proximo)
+        except Exception as e:
+            print(f"⚠️ Erro ao ler a fila de trabalhos: {e}")
+            trabalho = None
+
+        if trabalho is None:
+            novo_trabalho.clear()
+            try:
+                await asyncio.wait_for(novo_trabalho.wait(), timeout=INTERVALO_FILA_TRABALHOS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        await executar_trabalho(trabalho)
+
+async def renovar_concessoes():
+    """Manter a posse dos trabalhos deste processo enquanto ele estiver vivo"""
+    while True:
+        await asyncio.sleep(JOBS_CONCESSAO / 3)
+        try:
+            await run_in_threadpool(fila_trabalhos.renovar)
+        except Exception as e:
+            print(f"⚠️ Erro ao renovar trabalhos: {e}")
+
+def recortar_trecho(resultado: Dict, inicio: float, fim: float, duracao: float):
+    """
+    Segmentos (em tempo absoluto) e texto de um trecho transcrito, e o início do próximo trecho
+    O último segmento pode ter sido cortado no meio de uma palavra: se não for o fim do áudio,
+    ele é descartado e o próximo trecho começa no início dele
+    """
+    segmentos = resultado["segments"]
+    proximo = fim
+    if fim < duracao and len(segmentos) > 1 and segmentos[-1]["start"] >= 1.0:
+        proximo = inicio + segmentos[-1]["start"]
+        segmentos = segmentos[:-1]
+    segmentos = [
+        {"start": round(inicio + seg["start"], 3), "end": round(inicio + seg["end"], 3), "text": seg["text"]}
+        for seg in segmentos
     ]
-    
-    for path in possible_paths:
-        path_obj = Path(path)
-        if path_obj.exists() and path_obj.is_file():
-            print(f"✓ Piper encontrado em: {path_obj.absolute()}")
-            return str(path_obj.absolute())
-    
-    # Tentar encontrar no PATH do sistema
+    texto = "".join(seg["text"] for seg in segmentos).strip()
+    return segmentos, texto, proximo
+
+async def executar_trabalho(trabalho: Dict):
+    """Transcrever um trabalho trecho a trecho, continuando do último trecho gravado"""
+    trabalho_id = trabalho["id"]
     try:
-        result = subprocess.run(
-            ["where", "piper.exe"] if os.name == "nt" else ["which", "piper"],
-            capture_output=True,
-            text=True
-        )
-        if result.returncode == 0:
-            piper_path = result.stdout.strip().split('\n')[0]
-            print(f"✓ Piper encontrado no PATH: {piper_path}")
-            return piper_path
-    except Exception:
-        pass
-    
-    raise FileNotFoundError(
-        "❌ Piper não encontrado!\n"
-        "Opções:\n"
-        "1. Execute setup_windows.bat para baixar automaticamente\n"
-        "2. Baixe manualmente de: https://github.com/rhasspy/piper/releases\n"
-        "3. Instale via pip: pip install piper-tts (e adicione ao PATH)"
-    )
+        audio = await run_in_threadpool(decodificar_audio, trabalho["arquivo"])
+        duracao = len(audio) / TAXA_AMOSTRAGEM
+        await run_in_threadpool(fila_trabalhos.definir_duracao, trabalho_id, duracao)
+
+        trechos = await run_in_threadpool(fila_trabalhos.trechos, trabalho_id)
+        inicio = trechos[-1]["fim"] if trechos else 0.0
+        indice = len(trechos)
+        print(f"📋 Trabalho {trabalho_id}: {duracao:.0f}s de áudio, continuando de {inicio:.0f}s")
+
+        async with AsyncExitStack() as pilha:
+            if not JOBS_PREEMPCAO:
+                # Sem preempção: a vez no Whisper vale para o trabalho inteiro
+                await pilha.enter_async_context(aguardar_vez(escalonador_whisper, cargas_motores["whisper"]))
+
+            while duracao - inicio > 0.05:
+                if not await run_in_threadpool(fila_trabalhos.ainda_e_dono, trabalho_id):
+                    print(f"⏹️ Trabalho {trabalho_id} cancelado ou assumido por outro processo")
+                    return
+
+                fim = min(inicio + JOBS_TRECHO_SEGUNDOS, duracao)
+                trecho = audio[int(inicio * TAXA_AMOSTRAGEM):int(fim * TAXA_AMOSTRAGEM)]
+                # Mesma fila das requisições interativas, como bulk: a vez é devolvida a cada
+                # trecho, e requisições mais prioritárias passam à frente do trecho seguinte
+                vez = aguardar_vez(escalonador_whisper, cargas_motores["whisper"]) if JOBS_PREEMPCAO else nullcontext()
+                async with vez:
+                    resultado = await run_in_threadpool(motor_stt.transcrever, trecho, trabalho["idioma"])
+
+                segmentos, texto, proximo = recortar_trecho(resultado, inicio, fim, duracao)
+
+                gravado = await run_in_threadpool(
+                    fila_trabalhos.registrar_trecho, trabalho_id, indice, inicio, proximo, texto, segmentos
+                )
+                if not gravado:
+                    print(f"⏹️ Trabalho {trabalho_id} cancelado ou assumido por outro processo")
+                    return
+                inicio = proximo
+                indice += 1
+
+        concluido = await run_in_threadpool(fila_trabalhos.obter, trabalho_id, False)
+        # Cancelado (ou assumido por outro processo) durante o último trecho: sem conclusão nem callback
+        if not await run_in_threadpool(fila_trabalhos.finalizar, trabalho_id, CONCLUIDO, concluido["texto"]):
+            print(f"⏹️ Trabalho {trabalho_id} cancelado ou assumido por outro processo")
+            return
+        print(f"✅ Trabalho {trabalho_id} concluído")
+
+    except Exception as e:
+        # Cancelado durante o processamento (o áudio já foi apagado): a falha não conta
+        if not await run_in_threadpool(fila_trabalhos.finalizar, trabalho_id, FALHOU, None, str(e)):
+            return
+        print(f"❌ Trabalho {trabalho_id} falhou: {e}")
+
+    await notificar_callback(trabalho_id)
+
+async def notificar_callback(trabalho_id: str):
+    """POST do trabalho finalizado na callback_url, com novas tentativas (1s, 2s, 4s...)"""
+    trabalho = await run_in_threadpool(fila_trabalhos.obter, trabalho_id)
+    if not trabalho or not trabalho["callback_url"]:
+        return
+
+    corpo = formatar_trabalho(trabalho)
+    erro = None
+    for tentativa in range(JOBS_CALLBACK_TENTATIVAS):
+        try:
+            resposta = await run_in_threadpool(requests.post, trabalho["callback_url"], json=corpo, timeout=10)
+            if resposta.status_code < 400:
+                await run_in_threadpool(fila_trabalhos.registrar_callback, trabalho_id, "delivered")
+                return
+            erro = f"HTTP {resposta.status_code}"
+        except requests.exceptions.RequestException as e:
+            erro = str(e)
+        await asyncio.sleep(2 ** tentativa)
+
+    print(f"⚠️ Callback do trabalho {trabalho_id} falhou: {erro}")
+    await run_in_threadpool(fila_trabalhos.registrar_callback, trabalho_id, f"failed: {erro}")
+
+def exigir_fila_trabalhos():
+    """Dependência das rotas /api/jobs"""
+    if fila_trabalhos is None:
+        raise HTTPException(status_code=503, detail="Trabalhos assíncronos não disponíveis no modo gateway")
+
+def salvar_upload(origem, destino: Path):
+    with open(destino, "wb") as f:
+        shutil.copyfileobj(origem, f, length=1024 * 1024)
 
 # ============================================
-# INICIALIZAÇÃO DOS MODELOS
+# PRÉ-GERAÇÃO (PREFETCH)
 # ============================================
 
-print("Carregando modelos...")
+# Frases que o cliente avisa que vai pedir (POST /api/prefetch) são sintetizadas em segundo
+# plano, como bulk e só com o Piper livre, para o pedido de verdade sair do cache (ver prefetch.py)
+PREFETCH_FILA_MAX = int(os.getenv("PREFETCH_FILA_MAX", "500"))
+# Dicas que esperaram mais que isto (Piper ocupado) são descartadas sem gerar
+PREFETCH_VALIDADE = float(os.getenv("PREFETCH_VALIDADE", "120"))
+PREFETCH_CONCORRENCIA = int(os.getenv("PREFETCH_CONCORRENCIA", "1"))
+PRIORIDADE_PREFETCH = "bulk"
+
+# Intervalo para verificar de novo se o Piper ficou livre
+INTERVALO_PREFETCH = 0.2
+
+# Sem cache não há onde guardar: sem fila (o gateway repassa as dicas aos peers)
+fila_prefetch = FilaPrefetch(PREFETCH_FILA_MAX, PREFETCH_VALIDADE) if cache_tts is not None and PREFETCH_FILA_MAX > 0 else None
 
-# Baixar modelo Piper se necessário
-try:
-    download_piper_model()
-    PIPER_EXECUTABLE = get_piper_executable()
-    print(f"✓ Piper executável: {PIPER_EXECUTABLE}")
-except Exception as e:
-    print(f"⚠️ Aviso Piper: {e}")
-    PIPER_EXECUTABLE = None
+def piper_ocupado() -> bool:
+    """Há pedidos esperando o Piper ou todas as vagas estão em uso"""
+    carga = cargas_motores["piper"]
+    return carga.na_fila > 0 or carga.em_execucao >= carga.vagas
 
-# Whisper para transcrição
-whisper_model = whisper.load_model("large", device="cuda")
-print("✓ Whisper carregado")
+async def processar_prefetch():
+    """Laço em segundo plano: gera a próxima dica da fila quando o Piper estiver livre"""
+    _prioridade_atual.set(PRIORIDADE_PREFETCH)  # Vale só para esta tarefa
+    while True:
+        chave, item, criada = await fila_prefetch.retirar()
+        if await run_in_threadpool(cache_tts.contem, chave):
+            fila_prefetch.ja_em_cache += 1
+            continue
 
-# Verificar VRAM disponível
-if torch.cuda.is_available():
-    print(f"✓ GPU: {torch.cuda.get_device_name(0)}")
-    print(f"✓ VRAM disponível: {torch.cuda.get_device_properties(0).total_memory / 1e9:.2f} GB")
+        # Pedidos de verdade primeiro: a dica espera o Piper ficar livre (e pode vencer esperando)
+        while piper_ocupado() and not fila_prefetch.vencida(criada):
+            await asyncio.sleep(INTERVALO_PREFETCH)
+        if fila_prefetch.vencida(criada):
+            fila_prefetch.vencidas += 1
+            continue
+
+        try:
+            await obter_audio_tts(item.text, item.voice, item.speed, item.speed_mode)
+            fila_prefetch.geradas += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            fila_prefetch.falhas += 1
+            print(f"⚠️ Pré-geração falhou ({item.text[:40]!r}): {e}")
 
 # ============================================
 # MODELOS DE DADOS
@@ -161,13 +883,54 @@ if torch.cuda.is_available():
 
 class GenerateAudioRequest(BaseModel):
     text: str
-    voice: str = "Kore"  # Mantém compatibilidade com API original
+    voice: str = PIPER_VOZ_PADRAO  # Nome de uma voz de PIPER_VOZES
     speed: Optional[float] = Field(
         default=1.0,
         ge=0.5,
         le=2.0,
         description="Velocidade da fala: 0.5 (lento) a 2.0 (rápido). Padrão: 1.0"
     )
+    speed_mode: Optional[str] = Field(
+        default=None,
+        pattern="^(resynthesis|stretch)$",
+        description="resynthesis (Piper com length_scale) ou stretch (estica a versão 1.0x). Padrão: TTS_MODO_VELOCIDADE"
+    )
+
+    def preparado(self) -> "GenerateAudioRequest":
+        """Com o modo de velocidade resolvido (o peer no modo gateway recebe o modo deste nó)"""
+        return self.model_copy(update={"speed_mode": self.speed_mode or TTS_MODO_VELOCIDADE})
+
+    def chave_roteamento(self) -> str:
+        # Versões esticadas saem da 1.0x: mesmo peer que a tem em cache
+        velocidade = 1.0 if estica_velocidade(self.speed, self.speed_mode) else self.speed
+        return chave_tts(self.text, self.voice, velocidade)
+
+    def metadata(self) -> Dict:
+        esticado = estica_velocidade(self.speed, self.speed_mode)
+        return {
+            "speed": self.speed,
+            "length_scale": 1.0 if esticado else 1.0 / self.speed,
+            "speed_mode": "stretch" if esticado else "resynthesis",
+        }
+
+# Máximo de frases por requisição de lote
+BATCH_MAX_ITENS = int(os.getenv("BATCH_MAX_ITENS", "200"))
+
+class GenerateAudioBatchRequest(BaseModel):
+    items: List[GenerateAudioRequest] = Field(min_length=1, max_length=BATCH_MAX_ITENS)
+
+class PrefetchRequest(BaseModel):
+    texts: List[str] = Field(min_length=1, max_length=BATCH_MAX_ITENS)
+    speeds: List[Annotated[float, Field(ge=0.5, le=2.0)]] = Field(default=[1.0], min_length=1, max_length=8)
+    voice: str = PIPER_VOZ_PADRAO
+    speed_mode: Optional[str] = Field(default=None, pattern="^(resynthesis|stretch)$")
+
+    def itens(self) -> List[GenerateAudioRequest]:
+        """Cada texto em cada velocidade, na ordem em que o cliente deve pedi-los"""
+        return [
+            GenerateAudioRequest(text=texto, voice=self.voice, speed=velocidade, speed_mode=self.speed_mode)
+            for texto in self.texts for velocidade in self.speeds
+        ]
 
 class DialogueTurn(BaseModel):
     type: str  # "QUESTION" ou "ANSWER"
@@ -176,31 +939,171 @@ class DialogueTurn(BaseModel):
 class GenerateSummaryRequest(BaseModel):
     dialogue: List[DialogueTurn]
 
+def tipo_turno(tipo: str) -> str:
+    """Tipos de turno não diferenciam maiúsculas (no diálogo, em voices/speeds e em DIALOGO_VOZES)"""
+    return tipo.strip().upper()
+
+def interpretar_vozes_dialogo(texto: str) -> Dict[str, tuple]:
+    """'QUESTION=Kore@1.0,ANSWER=Kore@0.9' -> {"QUESTION": ("Kore", 1.0), ...} (velocidade opcional)"""
+    vozes = {}
+    for parte in texto.split(","):
+        tipo, _, voz = parte.partition("=")
+        voz, _, velocidade = voz.partition("@")
+        vozes[tipo_turno(tipo)] = (voz.strip(), float(velocidade or 1.0))
+    return vozes
+
+# Voz e velocidade de cada tipo de turno do diálogo (a requisição pode sobrescrever)
+DIALOGO_VOZES = interpretar_vozes_dialogo(
+    os.getenv("DIALOGO_VOZES", f"QUESTION={PIPER_VOZ_PADRAO}@1.0,ANSWER={PIPER_VOZ_PADRAO}@1.0")
+)
+# Silêncio (s) entre os turnos na faixa única
+DIALOGO_PAUSA = float(os.getenv("DIALOGO_PAUSA", "0.4"))
+
+class GenerateDialogueAudioRequest(GenerateSummaryRequest):
+    dialogue: List[DialogueTurn] = Field(min_length=1, max_length=BATCH_MAX_ITENS)
+    voices: Dict[str, str] = Field(default_factory=dict, description="Voz por tipo de turno, ex.: {\"ANSWER\": \"Kore\"}")
+    speeds: Dict[str, float] = Field(default_factory=dict, description="Velocidade por tipo de turno (0.5 a 2.0)")
+    speed_mode: Optional[str] = Field(default=None, pattern="^(resynthesis|stretch)$", description="Como em /api/generate-audio")
+    pause: float = Field(default=DIALOGO_PAUSA, ge=0.0, le=5.0, description="Silêncio entre turnos na faixa única (s)")
+
 # ============================================
 # ENDPOINTS
 # ============================================
 
+async def encaminhar_para_peer(motor: str, chave: str, caminho: str, **kwargs) -> Response:
+    """Modo gateway: repassar a requisição ao peer escolhido, incluindo os tempos dele no Server-Timing"""
+    try:
+        with medir_etapa("gateway"):
+            # A prioridade e o prazo restante seguem para o peer, que os aplica na fila dele
+            cabecalhos = {"X-Priority": prioridade_atual()}
+            restante = tempo_restante()
+            if restante is not None:
+                if restante <= 0:
+                    raise PrazoEsgotado("Prazo da requisição esgotado")
+                cabecalhos["X-Request-Timeout"] = f"{restante:.3f}"
+            resposta, peer = await executar_bloqueante(
+                gateway.encaminhar, motor, chave, caminho, headers=cabecalhos, timeout=restante, **kwargs
+            )
+    except ErroGateway as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except requests.exceptions.ReadTimeout:
+        raise PrazoEsgotado("Prazo da requisição esgotado aguardando o peer")
+
+    medidor = _medidor_atual.get()
+    if medidor is not None:
+        medidor.incorporar(resposta.headers.get("Server-Timing", ""), "gateway")
+    return Response(
+        content=resposta.content,
+        status_code=resposta.status_code,
+        media_type=resposta.headers.get("Content-Type"),
+        headers={"X-Gateway-Peer": peer.url},
+    )
+
 @app.get("/health")
 async def health_check():
     """Verificar se o serviço está rodando"""
+    if gateway:
+        return {
+            "status": "healthy",
+            "mode": "gateway",
+            "state": ESTADO_NO,
+            "peers": gateway.estado(),
+            "openai_available": client_openai is not None,
+        }
+    info = await executar_bloqueante(info_motores)
     return {
         "status": "healthy",
         "models": {
-            "whisper": "large",
-            "tts": "piper (de_DE-thorsten-medium)",
+            "whisper": info["whisper"]["modelo"],
+            "tts": f"piper ({info['piper']['modelo']})",
             "openai_transcription": MODELO_TRANSCRICAO_OPENAI if OPENAI_API_KEY else "not configured"
         },
-        "gpu": torch.cuda.is_available(),
-        "piper_available": PIPER_EXECUTABLE is not None,
+        "gpu": info["whisper"]["gpu"],
+        "piper_available": info["piper"]["disponivel"],
         "openai_available": client_openai is not None,
+        "model_server": MODEL_SERVER_ADDRESS is not None,
+        "state": ESTADO_NO,
         "features": {
             "speed_control": True,
             "speed_range": "0.5 - 2.0"
         }
     }
 
+@app.get("/ready")
+async def readiness():
+    """Prontidão para balanceadores: 200 se o nó aceita tráfego, 503 se está iniciando, drenando ou recarregando"""
+    pronto = ESTADO_NO == "pronto" and (gateway is None or gateway.capacidade()["pronto"])
+    return JSONResponse({"estado": ESTADO_NO}, status_code=200 if pronto else 503)
+
+@app.get("/capacity")
+async def capacity():
+    """
+    Capacidade atual do nó, para rotear ao menos carregado em vez de round-robin
+    Com servidor de modelos, whisper/piper refletem a fila compartilhada por todos os workers HTTP;
+    em_andamento é só deste processo
+    """
+    if gateway:
+        capacidade_peers = gateway.capacidade()
+        return {
+            "estado": ESTADO_NO,
+            "pronto": ESTADO_NO == "pronto" and capacidade_peers["pronto"],
+            "pid": os.getpid(),
+            "em_andamento": requisicoes_em_andamento,
+            "gateway": True,
+            **capacidade_peers,
+        }
+
+    motores = {nome: carga.estado() for nome, carga in cargas_motores.items()}
+    for nome, escalonador in (("whisper", escalonador_whisper), ("piper", escalonador_piper)):
+        if escalonador is not None:
+            motores[nome]["prioridades"] = escalonador.estado()["classes"]
+    modelos = None
+    if ESTADO_NO in ("pronto", "drenando"):
+        try:
+            if MODEL_SERVER_ADDRESS:
+                motores.update(await executar_bloqueante(motor_stt.capacidade))
+            info = await executar_bloqueante(info_motores)
+            modelos = {
+                "whisper": {"modelo": info["whisper"]["modelo"], "carregado": info["whisper"]["carregado"]},
+                "piper": {
+                    "modelo": info["piper"]["modelo"],
+                    "carregado": info["piper"]["disponivel"],
+                    "vozes": info["piper"].get("vozes"),
+                },
+            }
+        except Exception as e:
+            print(f"⚠️ Capacidade indisponível: {e}")
+
+    esperas = [m["espera_estimada"] for m in motores.values() if m["espera_estimada"] is not None]
+    trabalhos = await run_in_threadpool(fila_trabalhos.resumo)
+    return {
+        "estado": ESTADO_NO,
+        "pronto": ESTADO_NO == "pronto",
+        "pid": os.getpid(),
+        "em_andamento": requisicoes_em_andamento,
+        "motores": motores,
+        "espera_estimada": max(esperas, default=0.0),
+        "modelos": modelos,
+        "trabalhos": trabalhos,
+        "coalescencia": chamadas_em_voo.estado(),
+        "cache_tts": cache_tts.estado() if cache_tts is not None else None,
+        "prefetch": fila_prefetch.estado() if fila_prefetch is not None else None,
+        "servidor_modelos": MODEL_SERVER_ADDRESS,
+    }
+
+async def sintetizar_local(texto: str, voz: str, velocidade: float, length_scale: float) -> bytes:
+    """Executar o Piper (fora do event loop, respeitando o limite de concorrência)"""
+    print(f"🎤 Gerando áudio ({voz}) com velocidade: {velocidade}x (length_scale: {length_scale:.2f})")
+    async with aguardar_vez(escalonador_piper, cargas_motores["piper"]):
+        with medir_etapa("inference"):
+            return await executar_bloqueante(motor_tts.sintetizar, texto, length_scale, voz)
+
 @app.post("/api/generate-audio")
-async def generate_audio(request: GenerateAudioRequest):
+async def generate_audio(
+    request: GenerateAudioRequest,
+    conexao: Request,
+    format: str = Query(default="base64", pattern="^(base64|url)$"),
+):
     """
     Gerar áudio a partir de texto (TTS)
     Equivalente ao generateAudio() do Gemini
@@ -208,147 +1111,506 @@ async def generate_audio(request: GenerateAudioRequest):
     
     Args:
         text: Texto para sintetizar
-        voice: Voz (compatibilidade, não utilizado)
+        voice: Voz (nome em PIPER_VOZES; 400 se desconhecida)
         speed: Velocidade da fala (0.5 = lento, 1.0 = normal, 2.0 = rápido)
+        speed_mode: resynthesis (Piper com length_scale) ou stretch (estica a versão 1.0x)
+        format: base64 (padrão, áudio na resposta) ou url (endereço estável em /api/audio/{chave},
+            que o navegador e proxies podem guardar em cache)
     """
-    if not PIPER_EXECUTABLE:
+    if gateway:
+        request = request.preparado()
+        rota = request.chave_roteamento()
+        resposta = await encaminhar_para_peer(
+            "piper", rota, f"/api/generate-audio?format={format}", json=request.model_dump()
+        )
+        if format == "url" and resposta.status_code == 200:
+            # A chave do cache não leva à de roteamento: ela vai na URL, para /api/audio
+            # procurar o áudio a partir do peer que o gerou
+            corpo = json.loads(resposta.body)
+            corpo["url"] = f"{corpo['url']}&{PARAMETRO_ROTA_AUDIO}={rota}"
+            return JSONResponse(corpo, headers={"X-Gateway-Peer": resposta.headers["X-Gateway-Peer"]})
+        return resposta
+
+    if MODEL_SERVER_ADDRESS is None and not motor_tts.disponivel:
         raise HTTPException(
             status_code=503,
             detail="Piper TTS não disponível. Instale com: pip install piper-tts"
         )
     
     try:
-        # Criar arquivo temporário para o áudio
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-            output_path = temp_file.name
-        
-        # Criar arquivo temporário para o texto
-        with tempfile.NamedTemporaryFile(mode='w', suffix=".txt", delete=False, encoding='utf-8') as text_file:
-            text_file.write(request.text)
-            text_path = text_file.name
-        
-        # Calcular length_scale (inverso da velocidade)
+        if format == "url":
+            if cache_tts is None:
+                return JSONResponse(
+                    {"detail": "URLs de áudio indisponíveis (cache de TTS desativado)", "code": ERRO_URL_INDISPONIVEL},
+                    status_code=503,
+                )
+            chave, versao = await enquanto_necessaria(
+                conexao, garantir_audio_tts(request.text, request.voice, request.speed, request.speed_mode)
+            )
+            return JSONResponse({
+                "url": f"/api/audio/{chave}?{PARAMETRO_VERSAO_AUDIO}={versao[:DIGITOS_VERSAO_AUDIO]}",
+                "mimeType": "audio/wav",
+                "metadata": request.metadata()
+            })
+
+        # Ressíntese: length_scale é o inverso da velocidade
         # speed=2.0 -> length_scale=0.5 (mais rápido)
         # speed=1.0 -> length_scale=1.0 (normal)
         # speed=0.5 -> length_scale=2.0 (mais lento)
-        length_scale = 1.0 / request.speed
-        
-        print(f"🎤 Gerando áudio com velocidade: {request.speed}x (length_scale: {length_scale:.2f})")
-        
-        # Executar Piper via linha de comando com length-scale
-        cmd = [
-            PIPER_EXECUTABLE,
-            "--model", str(PIPER_MODEL_PATH),
-            "--config", str(PIPER_CONFIG_PATH),
-            "--output_file", output_path,
-            "--length_scale", str(length_scale)  # Controle de velocidade
-        ]
-        
-        # Executar comando
-        result = subprocess.run(
-            cmd,
-            input=request.text.encode('utf-8'),
-            capture_output=True,
-            check=True
+        audio_bytes = await enquanto_necessaria(
+            conexao, obter_audio_tts(request.text, request.voice, request.speed, request.speed_mode)
         )
         
-        # Verificar se o arquivo foi criado
-        if not Path(output_path).exists():
-            raise Exception("Arquivo de áudio não foi gerado")
-        
-        # Ler e codificar em base64
-        with open(output_path, "rb") as audio_file:
-            audio_bytes = audio_file.read()
+        with medir_etapa("encode"):
+            # Codificar em base64
             base64_audio = base64.b64encode(audio_bytes).decode("utf-8")
-        
-        # Limpar arquivos temporários
-        os.unlink(output_path)
-        os.unlink(text_path)
-        
-        return JSONResponse({
-            "audio": base64_audio,
-            "mimeType": "audio/wav",
-            "metadata": {
-                "speed": request.speed,
-                "length_scale": length_scale
-            }
-        })
+            
+            return JSONResponse({
+                "audio": base64_audio,
+                "mimeType": "audio/wav",
+                "metadata": request.metadata()
+            })
     
-    except subprocess.CalledProcessError as e:
-        print(f"Erro ao executar Piper: {e}")
-        print(f"STDOUT: {e.stdout.decode('utf-8', errors='ignore')}")
-        print(f"STDERR: {e.stderr.decode('utf-8', errors='ignore')}")
+    except (PrazoEsgotado, ClienteDesconectado, VozDesconhecida, HTTPException):
+        raise
+
+    except ErroPiper as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Failed to generate audio with Piper: {e.stderr.decode('utf-8', errors='ignore')}"
+            detail=f"Failed to generate audio with Piper: {e}"
         )
     
     except Exception as e:
         print(f"Erro ao gerar áudio: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate audio: {str(e)}")
+
+# /api/audio/{chave}?v=<versão>: a versão é o início do sha256 do WAV, então a resposta da URL nunca muda
+CACHE_CONTROL_AUDIO = "public, max-age=31536000, immutable"
+# Sem a versão, o WAV da chave pode ser outro (gerado de novo depois de sair do cache): sempre revalidar
+CACHE_CONTROL_AUDIO_SEM_VERSAO = "public, no-cache"
+PARAMETRO_VERSAO_AUDIO = "v"
+DIGITOS_VERSAO_AUDIO = 16
+_VERSAO_AUDIO = re.compile(rf"^[0-9a-f]{{{DIGITOS_VERSAO_AUDIO}}}$")
+# Código de erro (campo "code") do format=url sem cache: o cliente passa a pedir base64
+ERRO_URL_INDISPONIVEL = "audio_url_unavailable"
+_CHAVE_AUDIO = re.compile(r"^[0-9a-f]{64}$")
+# Modo gateway: parâmetro da URL do áudio com a chave de roteamento de quando ele foi gerado
+PARAMETRO_ROTA_AUDIO = "route"
+# Cabeçalhos repassados entre o cliente e o peer no modo gateway
+CABECALHOS_REQUISICAO_AUDIO = ("Range", "If-Range", "If-None-Match")
+CABECALHOS_RESPOSTA_AUDIO = ("Content-Type", "Content-Range", "Accept-Ranges", "ETag", "Cache-Control", "Last-Modified")
+
+async def buscar_audio_em_peer(chave: str, versao: Optional[str], rota: str, conexao: Request) -> Response:
+    """Modo gateway: o áudio está no cache de um dos peers (o que o gerou, o primeiro do anel para `rota`)"""
+    cabecalhos = {nome: conexao.headers[nome] for nome in CABECALHOS_REQUISICAO_AUDIO if nome in conexao.headers}
+    caminho = f"/api/audio/{chave}" if versao is None else f"/api/audio/{chave}?{PARAMETRO_VERSAO_AUDIO}={versao}"
+    try:
+        with medir_etapa("gateway"):
+            resposta, peer = await executar_bloqueante(gateway.buscar, rota, caminho, headers=cabecalhos)
+    except ErroGateway as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    repassados = {nome: resposta.headers[nome] for nome in CABECALHOS_RESPOSTA_AUDIO if nome in resposta.headers}
+    return Response(
+        content=resposta.content,
+        status_code=resposta.status_code,
+        headers={**repassados, "X-Gateway-Peer": peer.url},
+    )
+
+@app.api_route("/api/audio/{chave}", methods=["GET", "HEAD"])
+async def obter_audio(chave: str, conexao: Request, v: Optional[str] = None, route: Optional[str] = None):
+    """
+    WAV de /api/generate-audio?format=url, direto do cache em disco
+    O Piper não gera duas vezes os mesmos bytes, então ETag e URL vêm do conteúdo gravado: ETag
+    forte = sha256 do WAV e `v` = início dele. Com `v`, Cache-Control immutable (outro WAV na chave
+    é outra URL, e a antiga dá 404); If-None-Match recebe 304 e Range só o trecho pedido (206), com
+    If-Range comparado ao hash. O arquivo vai do disco para o socket pelo FileResponse
+    """
+    if not _CHAVE_AUDIO.match(chave) or (v is not None and not _VERSAO_AUDIO.match(v)):
+        raise HTTPException(status_code=404, detail="Áudio não encontrado")
+    if gateway:
+        # Sem a chave de roteamento (URL de fora do gateway), o anel é percorrido a partir da chave do áudio
+        rota = route if route and _CHAVE_AUDIO.match(route) else chave
+        return await buscar_audio_em_peer(chave, v, rota, conexao)
+
+    caminho = await run_in_threadpool(cache_tts.localizar, chave) if cache_tts is not None else None
+    versao = await run_in_threadpool(cache_tts.versao, chave) if caminho is not None else None
+    if versao is None or (v is not None and not versao.startswith(v)):
+        # Saiu do cache (ou nunca esteve, ou foi gerado de novo com outros bytes): o cliente gera
+        # de novo e recebe a URL da versão atual
+        raise HTTPException(status_code=404, detail="Áudio não encontrado; gere de novo em /api/generate-audio?format=url")
+
+    etag = f'"{versao}"'
+    cabecalhos = {"ETag": etag, "Cache-Control": CACHE_CONTROL_AUDIO if v is not None else CACHE_CONTROL_AUDIO_SEM_VERSAO}
+    if_none_match = conexao.headers.get("If-None-Match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [e.strip() for e in if_none_match.split(",")]):
+        return Response(status_code=304, headers=cabecalhos)
+    # O ETag passado prevalece sobre o do FileResponse (mtime e tamanho), inclusive no If-Range
+    return FileResponse(caminho, media_type="audio/wav", headers=cabecalhos)
+
+async def sintetizar_item(item: GenerateAudioRequest):
+    """Uma frase do lote: (WAV, metadata), pelo peer no modo gateway ou pelo Piper local"""
+    if gateway:
+        # Cada frase segue o hash dela, caindo no peer que já a tem em cache
+        item = item.preparado()
+        resposta = await encaminhar_para_peer(
+            "piper", item.chave_roteamento(), "/api/generate-audio", json=item.model_dump()
+        )
+        corpo = json.loads(resposta.body)
+        if resposta.status_code != 200:
+            raise HTTPException(status_code=resposta.status_code, detail=corpo.get("detail"))
+        return base64.b64decode(corpo["audio"]), corpo["metadata"]
+
+    audio_bytes = await obter_audio_tts(item.text, item.voice, item.speed, item.speed_mode)
+    return audio_bytes, item.metadata()
+
+async def sintetizar_lote(itens: List[GenerateAudioRequest]):
+    """
+    Sintetizar todas as frases em paralelo (o escalonador do Piper limita a concorrência)
+    e produzir (índice, WAV, metadata, erro) na ordem em que terminam
+    """
+    async def executar(indice: int, item: GenerateAudioRequest):
+        try:
+            audio_bytes, metadata = await sintetizar_item(item)
+            return indice, audio_bytes, metadata, None
+        except HTTPException as e:
+            return indice, None, None, str(e.detail)
+        except Exception as e:
+            return indice, None, None, f"{type(e).__name__}: {e}"
+
+    tarefas = [asyncio.ensure_future(executar(indice, item)) for indice, item in enumerate(itens)]
+    try:
+        for proxima in asyncio.as_completed(tarefas):
+            yield await proxima
+    finally:
+        # Cliente desconectou ou o prazo esgotou: as frases ainda na fila não são geradas
+        for tarefa in tarefas:
+            tarefa.cancel()
+
+class _SaidaZip(io.RawIOBase):
+    """Destino não posicionável para o zipfile: acumula os bytes até serem enviados"""
+
+    def __init__(self):
+        self.pendente = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self.pendente += dados
+        return len(dados)
+
+    def retirar(self) -> bytes:
+        dados = bytes(self.pendente)
+        self.pendente.clear()
+        return dados
+
+async def lote_ndjson(itens: List[GenerateAudioRequest]):
+    async for indice, audio_bytes, metadata, erro in sintetizar_lote(itens):
+        if erro is not None:
+            linha = {"index": indice, "error": erro}
+        else:
+            linha = {
+                "index": indice,
+                "audio": base64.b64encode(audio_bytes).decode("utf-8"),
+                "mimeType": "audio/wav",
+                "metadata": metadata,
+            }
+        yield json.dumps(linha, ensure_ascii=False) + "\n"
+
+async def lote_zip(itens: List[GenerateAudioRequest]):
+    saida = _SaidaZip()
+    erros = {}
+    # WAV já é PCM: compressão gastaria CPU para quase nenhum ganho
+    with zipfile.ZipFile(saida, "w", compression=zipfile.ZIP_STORED) as arquivo:
+        async for indice, audio_bytes, _, erro in sintetizar_lote(itens):
+            if erro is not None:
+                erros[indice] = erro
+                continue
+            arquivo.writestr(f"{indice:04d}.wav", audio_bytes)
+            yield saida.retirar()
+        if erros:
+            arquivo.writestr("errors.json", json.dumps(erros, ensure_ascii=False, indent=2))
+    yield saida.retirar()
+
+@app.post("/api/generate-audio/batch")
+async def generate_audio_batch(
+    request: GenerateAudioBatchRequest,
+    conexao: Request,
+    format: str = Query(default="ndjson", pattern="^(ndjson|zip)$"),
+):
+    """
+    Gerar o áudio de várias frases numa requisição só (ex.: exercícios de compreensão)
+    As frases são sintetizadas em paralelo e enviadas assim que ficam prontas, fora de ordem,
+    cada uma com seu índice na lista:
+
+    - ndjson (padrão): uma linha JSON por frase, igual à resposta de /api/generate-audio mais
+      "index" (ou "index" e "error", se aquela frase falhar)
+    - zip: um WAV por frase (0000.wav, 0001.wav...) e errors.json com as que falharam
+    """
+    if not gateway and MODEL_SERVER_ADDRESS is None and not motor_tts.disponivel:
+        raise HTTPException(
+            status_code=503,
+            detail="Piper TTS não disponível. Instale com: pip install piper-tts"
+        )
+
+    # Lotes disputam o Piper como bulk, a menos que o cliente peça outra prioridade
+    if "X-Priority" not in conexao.headers:
+        _prioridade_atual.set("bulk")
+
+    print(f"🎤 Gerando lote de {len(request.items)} frases ({format})")
+    if format == "zip":
+        return StreamingResponse(
+            lote_zip(request.items),
+            media_type="application/zip",
+            headers={"Content-Disposition": 'attachment; filename="audios.zip"'},
+        )
+    return StreamingResponse(lote_ndjson(request.items), media_type="application/x-ndjson")
+
+def itens_dialogo(request: GenerateDialogueAudioRequest) -> List[GenerateAudioRequest]:
+    """Cada turno vira uma frase com a voz/velocidade do seu tipo (400 se o tipo não estiver configurado)"""
+    vozes = {tipo_turno(tipo): voz for tipo, voz in request.voices.items()}
+    velocidades = {tipo_turno(tipo): velocidade for tipo, velocidade in request.speeds.items()}
+    itens = []
+    for indice, turno in enumerate(request.dialogue):
+        tipo = tipo_turno(turno.type)
+        voz, velocidade = DIALOGO_VOZES.get(tipo, (None, 1.0))
+        voz = vozes.get(tipo, voz)
+        if voz is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Turno {indice}: tipo {turno.type!r} sem voz configurada (use {', '.join(DIALOGO_VOZES)} ou informe voices)"
+            )
+        velocidade = velocidades.get(tipo, velocidade)
+        if not 0.5 <= velocidade <= 2.0:
+            raise HTTPException(status_code=400, detail=f"Velocidade de {tipo} fora de 0.5 - 2.0: {velocidade}")
+        itens.append(GenerateAudioRequest(text=turno.text, voice=voz, speed=velocidade, speed_mode=request.speed_mode))
+    return itens
+
+async def montar_faixa_dialogo(request: GenerateDialogueAudioRequest, itens: List[GenerateAudioRequest]) -> Dict:
+    """Sintetizar os turnos em paralelo e juntá-los na ordem do diálogo, com o início/fim de cada um"""
+    audios, erros = [None] * len(itens), {}
+    async for indice, audio_bytes, _, erro in sintetizar_lote(itens):
+        if erro is not None:
+            erros[indice] = erro
+        audios[indice] = audio_bytes
+    if erros:
+        raise HTTPException(status_code=500, detail={"message": "Falha ao gerar turnos do diálogo", "errors": erros})
+
+    with medir_etapa("encode"):
+        faixa, limites = await run_in_threadpool(concatenar_wavs, audios, request.pause)
+        turnos = [
+            {"index": indice, "type": turno.type, "voice": item.voice, "speed": item.speed, **limite}
+            for indice, (turno, item, limite) in enumerate(zip(request.dialogue, itens, limites))
+        ]
+        return {
+            "audio": base64.b64encode(faixa).decode("utf-8"),
+            "mimeType": "audio/wav",
+            "turns": turnos,
+            "metadata": {"pause": request.pause, "duration": limites[-1]["end"]},
+        }
+
+async def dialogo_ndjson(request: GenerateDialogueAudioRequest, itens: List[GenerateAudioRequest]):
+    async for linha in lote_ndjson(itens):
+        # Mesmas linhas do lote, com o tipo do turno
+        conteudo = json.loads(linha)
+        conteudo["type"] = request.dialogue[conteudo["index"]].type
+        yield json.dumps(conteudo, ensure_ascii=False) + "\n"
+
+@app.post("/api/generate-dialogue-audio")
+async def generate_dialogue_audio(
+    request: GenerateDialogueAudioRequest,
+    conexao: Request,
+    format: str = Query(default="track", pattern="^(track|ndjson)$"),
+):
+    """
+    Gerar o áudio de um diálogo inteiro (turnos QUESTION/ANSWER) numa requisição só
+    Os turnos são sintetizados em paralelo, cada um com a voz e a velocidade do seu tipo
+    (DIALOGO_VOZES, ou voices/speeds na requisição) e guardado no cache como uma frase avulsa:
+
+    - track (padrão): um WAV único com os turnos em ordem, separados por `pause` segundos,
+      e "turns" com o início/fim (s) de cada turno na faixa
+    - ndjson: uma linha por turno assim que fica pronto (como no lote, mais "type")
+    """
+    if not gateway and MODEL_SERVER_ADDRESS is None and not motor_tts.disponivel:
+        raise HTTPException(
+            status_code=503,
+            detail="Piper TTS não disponível. Instale com: pip install piper-tts"
+        )
+    itens = itens_dialogo(request)
+    if not gateway:
+        # As vozes do diálogo carregam juntas (e em paralelo) antes do primeiro turno
+        await executar_bloqueante(motor_tts.precarregar, [item.voice for item in itens])
+
+    # Diálogo é prática ao vivo: interactive, a menos que o cliente peça outra prioridade
+    if "X-Priority" not in conexao.headers:
+        _prioridade_atual.set("interactive")
+
+    print(f"🎭 Gerando diálogo de {len(itens)} turnos ({format})")
+    if format == "ndjson":
+        return StreamingResponse(dialogo_ndjson(request, itens), media_type="application/x-ndjson")
+    return JSONResponse(await enquanto_necessaria(conexao, montar_faixa_dialogo(request, itens)))
+
+async def repassar_prefetch(itens: List[GenerateAudioRequest]) -> Dict:
+    """Modo gateway: cada dica vai ao peer que vai receber o pedido de verdade (e guardá-lo em cache)"""
+    async def repassar(item: GenerateAudioRequest) -> Optional[Dict]:
+        item = item.preparado()
+        corpo = {"texts": [item.text], "speeds": [item.speed], "voice": item.voice, "speed_mode": item.speed_mode}
+        try:
+            resposta = await encaminhar_para_peer("piper", item.chave_roteamento(), "/api/prefetch", json=corpo)
+        except HTTPException:
+            return None
+        return json.loads(resposta.body) if resposta.status_code == 202 else None
+
+    contagem = {"queued": 0, "cached": 0, "already_queued": 0, "dropped": 0, "failed": 0}
+    for resultado in await asyncio.gather(*(repassar(item) for item in itens)):
+        if resultado is None:
+            contagem["failed"] += 1
+            continue
+        for campo in ("queued", "cached", "already_queued", "dropped"):
+            contagem[campo] += resultado[campo]
+    return contagem
+
+@app.post("/api/prefetch", status_code=202)
+async def prefetch(request: PrefetchRequest):
+    """
+    Avisar as frases que o cliente vai pedir em seguida (ex.: ao abrir uma lição)
+    Cada texto em cada velocidade entra numa fila de pré-geração em segundo plano (bulk, só com
+    o Piper livre); os pedidos seguintes em /api/generate-audio saem do cache. A resposta não
+    espera a síntese:
+
+    - queued: dicas novas na fila
+    - cached / already_queued: já estavam no cache ou na fila (ignoradas)
+    - dropped: dicas antigas descartadas porque a fila encheu
+    """
+    modelo_da_voz(PIPER_VOZES, request.voice)  # Voz fora do registro: 400
+    itens = request.itens()
+    if gateway:
+        _prioridade_atual.set(PRIORIDADE_PREFETCH)
+        return await repassar_prefetch(itens)
+    if fila_prefetch is None:
+        raise HTTPException(status_code=503, detail="Pré-geração indisponível (cache de TTS desativado)")
+
+    contagem = {"queued": 0, "cached": 0, "already_queued": 0, "dropped": 0}
+    for item in itens:
+        chave = chave_cache_tts(item.text, item.voice, item.speed, item.speed_mode)
+        if cache_tts.contem(chave):
+            contagem["cached"] += 1
+        elif fila_prefetch.contem(chave):
+            contagem["already_queued"] += 1
+        else:
+            contagem["dropped"] += fila_prefetch.adicionar(chave, item)
+            contagem["queued"] += 1
+    if contagem["queued"]:
+        print(f"🔮 Pré-geração: {contagem['queued']} frases na fila ({len(fila_prefetch)} aguardando)")
+    return contagem
+
+# Áudios mais longos que isto são transcritos em trechos, cada um com sua vez no Whisper:
+# um cliente que desconecta ou estoura o prazo para no fim do trecho atual (0 = nunca dividir)
+STT_TRECHO_SEGUNDOS = float(os.getenv("STT_TRECHO_SEGUNDOS", "120"))
+
+async def transcrever_em_trechos(audio, idioma: str) -> Dict:
+    """Transcrever um áudio longo trecho a trecho (mesmo recorte dos trabalhos em segundo plano)"""
+    duracao = len(audio) / TAXA_AMOSTRAGEM
+    inicio, textos, segmentos, linguagem = 0.0, [], [], idioma
+    print(f"🎤 Iniciando transcrição com Whisper em trechos ({duracao:.0f}s de áudio)...")
+    while duracao - inicio > 0.05:
+        fim = min(inicio + STT_TRECHO_SEGUNDOS, duracao)
+        trecho = audio[int(inicio * TAXA_AMOSTRAGEM):int(fim * TAXA_AMOSTRAGEM)]
+        # O cancelamento (desconexão/prazo) chega aqui, entre um trecho e outro
+        async with aguardar_vez(escalonador_whisper, cargas_motores["whisper"]):
+            with medir_etapa("inference"):
+                resultado = await executar_bloqueante(motor_stt.transcrever, trecho, idioma)
+        if inicio == 0.0:
+            linguagem = resultado.get("language", idioma)
+        segmentos_trecho, texto, inicio = recortar_trecho(resultado, inicio, fim, duracao)
+        segmentos.extend(segmentos_trecho)
+        if texto:
+            textos.append(texto)
+    return {"text": " ".join(textos), "language": linguagem, "segments": segmentos}
+
+async def decodificar_upload(audio_bytes: bytes, file_extension: str):
+    """Decodificar o upload (via arquivo temporário) em PCM float32 mono 16 kHz"""
+    temp_path = None
+    try:
+        with medir_etapa("decode"):
+            # Salvar temporariamente com a extensão correta
+            with tempfile.NamedTemporaryFile(
+                suffix=file_extension, 
+                delete=False,
+                mode='wb'
+            ) as temp_file:
+                temp_file.write(audio_bytes)
+                temp_path = temp_file.name
+            
+            print(f"📄 Arquivo temporário criado: {temp_path}")
+            print(f"📊 Tamanho: {len(audio_bytes)} bytes")
+            
+            # Verificar se o arquivo existe
+            if not Path(temp_path).exists():
+                raise FileNotFoundError(f"Arquivo temporário não foi criado: {temp_path}")
+            
+            # Decodificar e reamostrar para 16 kHz mono (ffmpeg) antes da inferência
+            return await executar_bloqueante(decodificar_audio, temp_path)
     
     finally:
-        # Limpar cache CUDA se necessário
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
+        # Limpar arquivo temporário
+        if temp_path and Path(temp_path).exists():
+            try:
+                os.unlink(temp_path)
+                print(f"🗑️ Arquivo temporário removido: {temp_path}")
+            except Exception as e:
+                print(f"⚠️ Não foi possível remover arquivo temporário: {e}")
+
+async def transcrever_local(audio_bytes: bytes, file_extension: str) -> Dict:
+    """Decodificar o áudio e transcrever com o Whisper local"""
+    audio = await decodificar_upload(audio_bytes, file_extension)
+
+    # Transcrever com Whisper (áudios longos em trechos; ver transcrever_em_trechos)
+    duracao = len(audio) / TAXA_AMOSTRAGEM
+    if STT_TRECHO_SEGUNDOS > 0 and duracao > STT_TRECHO_SEGUNDOS:
+        result = await transcrever_em_trechos(audio, "de")
+    else:
+        async with aguardar_vez(escalonador_whisper, cargas_motores["whisper"]):
+            print("🎤 Iniciando transcrição com Whisper...")
+            with medir_etapa("inference"):
+                result = await executar_bloqueante(motor_stt.transcrever, audio, "de")  # Alemão
+    
+    print(f"✅ Transcrição concluída: {result['text'][:50]}...")
+    return result
 
 @app.post("/api/transcribe-audio")
-async def transcribe_audio(file: UploadFile = File(...)):
+async def transcribe_audio(conexao: Request, file: UploadFile = File(...)):
     """
     Transcrever áudio para texto (STT)
     Equivalente ao transcribeAudio() do Gemini
     """
-    temp_path = None
+    if gateway:
+        with medir_etapa("decode"):
+            audio_bytes = await file.read()
+        arquivo = (file.filename or "audio.wav", audio_bytes, file.content_type or "application/octet-stream")
+        return await encaminhar_para_peer("whisper", chave_audio(audio_bytes), "/api/transcribe-audio",
+                                          files={"file": arquivo})
+
     try:
-        # Ler arquivo de áudio
-        audio_bytes = await file.read()
-        
+        with medir_etapa("decode"):
+            # Ler arquivo de áudio
+            audio_bytes = await file.read()
+
         # Determinar extensão baseada no content type ou filename
         file_extension = Path(file.filename).suffix if file.filename else ".wav"
         if not file_extension:
             file_extension = ".wav"
-        
-        # Salvar temporariamente com a extensão correta
-        with tempfile.NamedTemporaryFile(
-            suffix=file_extension, 
-            delete=False,
-            mode='wb'
-        ) as temp_file:
-            temp_file.write(audio_bytes)
-            temp_path = temp_file.name
-        
-        print(f"📄 Arquivo temporário criado: {temp_path}")
-        print(f"📊 Tamanho: {len(audio_bytes)} bytes")
-        
-        # Verificar se o arquivo existe
-        if not Path(temp_path).exists():
-            raise FileNotFoundError(f"Arquivo temporário não foi criado: {temp_path}")
-        
-        # Transcrever com Whisper
-        print("🎤 Iniciando transcrição com Whisper...")
-        result = whisper_model.transcribe(
-            temp_path,
-            language="de",  # Alemão
-            fp16=torch.cuda.is_available(),  # Usar half-precision se GPU disponível
-            task="transcribe",
-            verbose=False
-        )
-        
-        print(f"✅ Transcrição concluída: {result['text'][:50]}...")
-        
-        return JSONResponse({
-            "text": result["text"].strip(),
-            "language": result.get("language", "de"),
-            "segments": [
-                {
-                    "start": seg["start"],
-                    "end": seg["end"],
-                    "text": seg["text"]
-                }
-                for seg in result.get("segments", [])
-            ]
-        })
+
+        # O mesmo áudio enviado ao mesmo tempo por vários clientes é transcrito uma vez só
+        chave = f"whisper|de|{chave_audio(audio_bytes)}"
+        result = await enquanto_necessaria(conexao, coalescer(chave, transcrever_local, audio_bytes, file_extension))
+
+        with medir_etapa("encode"):
+            return JSONResponse(result)
     
+    except (PrazoEsgotado, ClienteDesconectado):
+        raise
+
     except Exception as e:
         print(f"❌ Erro ao transcrever áudio: {e}")
         import traceback
@@ -357,22 +1619,161 @@ async def transcribe_audio(file: UploadFile = File(...)):
             status_code=500, 
             detail=f"Failed to transcribe audio: {str(e)}"
         )
-    
-    finally:
-        # Limpar arquivo temporário
-        if temp_path and Path(temp_path).exists():
+
+# Máximo de arquivos por requisição em /api/transcribe-audio/batch
+STT_LOTE_MAX_ARQUIVOS = int(os.getenv("STT_LOTE_MAX_ARQUIVOS", "100"))
+# Decodificações (ffmpeg) simultâneas dos arquivos de um lote
+DECODIFICACAO_CONCORRENCIA = int(os.getenv("DECODIFICACAO_CONCORRENCIA", str(os.cpu_count() or 2)))
+semaforo_decodificacao = asyncio.Semaphore(DECODIFICACAO_CONCORRENCIA)
+
+def resultado_arquivo(indice: int, nome: str, resultado: Optional[Dict] = None, erro: Optional[str] = None) -> Dict:
+    """Linha NDJSON de um arquivo do lote: a resposta de /api/transcribe-audio mais index e filename"""
+    if resultado is not None and "erro" in resultado:
+        erro = resultado["erro"]
+    if erro is not None:
+        return {"index": indice, "filename": nome, "error": erro}
+    return {"index": indice, "filename": nome, **resultado}
+
+async def transcrever_arquivos(arquivos: List[tuple], idioma: str):
+    """
+    Decodificar os arquivos em paralelo e transcrever em lotes com o que já estiver decodificado
+    (até WHISPER_LOTE por vez no Whisper), produzindo um resultado por arquivo assim que sai
+    """
+    decodificados: asyncio.Queue = asyncio.Queue()
+
+    async def decodificar(indice: int, nome: str, dados: bytes):
+        try:
+            async with semaforo_decodificacao:
+                audio = await decodificar_upload(dados, Path(nome).suffix or ".wav")
+            decodificados.put_nowait((indice, audio, None))
+        except Exception as e:
+            decodificados.put_nowait((indice, None, f"{type(e).__name__}: {e}"))
+
+    nomes = [nome for nome, _ in arquivos]
+    tarefas = [asyncio.ensure_future(decodificar(i, nome, dados)) for i, (nome, dados) in enumerate(arquivos)]
+    try:
+        restantes = len(arquivos)
+        while restantes:
+            prontos = [await decodificados.get()]
+            while len(prontos) < WHISPER_LOTE and not decodificados.empty():
+                prontos.append(decodificados.get_nowait())
+            restantes -= len(prontos)
+
+            lote = []
+            for indice, audio, erro in prontos:
+                if erro is not None:
+                    yield resultado_arquivo(indice, nomes[indice], erro=erro)
+                elif STT_TRECHO_SEGUNDOS > 0 and len(audio) / TAXA_AMOSTRAGEM > STT_TRECHO_SEGUNDOS:
+                    # Áudio longo: em trechos, fora do lote (cada trecho com sua vez no Whisper)
+                    try:
+                        yield resultado_arquivo(indice, nomes[indice], await transcrever_em_trechos(audio, idioma))
+                    except PrazoEsgotado:
+                        raise
+                    except Exception as e:
+                        yield resultado_arquivo(indice, nomes[indice], erro=f"{type(e).__name__}: {e}")
+                else:
+                    lote.append((indice, audio))
+            if not lote:
+                continue
+
+            print(f"🎤 Transcrevendo lote de {len(lote)} arquivos com Whisper...")
             try:
-                os.unlink(temp_path)
-                print(f"🗑️ Arquivo temporário removido: {temp_path}")
+                async with aguardar_vez(escalonador_whisper, cargas_motores["whisper"]):
+                    with medir_etapa("inference"):
+                        resultados = await executar_bloqueante(
+                            motor_stt.transcrever_lote, [audio for _, audio in lote], idioma
+                        )
+            except PrazoEsgotado:
+                raise
             except Exception as e:
-                print(f"⚠️ Não foi possível remover arquivo temporário: {e}")
-        
-        # Limpar cache CUDA
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
+                resultados = [{"erro": f"{type(e).__name__}: {e}"}] * len(lote)
+            for (indice, _), resultado in zip(lote, resultados):
+                yield resultado_arquivo(indice, nomes[indice], resultado)
+    finally:
+        # Cliente desconectou ou o prazo esgotou: parar as decodificações pendentes
+        for tarefa in tarefas:
+            tarefa.cancel()
+
+async def repassar_arquivos(arquivos: List[tuple], idioma: str):
+    """
+    Modo gateway: cada arquivo vai para o peer do hash dele, em paralelo
+    Vai como um lote de um arquivo só, que (ao contrário de /api/transcribe-audio) aceita o idioma
+    """
+    async def repassar(indice: int, nome: str, dados: bytes):
+        try:
+            resposta = await encaminhar_para_peer("whisper", chave_audio(dados), "/api/transcribe-audio/batch",
+                                                  files={"files": (nome, dados, "application/octet-stream")},
+                                                  data={"language": idioma})
+            if resposta.status_code != 200:
+                return resultado_arquivo(indice, nome, erro=str(json.loads(resposta.body).get("detail")))
+            # Uma linha para o arquivo (ou só a do prazo esgotado no peer)
+            corpo = json.loads(resposta.body.splitlines()[0])
+            if "error" in corpo:
+                return resultado_arquivo(indice, nome, erro=corpo["error"])
+            corpo.pop("index", None)
+            corpo.pop("filename", None)
+            return resultado_arquivo(indice, nome, corpo)
+        except HTTPException as e:
+            return resultado_arquivo(indice, nome, erro=str(e.detail))
+
+    tarefas = [asyncio.ensure_future(repassar(i, nome, dados)) for i, (nome, dados) in enumerate(arquivos)]
+    try:
+        for proxima in asyncio.as_completed(tarefas):
+            yield await proxima
+    finally:
+        for tarefa in tarefas:
+            tarefa.cancel()
+
+async def lote_transcricao_ndjson(resultados):
+    try:
+        async for resultado in resultados:
+            yield json.dumps(resultado, ensure_ascii=False) + "\n"
+    except PrazoEsgotado as e:
+        # A resposta já começou: o prazo esgotado vai como última linha
+        yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+
+@app.post("/api/transcribe-audio/batch")
+async def transcribe_audio_batch(
+    conexao: Request,
+    files: List[UploadFile] = File(...),
+    language: str = Form(default="de"),
+):
+    """
+    Transcrever vários arquivos numa requisição só (ex.: uma pasta de gravações)
+    Os arquivos são decodificados em paralelo e passam pelo Whisper em lotes; cada resultado
+    é enviado (NDJSON, fora de ordem) assim que fica pronto, com index e filename.
+    Um arquivo que falha vira {"index", "filename", "error"} sem afetar os outros
+    """
+    if len(files) > STT_LOTE_MAX_ARQUIVOS:
+        raise HTTPException(status_code=400, detail=f"Máximo de {STT_LOTE_MAX_ARQUIVOS} arquivos por lote")
+
+    with medir_etapa("decode"):
+        arquivos = [(file.filename or f"audio{i}.wav", await file.read()) for i, file in enumerate(files)]
+
+    # Lotes disputam o Whisper como bulk, a menos que o cliente peça outra prioridade
+    if "X-Priority" not in conexao.headers:
+        _prioridade_atual.set("bulk")
+
+    print(f"🎤 Recebido lote de {len(arquivos)} arquivos para transcrição")
+    resultados = repassar_arquivos(arquivos, language) if gateway else transcrever_arquivos(arquivos, language)
+    return StreamingResponse(lote_transcricao_ndjson(resultados), media_type="application/x-ndjson")
+
+async def transcrever_openai(audio_bytes: bytes, content_type: Optional[str]):
+    # Enviar para transcrição usando o novo cliente OpenAI
+    print("🎤 Enviando áudio para OpenAI (idioma: alemão)...")
+    async with aguardar_vez(None, cargas_motores["openai"]), medir_etapa("remote"):
+        response = await executar_bloqueante(
+            client_openai.audio.transcriptions.create,
+            file=("audio.wav", audio_bytes, content_type),
+            model=MODELO_TRANSCRICAO_OPENAI,
+            language="de"  # Especificar idioma alemão
+        )
+
+    print("✅ Resposta recebida da OpenAI")
+    return response
 
 @app.post("/api/transcribe-audio-openai")
-async def transcribe_audio_openai(file: UploadFile = File(...)):
+async def transcribe_audio_openai(conexao: Request, file: UploadFile = File(...)):
     """
     Transcrever áudio usando o modelo da OpenAI.
     Depende das variáveis de ambiente:
@@ -392,18 +1793,15 @@ async def transcribe_audio_openai(file: UploadFile = File(...)):
         )
 
     try:
-        audio_bytes = await file.read()
+        with medir_etapa("decode"):
+            audio_bytes = await file.read()
 
-        # Enviar para transcrição usando o novo cliente OpenAI
-        print("🎤 Enviando áudio para OpenAI (idioma: alemão)...")
-        response = client_openai.audio.transcriptions.create(
-            file=("audio.wav", audio_bytes, file.content_type),
-            model=MODELO_TRANSCRICAO_OPENAI,
-            language="de"  # Especificar idioma alemão
+        # Uploads idênticos simultâneos geram uma única chamada (paga) à OpenAI
+        chave = f"openai|{MODELO_TRANSCRICAO_OPENAI}|de|{chave_audio(audio_bytes)}"
+        response = await enquanto_necessaria(
+            conexao, coalescer(chave, transcrever_openai, audio_bytes, file.content_type)
         )
 
-        print("✅ Resposta recebida da OpenAI")
-
         # A resposta padrão da API OpenAI tem pelo menos: text
         text = response.text
 
@@ -419,11 +1817,15 @@ async def transcribe_audio_openai(file: UploadFile = File(...)):
                 for seg in response.segments
             ]
 
-        return JSONResponse({
-            "text": text,
-            "language": getattr(response, "language", None),
-            "segments": segments
-        })
+        with medir_etapa("encode"):
+            return JSONResponse({
+                "text": text,
+                "language": getattr(response, "language", None),
+                "segments": segments
+            })
+
+    except (PrazoEsgotado, ClienteDesconectado):
+        raise
 
     except Exception as e:
         print(f"❌ Erro no serviço OpenAI: {e}")
@@ -432,6 +1834,155 @@ async def transcribe_audio_openai(file: UploadFile = File(...)):
             detail=f"Erro ao transcrever via OpenAI: {str(e)}"
         )
 
+@app.post("/api/jobs/transcribe", status_code=202, dependencies=[Depends(exigir_fila_trabalhos)])
+async def criar_trabalho_transcricao(
+    file: UploadFile = File(...),
+    callback_url: Optional[str] = Form(default=None),
+    language: str = Form(default="de"),
+):
+    """
+    Enfileirar uma transcrição longa e retornar o ID imediatamente
+    Acompanhe com GET /api/jobs/{id} ou informe callback_url para receber o resultado por POST
+    """
+    if callback_url and not callback_url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=400, detail="callback_url deve ser http:// ou https://")
+
+    extensao = Path(file.filename).suffix if file.filename else ".wav"
+    caminho = fila_trabalhos.novo_caminho_audio(extensao)
+    with medir_etapa("decode"):
+        # Direto para o disco, sem manter o upload inteiro em memória
+        await run_in_threadpool(salvar_upload, file.file, caminho)
+
+    trabalho = await run_in_threadpool(fila_trabalhos.criar, caminho, language, callback_url)
+    novo_trabalho.set()
+    print(f"📋 Trabalho {trabalho['id']} enfileirado")
+    return JSONResponse(
+        formatar_trabalho(trabalho),
+        status_code=202,
+        headers={"Location": f"/api/jobs/{trabalho['id']}"},
+    )
+
+@app.get("/api/jobs/{trabalho_id}", dependencies=[Depends(exigir_fila_trabalhos)])
+async def consultar_trabalho(trabalho_id: str, include_segments: bool = True):
+    """Estado, progresso (0 a 1), texto e segmentos já transcritos de um trabalho"""
+    trabalho = await run_in_threadpool(fila_trabalhos.obter, trabalho_id, include_segments)
+    if trabalho is None:
+        raise HTTPException(status_code=404, detail="Trabalho não encontrado")
+    return formatar_trabalho(trabalho)
+
+@app.delete("/api/jobs/{trabalho_id}", dependencies=[Depends(exigir_fila_trabalhos)])
+async def cancelar_trabalho(trabalho_id: str):
+    """Cancelar um trabalho na fila ou em andamento (para no próximo trecho)"""
+    trabalho = await run_in_threadpool(fila_trabalhos.obter, trabalho_id, False)
+    if trabalho is None:
+        raise HTTPException(status_code=404, detail="Trabalho não encontrado")
+    if trabalho["estado"] in FINAIS or not await run_in_threadpool(fila_trabalhos.cancelar, trabalho_id):
+        raise HTTPException(status_code=409, detail=f"Trabalho já finalizado ({trabalho['estado']})")
+    return formatar_trabalho(await run_in_threadpool(fila_trabalhos.obter, trabalho_id, False))
+
+# ============================================
+# ADMINISTRAÇÃO
+# ============================================
+
+@app.get("/admin/profiles/{perfil_id}", dependencies=[Depends(verificar_admin)])
+async def baixar_perfil(perfil_id: str, formato: str = "speedscope"):
+    """
+    Baixar um perfil gravado (ID retornado no cabeçalho X-Profile-Id)
+    formato: speedscope (JSON para https://www.speedscope.app) ou collapsed (flamegraph.pl)
+    """
+    if not re.fullmatch(r"[0-9T]+-[0-9a-f]{8}", perfil_id):
+        raise HTTPException(status_code=400, detail="ID de perfil inválido")
+    if formato not in ("speedscope", "collapsed"):
+        raise HTTPException(status_code=400, detail="Formato deve ser 'speedscope' ou 'collapsed'")
+
+    sufixo = ".speedscope.json" if formato == "speedscope" else ".collapsed.txt"
+    caminho = PROFILING_DIR / f"{perfil_id}{sufixo}"
+    if not caminho.exists():
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    return FileResponse(caminho, filename=caminho.name)
+
+@app.post("/admin/drain", dependencies=[Depends(verificar_admin)])
+async def drenar(ativo: bool = True):
+    """Tirar o nó de rotação (/ready passa a 503) sem recusar requisições já roteadas"""
+    if ESTADO_NO in ("iniciando", "recarregando"):
+        raise HTTPException(status_code=409, detail=f"Nó em estado '{ESTADO_NO}'")
+    definir_estado("drenando" if ativo else "pronto")
+    return {"estado": ESTADO_NO, "ocioso": motores_ociosos()}
+
+@app.post("/admin/models/reload", dependencies=[Depends(verificar_admin)])
+async def recarregar_modelos():
+    """
+    Drenar e recarregar os modelos (ou reconectar ao servidor de modelos)
+    O nó sai de rotação, espera as requisições locais terminarem e volta a 'pronto'
+    """
+    if gateway:
+        raise HTTPException(status_code=409, detail="Modo gateway não carrega modelos")
+    if ESTADO_NO in ("iniciando", "recarregando"):
+        raise HTTPException(status_code=409, detail=f"Nó em estado '{ESTADO_NO}'")
+    anterior = ESTADO_NO
+    definir_estado("recarregando")
+    inicio = time.perf_counter()
+    try:
+        prazo = inicio + DRAIN_TIMEOUT
+        while not motores_ociosos():
+            if time.perf_counter() > prazo:
+                raise HTTPException(status_code=504, detail="Motores não esvaziaram dentro de DRAIN_TIMEOUT")
+            await asyncio.sleep(0.1)
+        await run_in_threadpool(inicializar_motores)
+    except BaseException:
+        definir_estado(anterior)
+        raise
+    definir_estado("pronto")
+    return {"estado": ESTADO_NO, "duracao": round(time.perf_counter() - inicio, 3)}
+
+@app.get("/admin/memory", dependencies=[Depends(verificar_admin)])
+async def estado_memoria():
+    """RSS do processo, alocador do torch, tracemalloc, picos por etapa e snapshots"""
+    estado = {
+        "processo": memoria.memoria_processo(),
+        "tracemalloc": memoria.estado_tracemalloc(),
+        "picos_por_etapa": picos_etapas.como_dict(),
+        "snapshots": snapshots_memoria.listar(),
+    }
+    if gateway:
+        pass  # Sem modelos neste processo
+    elif MODEL_SERVER_ADDRESS:
+        # Os modelos (e o alocador do torch) vivem no servidor de modelos
+        estado["servidor_modelos"] = await executar_bloqueante(motor_stt.memoria)
+        estado["torch"] = estado["servidor_modelos"]["torch"]
+    else:
+        estado["torch"] = motor_stt.memoria()
+    return estado
+
+@app.post("/admin/memory/tracemalloc", dependencies=[Depends(verificar_admin)])
+async def configurar_tracemalloc(ativo: bool = True, quadros: int = Query(default=1, ge=1, le=50)):
+    """Ligar ou desligar o tracemalloc (quadros = profundidade da pilha guardada por alocação)"""
+    if ativo:
+        memoria.iniciar_tracemalloc(quadros)
+    else:
+        memoria.parar_tracemalloc()
+        snapshots_memoria.limpar()
+        picos_etapas.limpar()
+    return memoria.estado_tracemalloc()
+
+@app.post("/admin/memory/snapshots", dependencies=[Depends(verificar_admin)])
+async def capturar_snapshot_memoria():
+    """Capturar um snapshot do tracemalloc (mantém os 10 mais recentes)"""
+    try:
+        return await run_in_threadpool(snapshots_memoria.capturar)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/admin/memory/snapshots/{antigo}/diff/{novo}", dependencies=[Depends(verificar_admin)])
+async def diff_snapshots_memoria(antigo: str, novo: str, agrupamento: str = "lineno", limite: int = 25):
+    """Maiores diferenças de alocação entre dois snapshots (agrupamento: lineno, filename ou traceback)"""
+    if agrupamento not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="Agrupamento deve ser lineno, filename ou traceback")
+    try:
+        return await run_in_threadpool(snapshots_memoria.diff, antigo, novo, agrupamento, limite)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
 # ============================================
 # INICIALIZAÇÃO
 # ============================================
@@ -446,12 +1997,43 @@ if __name__ == "__main__":
     print("   - POST /api/generate-audio")
     print("   - POST /api/transcribe-audio (Whisper local)")
     print("   - POST /api/transcribe-audio-openai (OpenAI)")
+    print("   - POST /api/jobs/transcribe e GET /api/jobs/{id} (transcrição em segundo plano)")
     print("   - GET  /health")
+    print("   - GET  /ready e /capacity (balanceamento)")
+    print("   - GET  /admin/profiles/{id} (requer ADMIN_TOKEN)")
+    print("   - GET  /admin/memory (requer ADMIN_TOKEN)")
     print(f"🌐 CORS permitido para: {', '.join(CORS_ORIGINS)}")
+    if HTTP_WORKERS > 1:
+        print(f"👷 Workers HTTP: {HTTP_WORKERS} (modelos no servidor de modelos)")
+    if MODEL_SERVER_WORKERS > 0 and not GATEWAY_PEERS:
+        print(f"🍴 Workers de inferência pré-fork: {MODEL_SERVER_WORKERS}")
+    if GATEWAY_PEERS:
+        print(f"🔀 Modo gateway: {', '.join(GATEWAY_PEERS)}")
     if client_openai:
         print(f"✓ OpenAI: Configurado (Modelo: {MODELO_TRANSCRICAO_OPENAI})")
     else:
         print("⚠️  OpenAI: Não configurado (adicione OPENAI_API_KEY no .env)")
     print("="*50 + "\n")
 
-    uvicorn.run(app, host=SERVICE_HOST, port=SERVICE_PORT)
\ No newline at end of file
+    if HTTP_WORKERS <= 1 and (MODEL_SERVER_ADDRESS or GATEWAY_PEERS or MODEL_SERVER_WORKERS <= 0):
+        uvicorn.run(app, host=SERVICE_HOST, port=SERVICE_PORT)
+        sys.exit(0)
+
+    # Vários workers (HTTP ou de inferência): os modelos são carregados uma única vez no servidor de modelos
+    servidor_modelos = None
+    if not MODEL_SERVER_ADDRESS and not GATEWAY_PEERS:
+        os.environ["MODEL_SERVER_ADDRESS"] = f"127.0.0.1:{SERVICE_PORT + 1}"
+        os.environ["MODEL_SERVER_AUTHKEY"] = MODEL_SERVER_AUTHKEY or secrets.token_hex(16)
+        print(f"🧠 Iniciando servidor de modelos em {os.environ['MODEL_SERVER_ADDRESS']}...")
+        servidor_modelos = subprocess.Popen(
+            [sys.executable, str(Path(__file__).with_name("servidor_modelos.py"))],
+            env=os.environ.copy()
+        )
+
+    try:
+        # Os workers importam o módulo de novo e herdam MODEL_SERVER_* do ambiente
+        uvicorn.run("servico_tts_e_stt:app", host=SERVICE_HOST, port=SERVICE_PORT, workers=HTTP_WORKERS)
+    finally:
+        if servidor_modelos:
+            servidor_modelos.terminate()
+            servidor_modelos.wait()
\ No newline at end of file
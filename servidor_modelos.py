@@ -0,0 +1,681 @@
+"""
+Servidor de Modelos
+Processo que carrega Whisper e Piper uma única vez e atende os workers HTTP do
+servico_tts_e_stt.py via multiprocessing.connection. O áudio trafega em memória
+compartilhada (multiprocessing.shared_memory); pela conexão passam só metadados
+
+Com MODEL_SERVER_WORKERS=N (Linux/macOS), o processo principal carrega os modelos e
+cria N workers de inferência por fork: os pesos do Whisper ficam compartilhados
+copy-on-write e cada worker roda fixo em um conjunto disjunto de núcleos
+
+Uso isolado:
+    MODEL_SERVER_ADDRESS=127.0.0.1:3016 MODEL_SERVER_AUTHKEY=segredo python servidor_modelos.py
+    MODEL_SERVER_WORKERS=4 MODEL_SERVER_AUTHKEY=segredo python servidor_modelos.py
+"""
+
+import gc
+import itertools
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+import memoria
+from escalonador import PRIORIDADE_PADRAO, EscalonadorThreads, PrazoEsgotado
+from motores import (
+    CargaMotor, ErroPiper, MotorPiper, MotorWhisper, PIPER_VOZES, PIPER_VOZ_PADRAO, criar_motor_piper, estado_carga,
+    vagas_piper
+)
+from vozes import VozDesconhecida, modelo_da_voz
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+MODEL_SERVER_ADDRESS = os.getenv("MODEL_SERVER_ADDRESS", "127.0.0.1:3016")
+MODEL_SERVER_AUTHKEY = os.getenv("MODEL_SERVER_AUTHKEY", "")
+PIPER_CONCORRENCIA = vagas_piper(int(os.getenv("PIPER_CONCORRENCIA", "2")))
+# Workers de inferência pré-fork (0 = threads em um único processo)
+MODEL_SERVER_WORKERS = int(os.getenv("MODEL_SERVER_WORKERS", "0"))
+# Fixar cada worker em seus núcleos (os.sched_setaffinity)
+MODEL_SERVER_PIN_CORES = os.getenv("MODEL_SERVER_PIN_CORES", "1") != "0"
+
+# Operações executadas pelos workers no modo pré-fork (e o motor de cada uma);
+# as demais ficam no processo principal
+OPERACOES_INFERENCIA = {"transcrever": "whisper", "transcrever_lote": "whisper", "sintetizar": "piper"}
+
+# ============================================
+# ENDEREÇO E MEMÓRIA COMPARTILHADA
+# ============================================
+
+def interpretar_endereco(endereco: str):
+    """'host:porta' vira tupla TCP; qualquer outro valor é socket Unix ou named pipe"""
+    host, separador, porta = endereco.rpartition(":")
+    if separador and porta.isdigit() and not endereco.startswith("\\\\"):
+        return (host or "127.0.0.1", int(porta))
+    return endereco
+
+
+def _sem_rastreamento(shm: SharedMemory) -> SharedMemory:
+    # Antes do Python 3.13 todo processo que cria ou anexa um bloco o registra no
+    # resource_tracker, que o apaga ao encerrar. Aqui quem consome o bloco o libera
+    if os.name == "posix" and sys.version_info < (3, 13):
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def criar_memoria(tamanho: int) -> SharedMemory:
+    if sys.version_info >= (3, 13):
+        return SharedMemory(create=True, size=max(tamanho, 1), track=False)
+    return _sem_rastreamento(SharedMemory(create=True, size=max(tamanho, 1)))
+
+
+def anexar_memoria(nome: str) -> SharedMemory:
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=nome, track=False)
+    return _sem_rastreamento(SharedMemory(name=nome))
+
+
+def liberar_memoria(shm: SharedMemory, apagar: bool = False):
+    try:
+        shm.close()
+    except BufferError:
+        pass  # Ainda há views ativas; o GC fecha o mapeamento depois
+    if apagar:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+def prazo_do_pedido(pedido: Dict, duracao_media: Optional[float] = None) -> Optional[float]:
+    """
+    Último instante (time.monotonic) para começar a executar o pedido e ainda terminar
+    dentro dos segundos restantes enviados pelo cliente
+    """
+    restante = pedido.get("prazo")
+    if restante is None:
+        return None
+    return time.monotonic() + restante - (duracao_media or 0.0)
+
+# ============================================
+# SERVIDOR
+# ============================================
+
+class ServidorModelos:
+    """Atende pedidos de transcrição e síntese, uma thread por conexão"""
+
+    def __init__(self, whisper: MotorWhisper, piper: MotorPiper, piper_concorrencia: int = PIPER_CONCORRENCIA,
+                 pool: Optional["PoolPreFork"] = None):
+        self.whisper = whisper
+        self.piper = piper
+        self.pool = pool
+        # Uma transcrição por vez (modelo não é thread-safe); Piper em subprocessos paralelos
+        # A vez é dada pela prioridade enviada pelo cliente (ver escalonador.py)
+        self.escalonador_whisper = EscalonadorThreads(1)
+        self.escalonador_piper = EscalonadorThreads(piper_concorrencia)
+        self.cargas = {"whisper": CargaMotor(1), "piper": CargaMotor(piper_concorrencia)}
+
+    def servir(self, endereco, authkey: bytes):
+        with Listener(endereco, authkey=authkey) as listener:
+            print(f"🧠 Servidor de modelos ouvindo em {listener.address}")
+            while True:
+                try:
+                    conexao = listener.accept()
+                except Exception as e:
+                    print(f"⚠️ Conexão recusada: {e}")
+                    continue
+                threading.Thread(target=self._atender, args=(conexao,), daemon=True).start()
+
+    def _atender(self, conexao):
+        with conexao:
+            while True:
+                try:
+                    pedido = conexao.recv()
+                except (EOFError, OSError):
+                    return
+                conexao.send(self.responder(pedido))
+
+    def responder(self, pedido: Dict) -> Dict:
+        """Processar `pedido` e montar a resposta enviada ao cliente (erros incluídos)"""
+        if self.pool and pedido.get("op") in OPERACOES_INFERENCIA:
+            return self.pool.executar(pedido)
+        try:
+            return {"ok": True, **self.processar(pedido)}
+        except Exception as e:
+            # ErroPiper, PrazoEsgotado etc.: o cliente recria a exceção pelo nome do tipo
+            return {"ok": False, "tipo": type(e).__name__, "erro": str(e)}
+
+    def processar(self, pedido: Dict) -> Dict:
+        operacao = pedido.get("op")
+        if operacao in ("transcrever", "transcrever_lote"):
+            return self._transcrever(pedido)
+        if operacao == "sintetizar":
+            return self._sintetizar(pedido)
+        if operacao == "precarregar":
+            if self.pool:
+                # Cada worker carrega as próprias vozes (no uso ou por PIPER_VOZES_PRECARREGAR)
+                for voz in pedido["vozes"]:
+                    modelo_da_voz(PIPER_VOZES, voz)
+                return {"resultado": []}
+            return {"resultado": self.piper.precarregar(pedido["vozes"])}
+        if operacao == "info":
+            return {"resultado": self.info()}
+        if operacao == "capacidade":
+            return {"resultado": self.capacidade()}
+        if operacao == "memoria":
+            resultado = {
+                "processo": {**memoria.memoria_processo(), **memoria.memoria_compartilhada()},
+                "torch": self.whisper.memoria(),
+            }
+            if self.pool:
+                resultado["workers"] = self.pool.memoria()
+            return {"resultado": resultado}
+        raise ValueError(f"Operação desconhecida: {operacao}")
+
+    def _transcrever(self, pedido: Dict) -> Dict:
+        shm = anexar_memoria(pedido["shm"])
+        try:
+            # View direta sobre o bloco compartilhado, sem cópia
+            # No lote, `amostras` é a lista de tamanhos dos áudios, gravados em sequência
+            amostras = pedido["amostras"]
+            lote = pedido["op"] == "transcrever_lote"
+            audio = np.ndarray((sum(amostras) if lote else amostras,), dtype=np.float32, buffer=shm.buf)
+            carga = self.cargas["whisper"]
+            carga.entrar()
+            execucao = None
+            try:
+                inicio = time.perf_counter()
+                prioridade = pedido.get("prioridade", PRIORIDADE_PADRAO)
+                with self.escalonador_whisper.vez(prioridade, prazo_do_pedido(pedido, carga.duracao_media)):
+                    espera = time.perf_counter() - inicio
+                    execucao = carga.iniciar()
+                    if lote:
+                        limites = np.cumsum([0, *amostras])
+                        audios = [audio[a:b] for a, b in zip(limites[:-1], limites[1:])]
+                        resultado = self.whisper.transcrever_lote(audios, **pedido.get("opcoes", {}))
+                        del audios
+                    else:
+                        resultado = self.whisper.transcrever(audio, **pedido.get("opcoes", {}))
+            finally:
+                carga.sair(execucao)
+            del audio
+        finally:
+            liberar_memoria(shm)
+        return {"resultado": resultado, "espera": espera}
+
+    def _sintetizar(self, pedido: Dict) -> Dict:
+        if not self.piper.disponivel:
+            raise ErroPiper("Piper TTS não disponível no servidor de modelos")
+
+        carga = self.cargas["piper"]
+        carga.entrar()
+        execucao = None
+        try:
+            inicio = time.perf_counter()
+            prioridade = pedido.get("prioridade", PRIORIDADE_PADRAO)
+            with self.escalonador_piper.vez(prioridade, prazo_do_pedido(pedido, carga.duracao_media)):
+                espera = time.perf_counter() - inicio
+                execucao = carga.iniciar()
+                wav = self.piper.sintetizar(pedido["texto"], pedido.get("length_scale", 1.0),
+                                            pedido.get("voz", PIPER_VOZ_PADRAO))
+        finally:
+            carga.sair(execucao)
+
+        # O cliente copia o WAV e apaga o bloco
+        shm = criar_memoria(len(wav))
+        shm.buf[:len(wav)] = wav
+        nome = shm.name
+        liberar_memoria(shm)
+        return {"shm": nome, "tamanho": len(wav), "espera": espera}
+
+    def info(self) -> Dict:
+        info = {"whisper": self.whisper.info(), "piper": self.piper.info()}
+        if self.pool:
+            info["prefork"] = self.pool.info()
+        return info
+
+    def capacidade(self) -> Dict:
+        """Fila, execuções e espera estimada de cada motor"""
+        if self.pool:
+            return self.pool.capacidade()
+        capacidade = {nome: carga.estado() for nome, carga in self.cargas.items()}
+        capacidade["whisper"]["prioridades"] = self.escalonador_whisper.estado()["classes"]
+        capacidade["piper"]["prioridades"] = self.escalonador_piper.estado()["classes"]
+        return capacidade
+
+# ============================================
+# PRÉ-FORK (WORKERS COPY-ON-WRITE)
+# ============================================
+
+def dividir_nucleos(processos: int) -> List[List[int]]:
+    """Dividir os núcleos disponíveis a este processo em `processos` conjuntos contíguos e disjuntos"""
+    if hasattr(os, "sched_getaffinity"):
+        nucleos = sorted(os.sched_getaffinity(0))
+    else:
+        nucleos = list(range(os.cpu_count() or 1))
+
+    if processos > len(nucleos):
+        print(f"⚠️ {processos} workers para {len(nucleos)} núcleos: alguns núcleos serão compartilhados")
+        return [[nucleos[i % len(nucleos)]] for i in range(processos)]
+
+    base, resto = divmod(len(nucleos), processos)
+    conjuntos, inicio = [], 0
+    for i in range(processos):
+        fim = inicio + base + (1 if i < resto else 0)
+        conjuntos.append(nucleos[inicio:fim])
+        inicio = fim
+    return conjuntos
+
+
+def _laco_worker(indice, nucleos, fixar, whisper, piper, tarefas, resultados, tarefa_atual):
+    """Corpo de cada worker: usa os modelos herdados do processo principal e consome a fila de tarefas"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # O processo principal coordena o encerramento
+
+    if fixar and hasattr(os, "sched_setaffinity"):
+        # Herdado pelos subprocessos do Piper, que também ficam nestes núcleos
+        os.sched_setaffinity(0, nucleos)
+    whisper.configurar_threads(len(nucleos))
+    piper.configurar_threads(len(nucleos))
+
+    servidor = ServidorModelos(whisper, piper, piper_concorrencia=1)
+    pai = os.getppid()
+    while True:
+        try:
+            tarefa = tarefas.get(timeout=1)
+        except queue.Empty:
+            if os.getppid() != pai:
+                return  # Processo principal encerrou sem avisar
+            continue
+        if tarefa is None:
+            return
+
+        tarefa_id, pedido, enfileirado = tarefa
+        tarefa_atual.value = tarefa_id
+        # time.monotonic usa o mesmo relógio em todos os processos da máquina
+        espera = time.monotonic() - enfileirado
+        resposta = servidor.responder(pedido)
+        resposta["espera"] = resposta.get("espera", 0) + espera
+        resultados.put((tarefa_id, resposta))
+        tarefa_atual.value = -1
+
+
+class PoolPreFork:
+    """
+    Workers de inferência criados por fork depois que os modelos foram carregados
+    Os pesos do Whisper são herdados copy-on-write (não há cópia por worker) e cada
+    worker consome a fila comum, então quem estiver livre pega a próxima tarefa
+    """
+
+    def __init__(self, whisper: MotorWhisper, piper: MotorPiper, processos: int,
+                 fixar_nucleos: bool = MODEL_SERVER_PIN_CORES):
+        self.whisper = whisper
+        self.piper = piper
+        self.fixar_nucleos = fixar_nucleos
+        self.nucleos = dividir_nucleos(processos)
+        self._contexto = multiprocessing.get_context("fork")
+        self._tarefas = self._contexto.Queue()
+        self._resultados = self._contexto.Queue()
+        self._workers: List = []
+        self._tarefas_atuais: List = []
+        self._encerrados = set()
+        self._pendentes: Dict[int, list] = {}
+        self._ids = itertools.count()
+        # Duração média e total de execuções por motor (para a espera estimada)
+        self._cargas = {motor: CargaMotor(processos) for motor in OPERACOES_INFERENCIA.values()}
+        # No máximo uma tarefa por worker na fila do multiprocessing: as demais esperam aqui,
+        # onde a prioridade decide quem sai primeiro
+        self._escalonador = EscalonadorThreads(processos)
+        self._trava = threading.Lock()
+        self._ativo = False
+
+    def iniciar(self):
+        # Tira os objetos já criados (incluindo o modelo) do alcance do GC cíclico:
+        # sem isso, as coletas nos workers tocariam seus cabeçalhos e duplicariam páginas
+        gc.freeze()
+        for indice, nucleos in enumerate(self.nucleos):
+            tarefa_atual = self._contexto.Value("q", -1, lock=False)
+            processo = self._contexto.Process(
+                target=_laco_worker,
+                args=(indice, nucleos, self.fixar_nucleos, self.whisper, self.piper,
+                      self._tarefas, self._resultados, tarefa_atual),
+                name=f"inferencia-{indice}",
+                daemon=True,
+            )
+            processo.start()
+            self._workers.append(processo)
+            self._tarefas_atuais.append(tarefa_atual)
+            print(f"✓ Worker {indice} (pid {processo.pid}) nos núcleos {nucleos}")
+
+        # Threads só depois do fork: o processo principal não as repassa aos workers
+        self._ativo = True
+        threading.Thread(target=self._coletar, daemon=True).start()
+
+    def executar(self, pedido: Dict) -> Dict:
+        """Enfileirar `pedido` e aguardar a resposta de algum worker"""
+        enfileirado = time.monotonic()
+        # [evento, resposta, motor, instante em que entrou na fila]
+        pendente = [threading.Event(), None, OPERACOES_INFERENCIA[pedido["op"]], enfileirado]
+        tarefa_id = next(self._ids)
+        with self._trava:
+            if len(self._encerrados) == len(self._workers):
+                return {"ok": False, "tipo": "RuntimeError", "erro": "Nenhum worker de inferência ativo"}
+            self._pendentes[tarefa_id] = pendente
+        try:
+            prazo = prazo_do_pedido(pedido, self._cargas[pendente[2]].duracao_media)
+            self._escalonador.adquirir(pedido.get("prioridade", PRIORIDADE_PADRAO), prazo)
+        except PrazoEsgotado as e:
+            with self._trava:
+                self._pendentes.pop(tarefa_id, None)
+            return {"ok": False, "tipo": "PrazoEsgotado", "erro": str(e)}
+        try:
+            self._tarefas.put((tarefa_id, pedido, enfileirado))
+            pendente[0].wait()
+        finally:
+            self._escalonador.liberar()
+        return pendente[1]
+
+    def _concluir(self, tarefa_id: int, resposta: Dict):
+        with self._trava:
+            pendente = self._pendentes.pop(tarefa_id, None)
+            if pendente and resposta.get("ok"):
+                carga = self._cargas[pendente[2]]
+                carga.concluidas += 1
+                carga.registrar_duracao(time.monotonic() - pendente[3] - resposta.get("espera", 0))
+        if pendente:
+            pendente[1] = resposta
+            pendente[0].set()
+
+    def _coletar(self):
+        ultima_verificacao = time.monotonic()
+        while self._ativo:
+            try:
+                tarefa_id, resposta = self._resultados.get(timeout=1)
+                self._concluir(tarefa_id, resposta)
+            except queue.Empty:
+                pass
+            if time.monotonic() - ultima_verificacao >= 1:
+                self._verificar_workers()
+                ultima_verificacao = time.monotonic()
+
+    def _verificar_workers(self):
+        """Falhar a tarefa de um worker que morreu (ex.: OOM) em vez de deixar o cliente esperando"""
+        for indice, processo in enumerate(self._workers):
+            if indice in self._encerrados or processo.exitcode is None:
+                continue
+            print(f"⚠️ Worker {indice} (pid {processo.pid}) encerrou com código {processo.exitcode}")
+            with self._trava:
+                self._encerrados.add(indice)
+                todos_encerrados = len(self._encerrados) == len(self._workers)
+                perdidas = list(self._pendentes) if todos_encerrados else [self._tarefas_atuais[indice].value]
+            for tarefa_id in perdidas:
+                self._concluir(tarefa_id, {
+                    "ok": False,
+                    "tipo": "RuntimeError",
+                    "erro": f"Worker de inferência {indice} encerrou (código {processo.exitcode})",
+                })
+
+    def info(self) -> Dict:
+        return {
+            "workers": [
+                {
+                    "indice": indice,
+                    "pid": processo.pid,
+                    "nucleos": self.nucleos[indice],
+                    "ativo": indice not in self._encerrados,
+                }
+                for indice, processo in enumerate(self._workers)
+            ],
+            "fixar_nucleos": self.fixar_nucleos,
+        }
+
+    def capacidade(self) -> Dict:
+        """
+        Fila e execuções por motor; os workers são compartilhados pelos dois motores,
+        então a espera estimada considera o trabalho de ambos à frente
+        """
+        with self._trava:
+            motores = {tarefa_id: pendente[2] for tarefa_id, pendente in self._pendentes.items()}
+            ativos = [
+                atual.value for indice, atual in enumerate(self._tarefas_atuais)
+                if indice not in self._encerrados
+            ]
+            cargas = {motor: (carga.duracao_media, carga.concluidas) for motor, carga in self._cargas.items()}
+
+        em_execucao = {motor: 0 for motor in cargas}
+        total = {motor: 0 for motor in cargas}
+        for tarefa_id in ativos:
+            if tarefa_id in motores:
+                em_execucao[motores[tarefa_id]] += 1
+        for motor in motores.values():
+            total[motor] += 1
+
+        vagas = len(ativos)
+        ocupados = sum(em_execucao.values())
+        prioridades = self._escalonador.estado()["classes"]
+        trabalho = sum((total[motor] - em_execucao[motor]) * (cargas[motor][0] or 0) for motor in cargas)
+        resultado = {}
+        for motor, (duracao_media, concluidas) in cargas.items():
+            estado = estado_carga(total[motor] - em_execucao[motor], em_execucao[motor], vagas,
+                                  duracao_media, concluidas)
+            if vagas == 0:
+                estado["espera_estimada"] = None
+            elif ocupados < vagas:
+                estado["espera_estimada"] = 0.0
+            elif duracao_media is not None:
+                estado["espera_estimada"] = round((trabalho + duracao_media) / vagas, 4)
+            # Fila por prioridade compartilhada pelos dois motores
+            estado["prioridades"] = prioridades
+            resultado[motor] = estado
+        return resultado
+
+    def memoria(self) -> List[Dict]:
+        resultado = []
+        for indice, processo in enumerate(self._workers):
+            if indice in self._encerrados:
+                continue
+            try:
+                resultado.append({
+                    "indice": indice,
+                    "pid": processo.pid,
+                    **memoria.memoria_processo(processo.pid),
+                    **memoria.memoria_compartilhada(processo.pid),
+                })
+            except Exception:
+                pass  # Worker encerrou durante a leitura
+        return resultado
+
+    def encerrar(self):
+        self._ativo = False
+        for _ in self._workers:
+            self._tarefas.put(None)
+        for processo in self._workers:
+            processo.join(timeout=5)
+            if processo.is_alive():
+                processo.terminate()
+
+# ============================================
+# CLIENTE (USADO PELOS WORKERS HTTP)
+# ============================================
+
+class ClienteModelos:
+    """
+    Cliente do servidor de modelos com a mesma interface dos motores locais
+    Mantém um pool de conexões, pois uma Connection não pode ser usada por duas threads
+    """
+
+    def __init__(self, endereco, authkey: bytes, ao_esperar: Optional[Callable[[float], None]] = None,
+                 prioridade: Optional[Callable[[], str]] = None,
+                 prazo: Optional[Callable[[], Optional[float]]] = None):
+        self.endereco = endereco
+        self.authkey = authkey
+        self.ao_esperar = ao_esperar
+        # Prioridade e segundos até o prazo da chamada atual, enviados com cada pedido de inferência
+        self.prioridade = prioridade
+        self.prazo = prazo
+        self._livres: "queue.LifoQueue" = queue.LifoQueue()
+
+    def aguardar(self, limite: float = 600):
+        """Esperar o servidor aceitar conexões (os modelos podem demorar a carregar)"""
+        prazo = time.time() + limite
+        while True:
+            try:
+                with self._conexao() as conexao:
+                    conexao.send({"op": "info"})
+                    conexao.recv()
+                return
+            except (ConnectionRefusedError, FileNotFoundError, OSError):
+                if time.time() >= prazo:
+                    raise TimeoutError(f"Servidor de modelos indisponível em {self.endereco}")
+                time.sleep(0.5)
+
+    @contextmanager
+    def _conexao(self):
+        try:
+            conexao = self._livres.get_nowait()
+        except queue.Empty:
+            conexao = Client(self.endereco, authkey=self.authkey)
+        try:
+            yield conexao
+        except BaseException:
+            conexao.close()  # Estado desconhecido: não devolver ao pool
+            raise
+        self._livres.put(conexao)
+
+    def _chamar(self, pedido: Dict) -> Dict:
+        with self._conexao() as conexao:
+            conexao.send(pedido)
+            resposta = conexao.recv()
+        if not resposta["ok"]:
+            if resposta["tipo"] == "ErroPiper":
+                raise ErroPiper(resposta["erro"])
+            if resposta["tipo"] == "PrazoEsgotado":
+                raise PrazoEsgotado(resposta["erro"])
+            if resposta["tipo"] == "VozDesconhecida":
+                raise VozDesconhecida(resposta["erro"])
+            raise RuntimeError(f"{resposta['tipo']}: {resposta['erro']}")
+        if self.ao_esperar and resposta.get("espera"):
+            self.ao_esperar(resposta["espera"])
+        return resposta
+
+    def _fila(self) -> Dict:
+        """Prioridade e prazo do pedido de inferência"""
+        return {
+            "prioridade": self.prioridade() if self.prioridade else PRIORIDADE_PADRAO,
+            "prazo": self.prazo() if self.prazo else None,
+        }
+
+    def transcrever(self, audio: np.ndarray, idioma: str = "de") -> Dict:
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        shm = criar_memoria(audio.nbytes)
+        try:
+            np.ndarray(audio.shape, dtype=np.float32, buffer=shm.buf)[:] = audio
+            resposta = self._chamar({
+                "op": "transcrever",
+                "shm": shm.name,
+                "amostras": len(audio),
+                "opcoes": {"idioma": idioma},
+                **self._fila(),
+            })
+        finally:
+            liberar_memoria(shm, apagar=True)
+        return resposta["resultado"]
+
+    def transcrever_lote(self, audios: List[np.ndarray], idioma: str = "de") -> List[Dict]:
+        audios = [np.ascontiguousarray(audio, dtype=np.float32) for audio in audios]
+        amostras = [len(audio) for audio in audios]
+        shm = criar_memoria(sum(amostras) * 4)
+        try:
+            np.ndarray((sum(amostras),), dtype=np.float32, buffer=shm.buf)[:] = np.concatenate(audios)
+            resposta = self._chamar({
+                "op": "transcrever_lote",
+                "shm": shm.name,
+                "amostras": amostras,
+                "opcoes": {"idioma": idioma},
+                **self._fila(),
+            })
+        finally:
+            liberar_memoria(shm, apagar=True)
+        return resposta["resultado"]
+
+    def sintetizar(self, texto: str, length_scale: float = 1.0, voz: str = PIPER_VOZ_PADRAO) -> bytes:
+        resposta = self._chamar({
+            "op": "sintetizar",
+            "texto": texto,
+            "length_scale": length_scale,
+            "voz": voz,
+            **self._fila(),
+        })
+        shm = anexar_memoria(resposta["shm"])
+        try:
+            return bytes(shm.buf[:resposta["tamanho"]])
+        finally:
+            liberar_memoria(shm, apagar=True)
+
+    def precarregar(self, vozes: List[str]) -> List[str]:
+        return self._chamar({"op": "precarregar", "vozes": vozes})["resultado"]
+
+    def info(self) -> Dict:
+        return self._chamar({"op": "info"})["resultado"]
+
+    def capacidade(self) -> Dict:
+        return self._chamar({"op": "capacidade"})["resultado"]
+
+    def memoria(self) -> Dict:
+        return self._chamar({"op": "memoria"})["resultado"]
+
+# ============================================
+# INICIALIZAÇÃO
+# ============================================
+
+def main():
+    if not MODEL_SERVER_AUTHKEY:
+        print("❌ Defina MODEL_SERVER_AUTHKEY (compartilhada com os workers HTTP)")
+        return 1
+
+    prefork = MODEL_SERVER_WORKERS > 0
+    if prefork and not hasattr(os, "fork"):
+        print("⚠️ MODEL_SERVER_WORKERS exige fork (Linux/macOS); usando um único processo")
+        prefork = False
+
+    print("Carregando modelos...")
+    piper = criar_motor_piper()
+    piper.carregar()
+    whisper = MotorWhisper()
+    if prefork:
+        # CUDA não sobrevive ao fork; e sem pool de threads no processo principal,
+        # cada worker cria o seu depois do fork, já com o número de núcleos dele
+        whisper.dispositivo = "cpu"
+        whisper.configurar_threads(1)
+    whisper.carregar()
+
+    pool = None
+    if prefork:
+        print(f"🍴 Criando {MODEL_SERVER_WORKERS} workers de inferência...")
+        pool = PoolPreFork(whisper, piper, MODEL_SERVER_WORKERS)
+        pool.iniciar()
+
+    # terminate() do serviço HTTP chega como SIGTERM: encerrar os workers também
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    servidor = ServidorModelos(whisper, piper, pool=pool)
+    try:
+        servidor.servir(interpretar_endereco(MODEL_SERVER_ADDRESS), MODEL_SERVER_AUTHKEY.encode("utf-8"))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if pool:
+            pool.encerrar()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
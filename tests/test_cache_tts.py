@@ -0,0 +1,73 @@
+import hashlib
+import os
+import shutil
+
+from cache_tts import CacheAudio
+
+
+def test_guardar_nao_apaga_o_audio_recem_gravado(tmp_path):
+    cache = CacheAudio(tmp_path, "modelo", 100)
+    cache.guardar("aa01", b"x" * 60)
+    cache.guardar("bb02", b"y" * 150)  # Sozinho já passa do limite
+
+    assert cache.obter("bb02") == b"y" * 150
+    assert cache.obter("aa01") is None
+    assert not cache.caminho("aa01").exists()
+
+
+def test_guardar_recria_diretorio_apagado(tmp_path):
+    cache = CacheAudio(tmp_path / "a" / "b", "modelo", 1000)
+    shutil.rmtree(tmp_path / "a")
+
+    cache.guardar("aa01", b"x" * 10)
+    assert cache.obter("aa01") == b"x" * 10
+
+
+def test_versao_e_o_hash_do_conteudo_gravado(tmp_path):
+    cache = CacheAudio(tmp_path, "modelo", 1000)
+    cache.guardar("aa01", b"primeira")
+    assert cache.versao("aa01") == hashlib.sha256(b"primeira").hexdigest()
+    assert cache.localizar("aa01") is not None  # Ler não muda a versão
+    assert cache.versao("aa01") == hashlib.sha256(b"primeira").hexdigest()
+
+    # Gerado de novo (o Piper não repete os bytes): outra versão, mesmo que por outro processo
+    outro = CacheAudio(tmp_path, "modelo", 1000)
+    outro.guardar("aa01", b"segunda!")
+    assert cache.versao("aa01") == hashlib.sha256(b"segunda!").hexdigest()
+
+    os.remove(cache.caminho("aa01"))
+    assert cache.versao("aa01") is None
+
+
+def test_obter_renova_o_uso_e_o_menos_usado_sai(tmp_path):
+    cache = CacheAudio(tmp_path, "modelo", 100)
+    cache.guardar("aa01", b"a" * 40)
+    cache.guardar("bb02", b"b" * 40)
+    assert cache.obter("aa01") is not None  # aa01 passa a ser o mais recente
+
+    cache.guardar("cc03", b"c" * 40)
+    assert cache.contem("aa01") and cache.contem("cc03")
+    assert not cache.contem("bb02")
+    assert cache.estado()["bytes"] == 80
+
+
+def test_indice_reconstruido_na_ordem_de_uso(tmp_path):
+    cache = CacheAudio(tmp_path, "modelo", 1000)
+    for i, chave in enumerate(["aa01", "bb02", "cc03"]):
+        cache.guardar(chave, b"x" * 40)
+        os.utime(cache.caminho(chave), (1000 + i, 1000 + i))
+    os.utime(cache.caminho("aa01"), (2000, 2000))  # Usado por último
+
+    reaberto = CacheAudio(tmp_path, "modelo", 100)  # Cabem só dois
+    assert reaberto.estado()["entradas"] == 2
+    assert not cache.caminho("bb02").exists()
+    assert reaberto.obter("aa01") is not None
+
+
+def test_audio_gravado_por_outro_processo_entra_no_indice(tmp_path):
+    cache = CacheAudio(tmp_path, "modelo", 1000)
+    outro = CacheAudio(tmp_path, "modelo", 1000)
+    outro.guardar("aa01", b"x" * 10)
+
+    assert cache.obter("aa01") == b"x" * 10
+    assert cache.estado()["entradas"] == 1
@@ -0,0 +1,94 @@
+import asyncio
+import contextvars
+import time
+
+from coalescencia import ChamadasEmVoo
+from escalonador import PrazoEsgotado
+
+marcador = contextvars.ContextVar("marcador", default="padrao")
+
+
+async def lenta(resultado, segundos=0.1, execucoes=None):
+    if execucoes is not None:
+        execucoes.append(marcador.get())
+    await asyncio.sleep(segundos)
+    return resultado
+
+
+def test_chamadas_identicas_compartilham_execucao():
+    async def cenario():
+        chamadas = ChamadasEmVoo()
+        execucoes = []
+        resultados = await asyncio.gather(*(chamadas.executar("k", lenta, 42, 0.05, execucoes) for _ in range(5)))
+        return chamadas, execucoes, resultados
+
+    chamadas, execucoes, resultados = asyncio.run(cenario())
+    assert len(execucoes) == 1
+    assert [resultado for resultado, _ in resultados] == [42] * 5
+    assert [compartilhado for _, compartilhado in resultados] == [False] + [True] * 4
+    assert chamadas.estado() == {"em_voo": 0, "executadas": 1, "coalescidas": 4}
+
+
+def test_desistencia_de_um_nao_cancela_os_demais():
+    async def cenario():
+        chamadas = ChamadasEmVoo()
+        primeira = asyncio.ensure_future(chamadas.executar("k", lenta, "ok", 0.1))
+        segunda = asyncio.ensure_future(chamadas.executar("k", lenta, "ok", 0.1))
+        await asyncio.sleep(0.01)
+        primeira.cancel()
+        return await segunda
+
+    assert asyncio.run(cenario()) == ("ok", True)
+
+
+def test_execucao_cancelada_quando_todos_desistem():
+    async def cenario():
+        chamadas = ChamadasEmVoo()
+        esperas = [asyncio.ensure_future(chamadas.executar("k", lenta, "ok", 10)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        tarefa = chamadas._em_voo["k"].tarefa
+        for espera in esperas:
+            espera.cancel()
+        await asyncio.gather(*esperas, return_exceptions=True)
+        await asyncio.sleep(0)
+        return tarefa, chamadas
+
+    tarefa, chamadas = asyncio.run(cenario())
+    assert tarefa.cancelled()
+    assert not chamadas.em_andamento("k")
+
+
+def test_prazo_vale_por_interessado():
+    async def cenario():
+        chamadas = ChamadasEmVoo()
+        curto = chamadas.executar("k", lenta, "ok", 0.2, prazo=time.monotonic() + 0.05)
+        sem_prazo = chamadas.executar("k", lenta, "ok", 0.2)
+        return await asyncio.gather(curto, sem_prazo, return_exceptions=True)
+
+    curto, sem_prazo = asyncio.run(cenario())
+    assert isinstance(curto, PrazoEsgotado)
+    assert sem_prazo == ("ok", True)
+
+
+def test_contexto_da_execucao():
+    async def cenario():
+        chamadas = ChamadasEmVoo()
+        execucoes = []
+        contexto = contextvars.copy_context()
+        contexto.run(marcador.set, "compartilhado")
+        await chamadas.executar("k", lenta, "ok", 0.01, execucoes, contexto=contexto, dados="d")
+        return execucoes
+
+    assert asyncio.run(cenario()) == ["compartilhado"]
+
+
+def test_excecao_chega_a_todos():
+    async def falha():
+        await asyncio.sleep(0.02)
+        raise ValueError("falhou")
+
+    async def cenario():
+        chamadas = ChamadasEmVoo()
+        return await asyncio.gather(*(chamadas.executar("k", falha) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(resultado, ValueError) for resultado in asyncio.run(cenario()))
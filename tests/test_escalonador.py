@@ -0,0 +1,109 @@
+import asyncio
+import time
+from collections import Counter
+
+import pytest
+
+from escalonador import EscalonadorAsync, PoliticaPrioridade, PrazoEsgotado, _Espera
+
+PESOS = {"interactive": 8.0, "normal": 3.0, "bulk": 1.0}
+
+
+def encher(politica, prioridade, quantidade, dono=None):
+    esperas = [_Espera(prioridade, None, dono) for _ in range(quantidade)]
+    for espera in esperas:
+        politica.entrar(espera)
+    return esperas
+
+
+def servir(politica, vezes):
+    return [politica.proxima().prioridade for _ in range(vezes)]
+
+
+def test_stride_divide_as_vezes_pelos_pesos():
+    politica = PoliticaPrioridade(PESOS, envelhecimento=3600)
+    for prioridade in PESOS:
+        encher(politica, prioridade, 200)
+
+    contagem = Counter(servir(politica, 120))
+    assert abs(contagem["interactive"] - 80) <= 1
+    assert abs(contagem["normal"] - 30) <= 1
+    assert abs(contagem["bulk"] - 10) <= 1
+
+
+def test_bulk_anda_mesmo_sob_disputa():
+    politica = PoliticaPrioridade(PESOS, envelhecimento=3600)
+    for prioridade in PESOS:
+        encher(politica, prioridade, 50)
+
+    assert "bulk" in servir(politica, 12)
+
+
+def test_classe_ociosa_nao_acumula_credito():
+    politica = PoliticaPrioridade(PESOS, envelhecimento=3600)
+    encher(politica, "interactive", 200)
+    servir(politica, 100)  # Só interactive na disputa: normal não estava esperando
+
+    encher(politica, "normal", 50)
+    contagem = Counter(servir(politica, 11))
+    assert contagem["normal"] <= 4
+    assert contagem["interactive"] >= 7
+
+
+def test_envelhecimento_passa_a_espera_antiga_a_frente():
+    politica = PoliticaPrioridade(PESOS, envelhecimento=0.5)
+    antiga, = encher(politica, "bulk", 1)
+    antiga.chegada -= 1.0
+    encher(politica, "interactive", 5)
+
+    assert politica.proxima() is antiga
+    assert politica.envelhecidas == 1
+    assert servir(politica, 5) == ["interactive"] * 5
+
+
+def test_promover_mantem_a_ordem_de_chegada():
+    politica = PoliticaPrioridade(PESOS, envelhecimento=3600)
+    dono = object()
+    primeira, = encher(politica, "interactive", 1)
+    promovida, = encher(politica, "bulk", 1, dono)
+    ultima, = encher(politica, "interactive", 1)
+
+    assert politica.promover(dono, "interactive") == 1
+    assert list(politica.filas["interactive"]) == [primeira, promovida, ultima]
+    assert not politica.filas["bulk"]
+    assert politica.promover(dono, "bulk") == 0  # Nunca rebaixa
+
+
+def test_escalonador_async_entrega_a_vaga_pela_prioridade():
+    async def cenario():
+        escalonador = EscalonadorAsync(1, PESOS, envelhecimento=3600)
+        await escalonador.adquirir()
+        ordem = []
+
+        async def esperar(prioridade):
+            await escalonador.adquirir(prioridade)
+            ordem.append(prioridade)
+            escalonador.liberar()
+
+        tarefas = [asyncio.ensure_future(esperar(prioridade)) for prioridade in ("bulk", "normal", "interactive")]
+        await asyncio.sleep(0)
+        escalonador.liberar()
+        await asyncio.gather(*tarefas)
+        return ordem, escalonador.ocupadas
+
+    ordem, ocupadas = asyncio.run(cenario())
+    assert ordem == ["interactive", "normal", "bulk"]
+    assert ocupadas == 0
+
+
+def test_escalonador_async_prazo_na_fila():
+    async def cenario():
+        escalonador = EscalonadorAsync(1, PESOS, envelhecimento=3600)
+        await escalonador.adquirir()
+        with pytest.raises(PrazoEsgotado):
+            await escalonador.adquirir("interactive", prazo=time.monotonic() + 0.05)
+        assert len(escalonador.politica) == 0
+        escalonador.liberar()
+        return escalonador.ocupadas
+
+    assert asyncio.run(cenario()) == 0
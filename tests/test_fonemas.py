@@ -0,0 +1,58 @@
+import threading
+import time
+
+from fonemas import MemoFonemas
+
+
+def para_ids(fonemas):
+    return [ord(fonema) for fonema in fonemas]
+
+
+def test_espeak_nunca_roda_em_paralelo_entre_vozes():
+    ativas = []
+    maximo = [0]
+    trava = threading.Lock()
+
+    def fonemizar(frase):
+        with trava:
+            ativas.append(frase)
+            maximo[0] = max(maximo[0], len(ativas))
+        time.sleep(0.01)
+        with trava:
+            ativas.remove(frase)
+        return [list(frase)]
+
+    # Uma memória por voz, como em motores.py: o espeak é do processo, não da voz
+    memorias = [MemoFonemas(None, montar_palavras=False) for _ in range(2)]
+    threads = [
+        threading.Thread(target=memorias[i % 2].ids, args=(f"frase{i}", fonemizar, para_ids))
+        for i in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert maximo[0] == 1
+    assert sum(memoria.faltas for memoria in memorias) == 8
+
+
+def test_acerto_nao_espera_o_espeak():
+    memoria = MemoFonemas(None)
+    memoria.ids("hallo", lambda frase: [list(frase)], para_ids)
+    liberar = threading.Event()
+
+    def fonemizar_lento(frase):
+        liberar.wait(5)
+        return [list(frase)]
+
+    lenta = threading.Thread(target=memoria.ids, args=("welt", fonemizar_lento, para_ids))
+    lenta.start()
+    try:
+        inicio = time.perf_counter()
+        assert memoria.ids("hallo", fonemizar_lento, para_ids) == [para_ids("hallo")]
+        assert time.perf_counter() - inicio < 1
+    finally:
+        liberar.set()
+        lenta.join()
+    assert memoria.acertos == 1
@@ -0,0 +1,47 @@
+from gateway import AnelHash, chave_tts
+
+NOS = ["http://a:3015", "http://b:3015", "http://c:3015"]
+CHAVES = [f"frase {i}" for i in range(3000)]
+
+
+def test_candidatos_trazem_cada_no_uma_vez():
+    anel = AnelHash(NOS)
+    for chave in CHAVES[:50]:
+        candidatos = anel.candidatos(chave)
+        assert sorted(candidatos) == sorted(NOS)
+        assert candidatos == AnelHash(list(reversed(NOS))).candidatos(chave)
+
+
+def test_anel_vazio():
+    assert AnelHash([]).candidatos("x") == []
+
+
+def test_chaves_se_distribuem_entre_os_nos():
+    anel = AnelHash(NOS)
+    primeiros = [anel.candidatos(chave)[0] for chave in CHAVES]
+    for no in NOS:
+        assert 0.2 < primeiros.count(no) / len(CHAVES) < 0.47
+
+
+def test_novo_no_remapeia_so_parte_das_chaves():
+    antes = AnelHash(NOS)
+    depois = AnelHash(NOS + ["http://d:3015"])
+    movidas = [chave for chave in CHAVES if antes.candidatos(chave)[0] != depois.candidatos(chave)[0]]
+
+    # Só as chaves que passam ao nó novo mudam de dono (~1/4 delas)
+    assert all(depois.candidatos(chave)[0] == "http://d:3015" for chave in movidas)
+    assert 0.15 < len(movidas) / len(CHAVES) < 0.35
+
+
+def test_no_removido_passa_as_chaves_ao_seguinte_do_anel():
+    antes = AnelHash(NOS)
+    depois = AnelHash(NOS[1:])
+    for chave in CHAVES[:500]:
+        ordem = antes.candidatos(chave)
+        assert depois.candidatos(chave) == [no for no in ordem if no != NOS[0]]
+
+
+def test_chave_tts_normaliza_espacos():
+    assert chave_tts("Guten  Tag\n", "Kore", 1.0) == chave_tts(" Guten Tag", "Kore", 1.0)
+    assert chave_tts("Guten Tag", "Kore", 1.0) != chave_tts("Guten Tag", "Kore", 1.25)
+    assert chave_tts("Guten Tag", "Kore", 1.0) != chave_tts("Guten Tag", "Puck", 1.0)
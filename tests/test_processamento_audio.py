@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from processamento_audio import esticar_tempo, esticar_wav, escrever_wav, ler_wav
+
+
+def tom(frequencia, segundos, taxa):
+    t = np.arange(int(segundos * taxa)) / taxa
+    return (np.sin(2 * np.pi * frequencia * t) * 8000).astype(np.int16)
+
+
+@pytest.mark.parametrize("taxa", [16000, 22050])
+@pytest.mark.parametrize("n", [2000, 2500, 4410, 10000, 44100])
+@pytest.mark.parametrize("fator", [0.5, 0.55, 0.6, 0.8, 0.95, 1.25, 1.5, 2.0])
+def test_esticar_tempo_duracao_sem_erro(taxa, n, fator):
+    pcm = (np.random.default_rng(n).standard_normal(n) * 5000).astype(np.int16)
+    saida = esticar_tempo(pcm, taxa, fator)
+    assert saida.dtype == np.int16
+    if n >= 2 * (int(0.03 * taxa) // 2 * 2):
+        assert len(saida) == int(n / fator)
+    else:
+        assert len(saida) == n  # Curto demais para esticar: volta igual
+
+
+@pytest.mark.parametrize("fator", [0.5, 0.8, 1.5, 2.0])
+def test_esticar_tempo_mantem_tom(fator):
+    taxa = 22050
+    saida = esticar_tempo(tom(220, 1.0, taxa), taxa, fator)
+    espectro = np.abs(np.fft.rfft(saida.astype(np.float32)))
+    frequencia = np.argmax(espectro) * taxa / len(saida)
+    assert abs(frequencia - 220) < 5
+
+
+def test_esticar_tempo_fator_um_nao_altera():
+    pcm = tom(220, 0.5, 16000)
+    assert esticar_tempo(pcm, 16000, 1.0) is pcm
+
+
+def test_esticar_wav_preserva_taxa():
+    wav = escrever_wav(tom(220, 1.0, 22050), 22050)
+    pcm, taxa = ler_wav(esticar_wav(wav, 2.0))
+    assert taxa == 22050
+    assert len(pcm) == 11025
+
+
+@pytest.mark.parametrize("fator", [0.8, 1.25])
+def test_esticar_tempo_mantem_o_inicio(fator):
+    # Só os primeiros 10 ms têm som (menos de meio quadro): nada dele pode se perder
+    taxa = 22050
+    pcm = np.zeros(taxa // 2, dtype=np.int16)
+    pcm[:taxa // 100] = tom(220, 0.01, taxa)
+    saida = esticar_tempo(pcm, taxa, fator).astype(np.float64)
+    energia = np.sum(pcm.astype(np.float64) ** 2)
+    assert np.sum(saida[:taxa // 50] ** 2) > 0.5 * energia / fator * min(fator, 1.0)
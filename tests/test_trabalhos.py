@@ -0,0 +1,37 @@
+from trabalhos import CANCELADO, CONCLUIDO, PROCESSANDO, FilaTrabalhos
+
+
+def criar_trabalho(fila, tmp_path):
+    audio = tmp_path / "audio.wav"
+    audio.write_bytes(b"RIFF")
+    fila.criar(audio, "de")
+    return fila.assumir_proximo(), audio
+
+
+def test_finalizar_depois_de_cancelado_nao_sobrescreve(tmp_path):
+    fila = FilaTrabalhos(tmp_path)
+    trabalho, _ = criar_trabalho(fila, tmp_path)
+
+    assert fila.cancelar(trabalho["id"])
+    assert not fila.registrar_trecho(trabalho["id"], 0, 0.0, 10.0, "Hallo", [])
+    assert not fila.finalizar(trabalho["id"], CONCLUIDO, "Hallo")
+
+    assert fila.obter(trabalho["id"])["estado"] == CANCELADO
+    assert fila.trechos(trabalho["id"]) == []
+
+
+def test_dono_com_concessao_expirada_nao_finaliza(tmp_path):
+    antigo = FilaTrabalhos(tmp_path, concessao=-1)  # Concessão já expirada ao assumir
+    novo = FilaTrabalhos(tmp_path)
+    trabalho, audio = criar_trabalho(antigo, tmp_path)
+    assert novo.assumir_proximo()["id"] == trabalho["id"]
+
+    assert not antigo.registrar_trecho(trabalho["id"], 0, 0.0, 10.0, "Hallo", [])
+    assert not antigo.finalizar(trabalho["id"], CONCLUIDO, "Hallo")
+    assert audio.exists()  # O novo dono ainda precisa do áudio
+    assert novo.obter(trabalho["id"])["estado"] == PROCESSANDO
+
+    assert novo.registrar_trecho(trabalho["id"], 0, 0.0, 10.0, "Hallo", [])
+    assert novo.finalizar(trabalho["id"], CONCLUIDO, "Hallo")
+    assert novo.obter(trabalho["id"])["estado"] == CONCLUIDO
+    assert not audio.exists()
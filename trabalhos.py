@@ -0,0 +1,227 @@
+"""
+Fila Persistente de Trabalhos
+Transcrições longas em segundo plano, guardadas em SQLite: o áudio enviado fica em disco
+e cada trecho transcrito é gravado ao terminar, então um trabalho interrompido (reinício,
+queda) continua do próximo trecho
+
+Vários processos (ex.: HTTP_WORKERS > 1) podem compartilhar a fila: cada trabalho em
+processamento tem um dono que renova uma concessão (lease); se o dono some, outro
+processo assume o trabalho quando a concessão expira
+"""
+
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabalhos (
+    id TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    arquivo TEXT NOT NULL,
+    idioma TEXT NOT NULL,
+    callback_url TEXT,
+    callback_estado TEXT,
+    duracao REAL,
+    processado REAL NOT NULL DEFAULT 0,
+    texto TEXT,
+    erro TEXT,
+    dono TEXT,
+    concessao REAL,
+    criado REAL NOT NULL,
+    atualizado REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trabalhos_estado ON trabalhos (estado, criado);
+CREATE TABLE IF NOT EXISTS trechos (
+    trabalho_id TEXT NOT NULL,
+    indice INTEGER NOT NULL,
+    inicio REAL NOT NULL,
+    fim REAL NOT NULL,
+    texto TEXT NOT NULL,
+    segmentos TEXT NOT NULL,
+    PRIMARY KEY (trabalho_id, indice)
+);
+"""
+
+# Estados de um trabalho (expostos na API)
+NA_FILA = "queued"
+PROCESSANDO = "processing"
+CONCLUIDO = "completed"
+FALHOU = "failed"
+CANCELADO = "cancelled"
+FINAIS = (CONCLUIDO, FALHOU, CANCELADO)
+
+
+class FilaTrabalhos:
+    """Trabalhos e trechos em SQLite; os arquivos de áudio ficam em `diretorio`/audios"""
+
+    def __init__(self, diretorio: Path, concessao: float = 30.0):
+        self.diretorio = Path(diretorio)
+        self.audios = self.diretorio / "audios"
+        self.audios.mkdir(parents=True, exist_ok=True)
+        self.concessao = concessao
+        # Identifica este processo como dono dos trabalhos que ele assumir
+        self.dono = secrets.token_hex(8)
+        self._trava = threading.Lock()
+        self._db = sqlite3.connect(
+            str(self.diretorio / "trabalhos.db"),
+            check_same_thread=False,
+            isolation_level=None,  # Transações explícitas
+            timeout=10,
+        )
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(ESQUEMA)
+
+    # ---------- criação e consulta ----------
+
+    def novo_caminho_audio(self, extensao: str) -> Path:
+        return self.audios / f"{secrets.token_hex(16)}{extensao or '.wav'}"
+
+    def criar(self, arquivo: Path, idioma: str, callback_url: Optional[str] = None, tipo: str = "transcribe") -> Dict:
+        trabalho_id = secrets.token_hex(12)
+        agora = time.time()
+        with self._trava:
+            self._db.execute(
+                "INSERT INTO trabalhos (id, tipo, estado, arquivo, idioma, callback_url, criado, atualizado) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (trabalho_id, tipo, NA_FILA, str(arquivo), idioma, callback_url, agora, agora),
+            )
+        return self.obter(trabalho_id, com_segmentos=False)
+
+    def obter(self, trabalho_id: str, com_segmentos: bool = True) -> Optional[Dict]:
+        with self._trava:
+            linha = self._db.execute("SELECT * FROM trabalhos WHERE id = ?", (trabalho_id,)).fetchone()
+        if linha is None:
+            return None
+        trabalho = dict(linha)
+        trechos = self.trechos(trabalho_id)
+        if trabalho["texto"] is None:
+            trabalho["texto"] = " ".join(trecho["texto"] for trecho in trechos if trecho["texto"]).strip()
+        if com_segmentos:
+            trabalho["segmentos"] = [segmento for trecho in trechos for segmento in trecho["segmentos"]]
+        return trabalho
+
+    def trechos(self, trabalho_id: str) -> List[Dict]:
+        with self._trava:
+            linhas = self._db.execute(
+                "SELECT * FROM trechos WHERE trabalho_id = ? ORDER BY indice", (trabalho_id,)
+            ).fetchall()
+        return [{**dict(linha), "segmentos": json.loads(linha["segmentos"])} for linha in linhas]
+
+    def resumo(self) -> Dict[str, int]:
+        """Quantidade de trabalhos por estado"""
+        with self._trava:
+            linhas = self._db.execute("SELECT estado, COUNT(*) FROM trabalhos GROUP BY estado").fetchall()
+        return {estado: total for estado, total in linhas}
+
+    # ---------- processamento ----------
+
+    def assumir_proximo(self) -> Optional[Dict]:
+        """
+        Assumir o trabalho mais antigo na fila, ou um em processamento cujo dono
+        deixou a concessão expirar (processo reiniciado ou encerrado)
+        """
+        agora = time.time()
+        with self._trava:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                linha = self._db.execute(
+                    "SELECT id FROM trabalhos WHERE estado = ? OR (estado = ? AND concessao < ?) "
+                    "ORDER BY criado LIMIT 1",
+                    (NA_FILA, PROCESSANDO, agora),
+                ).fetchone()
+                if linha is not None:
+                    self._db.execute(
+                        "UPDATE trabalhos SET estado = ?, dono = ?, concessao = ?, atualizado = ? WHERE id = ?",
+                        (PROCESSANDO, self.dono, agora + self.concessao, agora, linha["id"]),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.obter(linha["id"], com_segmentos=False) if linha else None
+
+    def renovar(self) -> int:
+        """Estender a concessão de todos os trabalhos deste processo (chamar periodicamente)"""
+        with self._trava:
+            cursor = self._db.execute(
+                "UPDATE trabalhos SET concessao = ? WHERE dono = ? AND estado = ?",
+                (time.time() + self.concessao, self.dono, PROCESSANDO),
+            )
+        return cursor.rowcount
+
+    def ainda_e_dono(self, trabalho_id: str) -> bool:
+        """Falso se o trabalho foi cancelado ou assumido por outro processo"""
+        with self._trava:
+            linha = self._db.execute("SELECT estado, dono FROM trabalhos WHERE id = ?", (trabalho_id,)).fetchone()
+        return linha is not None and linha["estado"] == PROCESSANDO and linha["dono"] == self.dono
+
+    def definir_duracao(self, trabalho_id: str, duracao: float):
+        with self._trava:
+            self._db.execute("UPDATE trabalhos SET duracao = ? WHERE id = ?", (duracao, trabalho_id))
+
+    def registrar_trecho(self, trabalho_id: str, indice: int, inicio: float, fim: float,
+                         texto: str, segmentos: List[Dict]) -> bool:
+        """Gravar um trecho; falso (nada gravado) se o trabalho foi cancelado ou assumido por outro processo"""
+        agora = time.time()
+        with self._trava:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._db.execute(
+                    "UPDATE trabalhos SET processado = ?, atualizado = ?, concessao = ? "
+                    "WHERE id = ? AND dono = ? AND estado = ?",
+                    (fim, agora, agora + self.concessao, trabalho_id, self.dono, PROCESSANDO),
+                )
+                if cursor.rowcount:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO trechos (trabalho_id, indice, inicio, fim, texto, segmentos) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (trabalho_id, indice, inicio, fim, texto, json.dumps(segmentos, ensure_ascii=False)),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return bool(cursor.rowcount)
+
+    def finalizar(self, trabalho_id: str, estado: str, texto: Optional[str] = None, erro: Optional[str] = None) -> bool:
+        """
+        Marcar como concluído/falho e apagar o áudio (os trechos ficam no banco)
+        Só vale enquanto este processo é o dono: cancelado no meio (DELETE) ou assumido por outro
+        processo depois de a concessão expirar, o trabalho fica como está e o retorno é falso
+        """
+        with self._trava:
+            linha = self._db.execute("SELECT arquivo FROM trabalhos WHERE id = ?", (trabalho_id,)).fetchone()
+            cursor = self._db.execute(
+                "UPDATE trabalhos SET estado = ?, texto = ?, erro = ?, dono = NULL, concessao = NULL, "
+                "atualizado = ? WHERE id = ? AND dono = ? AND estado = ?",
+                (estado, texto, erro, time.time(), trabalho_id, self.dono, PROCESSANDO),
+            )
+        if cursor.rowcount and linha is not None:
+            Path(linha["arquivo"]).unlink(missing_ok=True)
+        return bool(cursor.rowcount)
+
+    def cancelar(self, trabalho_id: str) -> bool:
+        """Cancelar um trabalho não finalizado; quem o processa para no próximo trecho"""
+        with self._trava:
+            cursor = self._db.execute(
+                "UPDATE trabalhos SET estado = ?, atualizado = ? WHERE id = ? AND estado IN (?, ?)",
+                (CANCELADO, time.time(), trabalho_id, NA_FILA, PROCESSANDO),
+            )
+            linha = self._db.execute("SELECT arquivo FROM trabalhos WHERE id = ?", (trabalho_id,)).fetchone()
+        if cursor.rowcount and linha is not None:
+            Path(linha["arquivo"]).unlink(missing_ok=True)
+        return bool(cursor.rowcount)
+
+    def registrar_callback(self, trabalho_id: str, estado: str):
+        with self._trava:
+            self._db.execute("UPDATE trabalhos SET callback_estado = ? WHERE id = ?", (estado, trabalho_id))
+
+    def fechar(self):
+        with self._trava:
+            self._db.close()
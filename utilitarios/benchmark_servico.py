@@ -0,0 +1,668 @@
+"""
+Benchmark de Carga do Serviço TTS/STT
+Dispara /api/generate-audio, /api/transcribe-audio e /api/transcribe-audio-openai
+com concorrência e mistura configuráveis e reporta vazão, latências (p50/p95/p99),
+taxa de erro e fator de tempo real (RTF) em JSON/CSV
+
+Com --offline o serviço é iniciado com Piper simulado, OpenAI simulado e um
+modelo Whisper minúsculo, permitindo rodar em uma máquina só com CPU e sem rede
+
+Com --soak o RSS do serviço é amostrado via /admin/memory durante a carga e o relatório
+inclui o crescimento de memória por mil requisições (exige ADMIN_TOKEN)
+
+Exemplos:
+    python utilitarios/benchmark_servico.py --offline --requisicoes 200 --concorrencia 8
+    python utilitarios/benchmark_servico.py --offline --soak --duracao 1800 --tracemalloc
+    python utilitarios/benchmark_servico.py --mix tts=8,stt=2 --duracao 60 --json atual.json
+    python utilitarios/benchmark_servico.py --offline --comparar baseline.json
+"""
+
+import argparse
+import base64
+import csv
+import json
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+
+import requests
+from dotenv import load_dotenv
+
+from simuladores.audio_sintetico import duracao_wav, gerar_wav
+from simuladores.openai_falso import iniciar_servidor as iniciar_openai_falso
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# Configurações
+SERVICE_URL = f"http://{os.getenv('SERVICE_HOST', '127.0.0.1')}:{os.getenv('SERVICE_PORT', '3015')}"
+RAIZ_PROJETO = Path(__file__).resolve().parent.parent
+SIMULADORES_DIR = Path(__file__).resolve().parent / "simuladores"
+CACHE_DIR = Path.home() / ".cache" / "servico_tts_e_stt"
+
+ENDPOINTS = {
+    "tts": "/api/generate-audio",
+    "stt": "/api/transcribe-audio",
+    "openai": "/api/transcribe-audio-openai",
+}
+
+TEXTOS_PADRAO = [
+    "Guten Morgen.",
+    "Ich bin sechsundfünfzig Jahre alt.",
+    "Wie komme ich am schnellsten zum Bahnhof?",
+    "Könnten Sie das bitte noch einmal langsamer wiederholen?",
+    "Am Wochenende fahren wir mit dem Zug an die Ostsee und besuchen meine Großeltern.",
+]
+
+# ============================================
+# ESTATÍSTICAS
+# ============================================
+
+def percentil(valores, p):
+    """Percentil com interpolação linear (valores já ordenados)"""
+    if not valores:
+        return None
+    posicao = (len(valores) - 1) * p / 100.0
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(valores) - 1)
+    return valores[inferior] + (valores[superior] - valores[inferior]) * (posicao - inferior)
+
+
+def interpretar_server_timing(cabecalho):
+    """Converter o cabeçalho Server-Timing em {etapa: ms}"""
+    etapas = {}
+    for metrica in (cabecalho or "").split(","):
+        partes = [p.strip() for p in metrica.split(";")]
+        for parametro in partes[1:]:
+            if partes[0] and parametro.startswith("dur="):
+                try:
+                    etapas[partes[0]] = float(parametro[4:])
+                except ValueError:
+                    pass
+    return etapas
+
+
+def resumir(resultados, tempo_total):
+    """Agregar os resultados de uma operação"""
+    latencias = sorted(r["latencia_ms"] for r in resultados if r["ok"])
+    rtfs = sorted(r["rtf"] for r in resultados if r["ok"] and r["rtf"] is not None)
+    erros = sum(1 for r in resultados if not r["ok"])
+
+    etapas = {}
+    for r in resultados:
+        if r["ok"]:
+            for nome, ms in r["etapas"].items():
+                etapas.setdefault(nome, []).append(ms)
+
+    def arredondar(valor):
+        return round(valor, 2) if valor is not None else None
+
+    return {
+        "requisicoes": len(resultados),
+        "erros": erros,
+        "taxa_erro": round(erros / len(resultados), 4) if resultados else 0.0,
+        "vazao_rps": round(len(latencias) / tempo_total, 3) if tempo_total > 0 else 0.0,
+        "latencia_ms": {
+            "p50": arredondar(percentil(latencias, 50)),
+            "p95": arredondar(percentil(latencias, 95)),
+            "p99": arredondar(percentil(latencias, 99)),
+            "media": arredondar(sum(latencias) / len(latencias)) if latencias else None,
+            "max": arredondar(latencias[-1]) if latencias else None,
+        },
+        "rtf": {
+            "p50": round(percentil(rtfs, 50), 4) if rtfs else None,
+            "media": round(sum(rtfs) / len(rtfs), 4) if rtfs else None,
+        },
+        "etapas_servidor_ms": {
+            nome: round(sum(valores) / len(valores), 2) for nome, valores in etapas.items()
+        },
+    }
+
+# ============================================
+# GERAÇÃO DE CARGA
+# ============================================
+
+def interpretar_mix(texto):
+    """Converter 'tts=6,stt=3,openai=1' em {operacao: peso}"""
+    mix = {}
+    for item in texto.split(","):
+        nome, _, peso = item.partition("=")
+        nome = nome.strip()
+        if nome not in ENDPOINTS:
+            raise ValueError(f"Operação desconhecida no mix: {nome} (use {', '.join(ENDPOINTS)})")
+        mix[nome] = float(peso or 1)
+    if not any(peso > 0 for peso in mix.values()):
+        raise ValueError("O mix precisa de pelo menos uma operação com peso positivo")
+    return mix
+
+
+def carregar_audios(caminhos, duracoes):
+    """Carregar WAVs informados ou gerar áudios sintéticos; retorna [(nome, bytes, duração)]"""
+    audios = []
+    for caminho in caminhos or []:
+        caminho = Path(caminho)
+        arquivos = sorted(caminho.glob("*.wav")) if caminho.is_dir() else [caminho]
+        for arquivo in arquivos:
+            dados = arquivo.read_bytes()
+            audios.append((arquivo.name, dados, duracao_wav(dados)))
+
+    if not audios:
+        for i, duracao in enumerate(duracoes):
+            audios.append((f"sintetico_{duracao:g}s.wav", gerar_wav(duracao, semente=i), duracao))
+    return audios
+
+
+class GeradorCarga:
+    """Executa o plano de requisições com N threads, cada uma com sessão keep-alive própria"""
+
+    def __init__(self, url, mix, textos, audios, velocidades, timeout, semente):
+        self.url = url.rstrip("/")
+        self.operacoes = list(mix)
+        self.pesos = [mix[op] for op in self.operacoes]
+        self.textos = textos
+        self.audios = audios
+        self.velocidades = velocidades
+        self.timeout = timeout
+        self.semente = semente
+        self.local = threading.local()
+        self.trava = threading.Lock()
+        self.proximo = 0
+        self.resultados = []
+
+    def _sessao(self):
+        if not hasattr(self.local, "sessao"):
+            self.local.sessao = requests.Session()
+        return self.local.sessao
+
+    def _requisicao(self, indice):
+        """Executar a requisição de número `indice` do plano (determinístico pela semente)"""
+        rng = random.Random(self.semente * 1_000_003 + indice)
+        operacao = rng.choices(self.operacoes, weights=self.pesos)[0]
+        url = self.url + ENDPOINTS[operacao]
+        duracao_audio = None
+        etapas = {}
+
+        inicio = time.perf_counter()
+        try:
+            if operacao == "tts":
+                payload = {"text": rng.choice(self.textos), "speed": rng.choice(self.velocidades)}
+                response = self._sessao().post(url, json=payload, timeout=self.timeout)
+                if response.ok:
+                    duracao_audio = duracao_wav(base64.b64decode(response.json()["audio"]))
+            else:
+                nome, dados, duracao_audio = rng.choice(self.audios)
+                files = {"file": (nome, dados, "audio/wav")}
+                response = self._sessao().post(url, files=files, timeout=self.timeout)
+            latencia = time.perf_counter() - inicio
+            ok = response.status_code == 200
+            erro = None if ok else f"HTTP {response.status_code}"
+            etapas = interpretar_server_timing(response.headers.get("Server-Timing"))
+        except Exception as e:
+            latencia = time.perf_counter() - inicio
+            ok = False
+            erro = f"{type(e).__name__}: {e}"
+
+        return {
+            "operacao": operacao,
+            "inicio": inicio,
+            "latencia_ms": latencia * 1000,
+            "ok": ok,
+            "erro": erro,
+            "rtf": latencia / duracao_audio if ok and duracao_audio else None,
+            "etapas": etapas,
+        }
+
+    def _trabalhador(self, total, prazo):
+        while True:
+            with self.trava:
+                if (total and self.proximo >= total) or (prazo and time.perf_counter() >= prazo):
+                    return
+                indice = self.proximo
+                self.proximo += 1
+
+            resultado = self._requisicao(indice)
+            with self.trava:
+                self.resultados.append(resultado)
+
+    def executar(self, concorrencia, total=None, duracao=None):
+        """Rodar até `total` requisições ou por `duracao` segundos; retorna o tempo decorrido"""
+        inicio = time.perf_counter()
+        prazo = inicio + duracao if duracao else None
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            for _ in range(concorrencia):
+                executor.submit(self._trabalhador, total, prazo)
+        return time.perf_counter() - inicio
+
+# ============================================
+# MONITOR DE MEMÓRIA (SOAK TEST)
+# ============================================
+
+def inclinacao(pontos):
+    """Inclinação da reta de mínimos quadrados por [(x, y)]"""
+    if len(pontos) < 2:
+        return None
+    media_x = sum(x for x, _ in pontos) / len(pontos)
+    media_y = sum(y for _, y in pontos) / len(pontos)
+    variancia = sum((x - media_x) ** 2 for x, _ in pontos)
+    if variancia == 0:
+        return None
+    return sum((x - media_x) * (y - media_y) for x, y in pontos) / variancia
+
+
+class MonitorMemoria:
+    """Amostra o RSS do serviço (/admin/memory) enquanto o gerador de carga roda"""
+
+    def __init__(self, url, token, gerador, intervalo, tracemalloc=False):
+        self.url = url.rstrip("/")
+        self.cabecalhos = {"X-Admin-Token": token}
+        self.gerador = gerador
+        self.intervalo = intervalo
+        self.tracemalloc = tracemalloc
+        self.amostras = []
+        self.snapshots = []
+        self.diff = None
+        self._parar = threading.Event()
+        self._thread = None
+
+    def _admin(self, metodo, caminho, **kwargs):
+        response = requests.request(metodo, f"{self.url}{caminho}", headers=self.cabecalhos, timeout=60, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def _amostrar(self):
+        rss = self._admin("GET", "/admin/memory")["processo"]["rss"]
+        if rss is not None:
+            self.amostras.append((len(self.gerador.resultados), rss))
+
+    def _loop(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self._amostrar()
+            except requests.exceptions.RequestException as e:
+                print(f"⚠️ Falha ao consultar /admin/memory: {e}")
+
+    def __enter__(self):
+        if self.tracemalloc:
+            self._admin("POST", "/admin/memory/tracemalloc", params={"ativo": "true", "quadros": 10})
+            self.snapshots.append(self._admin("POST", "/admin/memory/snapshots"))
+        self._amostrar()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._thread.join()
+        self._amostrar()
+        if self.tracemalloc:
+            self.snapshots.append(self._admin("POST", "/admin/memory/snapshots"))
+            self.diff = self._admin(
+                "GET", f"/admin/memory/snapshots/{self.snapshots[0]['id']}/diff/{self.snapshots[-1]['id']}",
+                params={"limite": 15}
+            )
+
+    def resumo(self):
+        crescimento = inclinacao(self.amostras)
+        return {
+            "amostras": len(self.amostras),
+            "rss_inicial": self.amostras[0][1] if self.amostras else None,
+            "rss_final": self.amostras[-1][1] if self.amostras else None,
+            "rss_maximo": max(rss for _, rss in self.amostras) if self.amostras else None,
+            "crescimento_por_mil_requisicoes": round(crescimento * 1000) if crescimento is not None else None,
+            "serie": [{"requisicoes": n, "rss": rss} for n, rss in self.amostras],
+            "tracemalloc_diff": self.diff,
+        }
+
+# ============================================
+# AMBIENTE OFFLINE (SIMULADORES)
+# ============================================
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def criar_piper_falso(diretorio):
+    """Criar um executável que encaminha para o Piper simulado"""
+    script = SIMULADORES_DIR / "piper_falso.py"
+    if os.name == "nt":
+        caminho = diretorio / "piper.bat"
+        caminho.write_text(f'@"{sys.executable}" "{script}" %*\n', encoding="utf-8")
+    else:
+        caminho = diretorio / "piper"
+        caminho.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n', encoding="utf-8")
+        caminho.chmod(0o755)
+    return caminho
+
+
+def preparar_whisper(modelo):
+    """'minusculo' gera o checkpoint aleatório local; outros valores vão direto ao serviço"""
+    if modelo != "minusculo":
+        return modelo
+    from simuladores.whisper_minusculo import gerar_modelo
+    return str(gerar_modelo(CACHE_DIR / "whisper_minusculo.pt"))
+
+
+class AmbienteOffline:
+    """Sobe o serviço com Piper simulado, OpenAI simulado e Whisper local em CPU"""
+
+    def __init__(self, whisper_modelo, latencia_openai, piper_rtf, env_extra=None):
+        self.whisper_modelo = whisper_modelo
+        self.latencia_openai = latencia_openai
+        self.piper_rtf = piper_rtf
+        self.env_extra = env_extra or {}
+        self.processo = None
+        self.openai = None
+        self.temp = None
+        self.url = None
+
+    def __enter__(self):
+        self.temp = tempfile.TemporaryDirectory(prefix="benchmark_tts_stt_")
+        diretorio = Path(self.temp.name)
+
+        # Modelo Piper de mentira (o simulado não lê o arquivo, mas o serviço exige que exista)
+        modelos = diretorio / "piper_models"
+        modelos.mkdir()
+        (modelos / "de_DE-thorsten-medium.onnx").write_bytes(b"")
+        (modelos / "de_DE-thorsten-medium.onnx.json").write_text("{}", encoding="utf-8")
+
+        self.openai, url_openai = iniciar_openai_falso(latencia=self.latencia_openai)
+        porta = porta_livre()
+        self.url = f"http://127.0.0.1:{porta}"
+
+        env = dict(os.environ)
+        env.update({
+            "SERVICE_HOST": "127.0.0.1",
+            "SERVICE_PORT": str(porta),
+            "PIPER_EXECUTABLE": str(criar_piper_falso(diretorio)),
+            "PIPER_MODELS_DIR": str(modelos),
+            "PIPER_FALSO_RTF": str(self.piper_rtf),
+            "WHISPER_MODEL": preparar_whisper(self.whisper_modelo),
+            "WHISPER_DEVICE": "cpu",
+            "OPENAI_API_KEY": "sk-simulado",
+            "OPENAI_BASE_URL": url_openai,
+        })
+        env.update(self.env_extra)
+
+        print(f"🚀 Iniciando serviço offline em {self.url}...")
+        self.log = open(diretorio / "servico.log", "wb")
+        self.processo = subprocess.Popen(
+            [sys.executable, str(RAIZ_PROJETO / "servico_tts_e_stt.py")],
+            cwd=str(RAIZ_PROJETO),
+            env=env,
+            stdout=self.log,
+            stderr=subprocess.STDOUT,
+        )
+        self._aguardar_saude()
+        return self
+
+    def _aguardar_saude(self, limite=300):
+        prazo = time.time() + limite
+        while time.time() < prazo:
+            if self.processo.poll() is not None:
+                self.log.flush()
+                saida = (Path(self.temp.name) / "servico.log").read_text(encoding="utf-8", errors="ignore")
+                raise RuntimeError(f"Serviço encerrou durante a inicialização:\n{saida[-2000:]}")
+            try:
+                if requests.get(f"{self.url}/health", timeout=2).status_code == 200:
+                    print("✓ Serviço offline pronto")
+                    return
+            except requests.exceptions.RequestException:
+                pass
+            time.sleep(0.5)
+        raise TimeoutError("Serviço offline não respondeu a /health a tempo")
+
+    def __exit__(self, *exc):
+        if self.processo and self.processo.poll() is None:
+            self.processo.terminate()
+            try:
+                self.processo.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.processo.kill()
+        if self.openai:
+            self.openai.shutdown()
+        self.log.close()
+        self.temp.cleanup()
+
+# ============================================
+# RELATÓRIOS
+# ============================================
+
+def commit_atual():
+    try:
+        resultado = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=RAIZ_PROJETO, capture_output=True, text=True
+        )
+        return resultado.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def montar_relatorio(gerador, tempo_total, args, saude):
+    por_operacao = {}
+    for resultado in gerador.resultados:
+        por_operacao.setdefault(resultado["operacao"], []).append(resultado)
+
+    erros = {}
+    for resultado in gerador.resultados:
+        if resultado["erro"]:
+            erros[resultado["erro"]] = erros.get(resultado["erro"], 0) + 1
+
+    return {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit_atual(),
+        "configuracao": {
+            "url": gerador.url,
+            "offline": args.offline,
+            "mix": args.mix,
+            "concorrencia": args.concorrencia,
+            "requisicoes": args.requisicoes,
+            "duracao": args.duracao,
+            "semente": args.semente,
+        },
+        "servico": saude,
+        "tempo_total_s": round(tempo_total, 3),
+        "geral": resumir(gerador.resultados, tempo_total),
+        "operacoes": {op: resumir(res, tempo_total) for op, res in sorted(por_operacao.items())},
+        "erros": erros,
+    }
+
+
+def salvar_csv(relatorio, caminho):
+    campos = ["operacao", "requisicoes", "erros", "taxa_erro", "vazao_rps",
+              "p50_ms", "p95_ms", "p99_ms", "media_ms", "max_ms", "rtf_p50", "rtf_media"]
+    with open(caminho, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.DictWriter(f, fieldnames=campos)
+        escritor.writeheader()
+        for nome, resumo in [("geral", relatorio["geral"])] + list(relatorio["operacoes"].items()):
+            lat = resumo["latencia_ms"]
+            escritor.writerow({
+                "operacao": nome,
+                "requisicoes": resumo["requisicoes"],
+                "erros": resumo["erros"],
+                "taxa_erro": resumo["taxa_erro"],
+                "vazao_rps": resumo["vazao_rps"],
+                "p50_ms": lat["p50"], "p95_ms": lat["p95"], "p99_ms": lat["p99"],
+                "media_ms": lat["media"], "max_ms": lat["max"],
+                "rtf_p50": resumo["rtf"]["p50"], "rtf_media": resumo["rtf"]["media"],
+            })
+
+
+def imprimir_relatorio(relatorio):
+    print("\n" + "=" * 78)
+    print(f"📊 Resultado ({relatorio['tempo_total_s']:.1f}s, commit {relatorio['commit'] or 'N/A'})")
+    print("=" * 78)
+    print(f"{'operação':<10}{'req':>6}{'erro%':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'RTF p50':>10}")
+    for nome, resumo in [("geral", relatorio["geral"])] + list(relatorio["operacoes"].items()):
+        lat = resumo["latencia_ms"]
+
+        def fmt(valor, casas=1):
+            return f"{valor:.{casas}f}" if valor is not None else "-"
+
+        print(
+            f"{nome:<10}{resumo['requisicoes']:>6}{resumo['taxa_erro'] * 100:>7.1f}%"
+            f"{resumo['vazao_rps']:>9.2f}{fmt(lat['p50']):>10}{fmt(lat['p95']):>10}"
+            f"{fmt(lat['p99']):>10}{fmt(resumo['rtf']['p50'], 3):>10}"
+        )
+    for erro, quantidade in relatorio["erros"].items():
+        print(f"⚠️ {quantidade}x {erro}")
+
+    memoria = relatorio.get("memoria")
+    if memoria and memoria["rss_inicial"] is not None:
+        mib = 1024 * 1024
+        print(f"\n🧠 RSS: {memoria['rss_inicial'] / mib:.1f} MiB -> {memoria['rss_final'] / mib:.1f} MiB "
+              f"(máx. {memoria['rss_maximo'] / mib:.1f} MiB, {memoria['amostras']} amostras)")
+        if memoria["crescimento_por_mil_requisicoes"] is not None:
+            print(f"🧠 Crescimento: {memoria['crescimento_por_mil_requisicoes'] / mib:+.2f} MiB por mil requisições")
+        for item in (memoria.get("tracemalloc_diff") or {}).get("maiores", [])[:5]:
+            print(f"   {item['diferenca_bytes'] / 1024:+10.1f} KiB  {item['origem'][-1] if item['origem'] else '?'}")
+
+
+def comparar(relatorio, anterior):
+    """Imprimir a variação percentual em relação a um relatório anterior"""
+    print("\n" + "=" * 78)
+    print(f"🔍 Comparação com {anterior.get('commit') or 'relatório anterior'} ({anterior.get('data')})")
+    print("=" * 78)
+    for nome, resumo in [("geral", relatorio["geral"])] + list(relatorio["operacoes"].items()):
+        base = anterior["geral"] if nome == "geral" else anterior.get("operacoes", {}).get(nome)
+        if not base:
+            continue
+        variacoes = []
+        for chave in ("p50", "p95", "p99"):
+            atual, antes = resumo["latencia_ms"][chave], base["latencia_ms"].get(chave)
+            if atual is not None and antes:
+                variacoes.append(f"{chave} {(atual - antes) / antes * 100:+.1f}%")
+        if base.get("vazao_rps"):
+            variacoes.append(f"vazão {(resumo['vazao_rps'] - base['vazao_rps']) / base['vazao_rps'] * 100:+.1f}%")
+        variacoes.append(f"erro {resumo['taxa_erro'] * 100:.1f}% (antes {base['taxa_erro'] * 100:.1f}%)")
+        print(f"{nome:<10}" + " | ".join(variacoes))
+
+# ============================================
+# FUNÇÃO PRINCIPAL
+# ============================================
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Benchmark de carga do serviço TTS/STT")
+    parser.add_argument("--url", default=SERVICE_URL, help="URL do serviço (ignorada com --offline)")
+    parser.add_argument("--mix", default="tts=6,stt=3,openai=1", help="Pesos das operações (tts, stt, openai)")
+    parser.add_argument("--concorrencia", type=int, default=4, help="Requisições simultâneas")
+    parser.add_argument("--requisicoes", type=int, default=100, help="Total de requisições")
+    parser.add_argument("--duracao", type=float, help="Rodar por N segundos (substitui --requisicoes)")
+    parser.add_argument("--aquecimento", type=int, default=2, help="Requisições descartadas por operação")
+    parser.add_argument("--textos", help="Arquivo com uma frase por linha para o TTS")
+    parser.add_argument("--velocidades", default="1.0", help="Velocidades do TTS, ex.: 0.75,1.0,1.25")
+    parser.add_argument("--audios", nargs="*", help="Arquivos/pastas WAV para o STT (padrão: sintéticos)")
+    parser.add_argument("--duracoes-stt", default="2,5", help="Durações (s) dos áudios sintéticos")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--json", help="Salvar relatório JSON neste arquivo")
+    parser.add_argument("--csv", help="Salvar resumo CSV neste arquivo")
+    parser.add_argument("--comparar", help="Relatório JSON anterior para comparação")
+    soak = parser.add_argument_group("soak test (memória)")
+    soak.add_argument("--soak", action="store_true", help="Amostrar o RSS do serviço durante a carga")
+    soak.add_argument("--admin-token", default=os.getenv("ADMIN_TOKEN"), help="Token das rotas /admin")
+    soak.add_argument("--intervalo-memoria", type=float, default=5.0, help="Segundos entre amostras de RSS")
+    soak.add_argument("--tracemalloc", action="store_true", help="Ligar o tracemalloc e reportar o diff início/fim")
+    offline = parser.add_argument_group("modo offline")
+    offline.add_argument("--offline", action="store_true", help="Iniciar o serviço com simuladores locais")
+    offline.add_argument("--whisper-modelo", default="minusculo",
+                         help="'minusculo' (pesos aleatórios gerados localmente), tiny, base... ou caminho .pt")
+    offline.add_argument("--latencia-openai", type=float, default=0.3, help="Latência do OpenAI simulado (s)")
+    offline.add_argument("--piper-rtf", type=float, default=0.05, help="Custo do Piper simulado (fração da duração)")
+    offline.add_argument("--http-workers", type=int, default=1, help="HTTP_WORKERS do serviço offline")
+    offline.add_argument("--workers-inferencia", type=int, default=0,
+                         help="MODEL_SERVER_WORKERS do serviço offline (workers pré-fork)")
+    offline.add_argument("--gateway", type=int, default=0,
+                         help="Iniciar N instâncias e medir através de um gateway na frente delas")
+    return parser
+
+
+def rodar(args, url):
+    """Executar aquecimento e medição contra `url`; retorna o relatório"""
+    mix = interpretar_mix(args.mix)
+    textos = TEXTOS_PADRAO
+    if args.textos:
+        textos = [linha.strip() for linha in Path(args.textos).read_text(encoding="utf-8").splitlines() if linha.strip()]
+    velocidades = [float(v) for v in args.velocidades.split(",")]
+    audios = carregar_audios(args.audios, [float(d) for d in args.duracoes_stt.split(",")])
+
+    saude = requests.get(f"{url}/health", timeout=10).json()
+
+    if args.aquecimento:
+        print(f"🔥 Aquecimento ({args.aquecimento} por operação)...")
+        for operacao in mix:
+            aquecimento = GeradorCarga(url, {operacao: 1}, textos, audios, velocidades, args.timeout, args.semente)
+            aquecimento.executar(1, total=args.aquecimento)
+
+    print(f"⏳ Medindo: mix={args.mix} concorrência={args.concorrencia} "
+          + (f"duração={args.duracao}s" if args.duracao else f"requisições={args.requisicoes}"))
+    gerador = GeradorCarga(url, mix, textos, audios, velocidades, args.timeout, args.semente)
+    total = None if args.duracao else args.requisicoes
+
+    if not args.soak:
+        tempo_total = gerador.executar(args.concorrencia, total=total, duracao=args.duracao)
+        return montar_relatorio(gerador, tempo_total, args, saude)
+
+    if not args.admin_token:
+        raise SystemExit("❌ --soak exige --admin-token (ou ADMIN_TOKEN no .env)")
+    with MonitorMemoria(url, args.admin_token, gerador, args.intervalo_memoria, args.tracemalloc) as monitor:
+        tempo_total = gerador.executar(args.concorrencia, total=total, duracao=args.duracao)
+    relatorio = montar_relatorio(gerador, tempo_total, args, saude)
+    relatorio["memoria"] = monitor.resumo()
+    return relatorio
+
+
+def main():
+    args = criar_parser().parse_args()
+
+    if args.offline:
+        env_extra = {
+            "HTTP_WORKERS": str(args.http_workers),
+            "MODEL_SERVER_WORKERS": str(args.workers_inferencia),
+        }
+        if args.soak:
+            args.admin_token = args.admin_token or secrets.token_hex(16)
+            env_extra["ADMIN_TOKEN"] = args.admin_token
+        with ExitStack() as pilha:
+            if args.gateway:
+                # N instâncias locais e um gateway na frente delas (o benchmark mede o gateway)
+                peers = [
+                    pilha.enter_context(AmbienteOffline(args.whisper_modelo, args.latencia_openai, args.piper_rtf, env_extra))
+                    for _ in range(args.gateway)
+                ]
+                env_extra = dict(env_extra, GATEWAY_PEERS=",".join(peer.url for peer in peers))
+            ambiente = pilha.enter_context(
+                AmbienteOffline(args.whisper_modelo, args.latencia_openai, args.piper_rtf, env_extra)
+            )
+            relatorio = rodar(args, ambiente.url)
+    else:
+        relatorio = rodar(args, args.url)
+
+    imprimir_relatorio(relatorio)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(relatorio, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"💾 JSON salvo em: {args.json}")
+    if args.csv:
+        salvar_csv(relatorio, args.csv)
+        print(f"💾 CSV salvo em: {args.csv}")
+    if args.comparar:
+        comparar(relatorio, json.loads(Path(args.comparar).read_text(encoding="utf-8")))
+
+    return 0 if relatorio["geral"]["erros"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
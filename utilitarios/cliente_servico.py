@@ -0,0 +1,371 @@
+"""
+Cliente do Serviço TTS/STT
+Usado pelo gravador (gravador_transcricao.py) e pelo teste (testar_servico_tts_e_stt.py):
+
+- uma Session com pool de conexões keep-alive por cliente (nada de conexão nova por requisição)
+- novas tentativas com backoff em falha de conexão e em 503/429 com Retry-After; o 504 de prazo
+  esgotado e o 503 sem Retry-After (sobrecarga, drenagem) não são repetidos, para não multiplicar
+  a carga justo quando o serviço está recusando trabalho
+- upload multipart direto da memória (bytes/BytesIO), sem passar por arquivo temporário
+- TTS em binário: pede format=url e baixa o WAV de /api/audio/{chave}, sem base64
+- transcrever_varios: muitas transcrições com concorrência limitada, na ordem em que terminam
+
+ClienteServicoAsync faz o mesmo com httpx (opcional: pip install httpx)
+"""
+
+import asyncio
+import base64
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Tempo máximo de espera por uma transcrição; enviado ao serviço como prazo (X-Request-Timeout)
+TIMEOUT_TRANSCRICAO = 120
+TIMEOUT_TTS = 30
+TIMEOUT_CONSULTA = 5
+
+# Respostas que valem nova tentativa, e só quando o serviço diz quando tentar (Retry-After)
+STATUS_REPETIR = (429, 503)
+
+# Campo "code" da resposta de format=url quando o serviço está sem cache de TTS
+ERRO_URL_INDISPONIVEL = "audio_url_unavailable"
+
+TIPOS_AUDIO = {
+    ".wav": "audio/wav",
+    ".mp3": "audio/mpeg",
+    ".m4a": "audio/mp4",
+    ".flac": "audio/flac",
+    ".ogg": "audio/ogg",
+}
+
+Audio = Union[bytes, bytearray, io.BytesIO, str, Path]
+
+# ============================================
+# RESULTADO
+# ============================================
+
+def interpretar_server_timing(cabecalho):
+    """Converter o cabeçalho Server-Timing em {etapa: segundos}"""
+    etapas = {}
+    for metrica in (cabecalho or "").split(","):
+        partes = [p.strip() for p in metrica.split(";")]
+        if not partes[0]:
+            continue
+        for parametro in partes[1:]:
+            if parametro.startswith("dur="):
+                try:
+                    etapas[partes[0]] = float(parametro[4:]) / 1000
+                except ValueError:
+                    pass
+    return etapas
+
+
+class Resultado:
+    """Resposta de uma chamada: status, JSON (se houver), erro, tempo de ida e volta e etapas do servidor"""
+
+    __slots__ = ("status", "dados", "erro", "tempo", "etapas")
+
+    def __init__(self, status: int = 0, dados=None, erro: str = "", tempo: float = 0.0,
+                 etapas: Optional[Dict[str, float]] = None):
+        self.status = status
+        self.dados = dados
+        self.erro = erro
+        self.tempo = tempo
+        self.etapas = etapas or {}
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 200 and not self.erro
+
+    @property
+    def texto(self) -> str:
+        return (self.dados or {}).get("text", "") if isinstance(self.dados, dict) else ""
+
+    @classmethod
+    def da_resposta(cls, resposta, inicio: float) -> "Resultado":
+        """Montar a partir de uma resposta do requests ou do httpx"""
+        tempo = time.time() - inicio
+        etapas = interpretar_server_timing(resposta.headers.get("Server-Timing"))
+        if resposta.status_code != 200:
+            return cls(resposta.status_code, erro=f"{resposta.status_code} - {resposta.text}",
+                       tempo=tempo, etapas=etapas)
+        try:
+            dados = resposta.json()
+        except ValueError:
+            dados = None
+        return cls(resposta.status_code, dados, tempo=tempo, etapas=etapas)
+
+
+def preparar_audio(audio: Audio, nome: Optional[str] = None) -> Tuple[str, io.BytesIO, str]:
+    """(nome, buffer, content-type) para o multipart; caminhos são lidos uma vez para a memória"""
+    if isinstance(audio, (str, Path)):
+        caminho = Path(audio)
+        nome = nome or caminho.name
+        buffer = io.BytesIO(caminho.read_bytes())
+    elif isinstance(audio, io.BytesIO):
+        buffer = audio
+        buffer.seek(0)
+    else:
+        buffer = io.BytesIO(bytes(audio))
+    nome = nome or "audio.wav"
+    return nome, buffer, TIPOS_AUDIO.get(Path(nome).suffix.lower(), "application/octet-stream")
+
+
+def _rota_transcricao(openai: bool) -> str:
+    return "/api/transcribe-audio-openai" if openai else "/api/transcribe-audio"
+
+
+def url_indisponivel(resposta) -> bool:
+    """O serviço não oferece format=url (sem cache de TTS)"""
+    if resposta.status_code != 503:
+        return False
+    try:
+        return resposta.json().get("code") == ERRO_URL_INDISPONIVEL
+    except (ValueError, AttributeError):
+        return False
+
+# ============================================
+# CLIENTE (SÍNCRONO)
+# ============================================
+
+class ClienteServico:
+    """Cliente com pool de conexões; uma instância pode ser compartilhada entre threads"""
+
+    def __init__(self, base_url: str, conexoes: int = 10, tentativas: int = 3, backoff: float = 0.5):
+        self.base_url = base_url.rstrip("/")
+        self.conexoes = conexoes
+        self.sem_url = False  # Serviço sem cache de TTS: /api/generate-audio só em base64
+        self.sessao = requests.Session()
+        retry = Retry(
+            total=tentativas,
+            connect=tentativas,
+            read=0,  # Requisição que chegou ao servidor não é repetida por timeout de leitura
+            status=tentativas,
+            # Sem status_forcelist: só 413/429/503 com Retry-After são repetidos (regra do urllib3)
+            status_forcelist=None,
+            allowed_methods=None,  # Inclui POST: TTS e transcrição não alteram estado no servidor
+            backoff_factor=backoff,
+            raise_on_status=False,
+            respect_retry_after_header=True,
+        )
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=conexoes, max_retries=retry)
+        self.sessao.mount("http://", adaptador)
+        self.sessao.mount("https://", adaptador)
+
+    def url(self, caminho: str) -> str:
+        return caminho if caminho.startswith("http") else f"{self.base_url}{caminho}"
+
+    def get(self, caminho: str, timeout: float = TIMEOUT_CONSULTA, **kwargs) -> requests.Response:
+        return self.sessao.get(self.url(caminho), timeout=timeout, **kwargs)
+
+    def post(self, caminho: str, timeout: float = TIMEOUT_CONSULTA, **kwargs) -> requests.Response:
+        return self.sessao.post(self.url(caminho), timeout=timeout, **kwargs)
+
+    def saude(self) -> Resultado:
+        inicio = time.time()
+        return Resultado.da_resposta(self.get("/health"), inicio)
+
+    def gerar_audio(self, texto: str, velocidade: float = 1.0, voz: Optional[str] = None,
+                    binario: bool = True) -> Tuple[Optional[bytes], Resultado]:
+        """
+        WAV gerado e o resultado da chamada
+        Com binario=True pede a URL estável do áudio e baixa os bytes; se o serviço estiver
+        sem cache (503 com code=audio_url_unavailable), repete em base64 e não tenta mais o modo url
+        """
+        corpo = {"text": texto, "speed": velocidade}
+        if voz:
+            corpo["voice"] = voz
+        inicio = time.time()
+        if binario and not self.sem_url:
+            resposta = self.post("/api/generate-audio", params={"format": "url"}, json=corpo, timeout=TIMEOUT_TTS)
+            self.sem_url = url_indisponivel(resposta)
+            if not self.sem_url:
+                resultado = Resultado.da_resposta(resposta, inicio)
+                if not resultado.ok:
+                    return None, resultado
+                audio = self.get(resultado.dados["url"], timeout=TIMEOUT_TTS)
+                resultado.tempo = time.time() - inicio
+                if audio.status_code != 200:
+                    resultado.status, resultado.erro = audio.status_code, f"{audio.status_code} - {audio.text}"
+                    return None, resultado
+                return audio.content, resultado
+
+        resultado = Resultado.da_resposta(self.post("/api/generate-audio", json=corpo, timeout=TIMEOUT_TTS), inicio)
+        if not resultado.ok:
+            return None, resultado
+        return base64.b64decode(resultado.dados.get("audio", "")), resultado
+
+    def transcrever(self, audio: Audio, nome: Optional[str] = None, openai: bool = False,
+                    prazo: float = TIMEOUT_TRANSCRICAO) -> Resultado:
+        """Transcrever bytes, BytesIO ou arquivo; erros de rede viram Resultado com erro"""
+        inicio = time.time()
+        try:
+            nome, buffer, tipo = preparar_audio(audio, nome)
+            resposta = self.post(
+                _rota_transcricao(openai),
+                files={"file": (nome, buffer, tipo)},
+                headers={"X-Request-Timeout": str(prazo)},
+                timeout=prazo,
+            )
+        except (requests.RequestException, OSError) as e:
+            return Resultado(erro=str(e), tempo=time.time() - inicio)
+        return Resultado.da_resposta(resposta, inicio)
+
+    def transcrever_varios(self, arquivos: Iterable[Audio], concorrencia: int = 4, openai: bool = False,
+                           prazo: float = TIMEOUT_TRANSCRICAO,
+                           cancelar: Optional[threading.Event] = None) -> Iterator[Tuple[Audio, Resultado]]:
+        """
+        (arquivo, resultado) de cada transcrição, na ordem em que terminam
+        No máximo `concorrencia` em andamento (limitada também pelo pool de conexões);
+        com `cancelar` definido, as que ainda não começaram são abandonadas
+        """
+        concorrencia = max(1, min(concorrencia, self.conexoes))
+        arquivos = iter(arquivos)
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            pendentes = {}
+
+            def enviar_proximo():
+                if cancelar is not None and cancelar.is_set():
+                    return
+                arquivo = next(arquivos, None)
+                if arquivo is not None:
+                    pendentes[executor.submit(self.transcrever, arquivo, None, openai, prazo)] = arquivo
+
+            for _ in range(concorrencia):
+                enviar_proximo()
+            while pendentes:
+                futuro = next(as_completed(pendentes))
+                arquivo = pendentes.pop(futuro)
+                enviar_proximo()
+                yield arquivo, futuro.result()
+
+    def fechar(self):
+        self.sessao.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+# ============================================
+# CLIENTE (ASSÍNCRONO)
+# ============================================
+
+class ClienteServicoAsync:
+    """Mesmo cliente sobre httpx.AsyncClient, para quem já roda num loop asyncio"""
+
+    def __init__(self, base_url: str, conexoes: int = 10, tentativas: int = 3, backoff: float = 0.5):
+        if httpx is None:
+            raise RuntimeError("ClienteServicoAsync requer httpx (pip install httpx)")
+        self.base_url = base_url.rstrip("/")
+        self.conexoes = conexoes
+        self.tentativas = tentativas
+        self.backoff = backoff
+        self.sem_url = False
+        self.cliente = httpx.AsyncClient(
+            base_url=self.base_url,
+            # Com transport explícito o httpx ignora limits= do cliente: os limites vão no transport,
+            # que também repete as falhas de conexão; os status de STATUS_REPETIR ficam em _enviar
+            transport=httpx.AsyncHTTPTransport(
+                retries=tentativas,
+                limits=httpx.Limits(max_connections=conexoes, max_keepalive_connections=conexoes),
+            ),
+        )
+
+    async def _enviar(self, metodo: str, caminho: str, **kwargs):
+        for tentativa in range(self.tentativas + 1):
+            resposta = await self.cliente.request(metodo, caminho, **kwargs)
+            if resposta.status_code not in STATUS_REPETIR or tentativa == self.tentativas:
+                return resposta
+            try:
+                espera = float(resposta.headers.get("Retry-After"))
+            except (TypeError, ValueError):
+                return resposta  # Sem Retry-After: sobrecarga ou drenagem, não repetir
+            await asyncio.sleep(espera)
+        return resposta
+
+    async def saude(self) -> Resultado:
+        inicio = time.time()
+        return Resultado.da_resposta(await self._enviar("GET", "/health", timeout=TIMEOUT_CONSULTA), inicio)
+
+    async def gerar_audio(self, texto: str, velocidade: float = 1.0, voz: Optional[str] = None,
+                          binario: bool = True) -> Tuple[Optional[bytes], Resultado]:
+        corpo = {"text": texto, "speed": velocidade}
+        if voz:
+            corpo["voice"] = voz
+        inicio = time.time()
+        if binario and not self.sem_url:
+            resposta = await self._enviar("POST", "/api/generate-audio", params={"format": "url"},
+                                          json=corpo, timeout=TIMEOUT_TTS)
+            self.sem_url = url_indisponivel(resposta)
+            if not self.sem_url:
+                resultado = Resultado.da_resposta(resposta, inicio)
+                if not resultado.ok:
+                    return None, resultado
+                audio = await self._enviar("GET", resultado.dados["url"], timeout=TIMEOUT_TTS)
+                resultado.tempo = time.time() - inicio
+                if audio.status_code != 200:
+                    resultado.status, resultado.erro = audio.status_code, f"{audio.status_code} - {audio.text}"
+                    return None, resultado
+                return audio.content, resultado
+
+        resposta = await self._enviar("POST", "/api/generate-audio", json=corpo, timeout=TIMEOUT_TTS)
+        resultado = Resultado.da_resposta(resposta, inicio)
+        if not resultado.ok:
+            return None, resultado
+        return base64.b64decode(resultado.dados.get("audio", "")), resultado
+
+    async def transcrever(self, audio: Audio, nome: Optional[str] = None, openai: bool = False,
+                          prazo: float = TIMEOUT_TRANSCRICAO) -> Resultado:
+        inicio = time.time()
+        try:
+            nome, buffer, tipo = preparar_audio(audio, nome)
+            resposta = await self._enviar(
+                "POST",
+                _rota_transcricao(openai),
+                files={"file": (nome, buffer, tipo)},
+                headers={"X-Request-Timeout": str(prazo)},
+                timeout=prazo,
+            )
+        except (httpx.HTTPError, OSError) as e:
+            return Resultado(erro=str(e) or type(e).__name__, tempo=time.time() - inicio)
+        return Resultado.da_resposta(resposta, inicio)
+
+    async def transcrever_varios(self, arquivos: Iterable[Audio], concorrencia: int = 4, openai: bool = False,
+                                 prazo: float = TIMEOUT_TRANSCRICAO):
+        """(arquivo, resultado) na ordem em que terminam, com no máximo `concorrencia` em andamento"""
+        vagas = asyncio.Semaphore(max(1, min(concorrencia, self.conexoes)))
+
+        async def uma(arquivo):
+            async with vagas:
+                return arquivo, await self.transcrever(arquivo, None, openai, prazo)
+
+        tarefas = [asyncio.ensure_future(uma(arquivo)) for arquivo in arquivos]
+        try:
+            for proxima in asyncio.as_completed(tarefas):
+                yield await proxima
+        finally:
+            for tarefa in tarefas:
+                tarefa.cancel()
+
+    async def fechar(self):
+        await self.cliente.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.fechar()
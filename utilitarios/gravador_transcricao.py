@@ -9,7 +9,8 @@ from tkinter import ttk, scrolledtext, messagebox, Toplevel, filedialog
 import pyaudio
 import wave
 import threading
-import requests
+import csv
+import json
 from datetime import datetime
 from pathlib import Path
 import os
@@ -17,11 +18,22 @@ import sys
 import time
 from dotenv import load_dotenv
 
+from cliente_servico import ClienteServico, TIPOS_AUDIO
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
 # Configurações
 SERVICE_URL = f"http://{os.getenv('SERVICE_HOST', '127.0.0.1')}:{os.getenv('SERVICE_PORT', '3015')}"
+# Tempo máximo de espera por uma transcrição; enviado ao serviço como prazo (X-Request-Timeout)
+TIMEOUT_TRANSCRICAO = 120
+# Transcrição em lote (pasta): transcrições simultâneas por serviço e nome do manifesto de resultados
+CONCORRENCIA_LOTE = int(os.getenv("LOTE_CONCORRENCIA", "4"))
+CONCORRENCIA_LOTE_MAX = 8
+NOME_MANIFESTO_LOTE = "transcricoes"
+# Cliente compartilhado: conexões keep-alive reaproveitadas por todas as transcrições
+# (o lote pode ter CONCORRENCIA_LOTE_MAX por serviço em andamento ao mesmo tempo)
+cliente = ClienteServico(SERVICE_URL, conexoes=2 * CONCORRENCIA_LOTE_MAX)
 AUDIOS_DIR = Path("audios")
 AUDIOS_DIR.mkdir(exist_ok=True)
 
@@ -54,14 +66,49 @@ def verificar_dependencias():
 
     # Verificar serviço
     try:
-        response = requests.get(f"{SERVICE_URL}/health", timeout=5)
-        if response.status_code != 200:
+        if not cliente.saude().ok:
             erros.append(f"Serviço não está respondendo corretamente em {SERVICE_URL}")
     except:
         erros.append(f"Serviço não está acessível em {SERVICE_URL}\nCertifique-se de que servico_tts_e_stt.py está rodando")
 
     return erros
 
+# ============================================
+# TEMPOS DO SERVIDOR (Server-Timing)
+# ============================================
+
+# Nomes exibidos para as etapas reportadas pelo serviço
+NOMES_ETAPAS = {
+    "queue": "Fila",
+    "decode": "Decodificação",
+    "inference": "Inferência",
+    "encode": "Codificação",
+    "remote": "OpenAI (ida e volta)",
+    "gateway": "Gateway (repasse)",
+    "coalesced": "Requisição idêntica (aguardando)",
+    "cache": "Cache de áudio",
+    "stretch": "Mudança de velocidade",
+}
+
+def resumir_tempos(tempo_total, etapas):
+    """Separar o tempo total em processamento no servidor e rede/upload"""
+    tempo_servidor = etapas.get("total")
+    if tempo_servidor is None:
+        return f"⏱️ {tempo_total:.2f}s"
+    tempo_rede = max(tempo_total - tempo_servidor, 0.0)
+    return f"⏱️ {tempo_total:.2f}s (servidor {tempo_servidor:.2f}s · rede {tempo_rede:.2f}s)"
+
+def detalhar_etapas(etapas):
+    """Listar a duração de cada etapa reportada pelo servidor"""
+    linhas = [
+        f"  {NOMES_ETAPAS.get(nome, nome)}: {duracao:.3f}s"
+        for nome, duracao in etapas.items()
+        if nome != "total"
+    ]
+    if not linhas:
+        return ""
+    return "Etapas no servidor:\n" + "\n".join(linhas) + "\n"
+
 # ============================================
 # CLASSE PRINCIPAL
 # ============================================
@@ -153,7 +200,19 @@ class GravadorTranscricao:
             command=self.abrir_modo_individual,
             cursor="hand2"
         )
-        self.btn_individual.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
+        self.btn_individual.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+
+        # Botão transcrição em lote (pasta)
+        self.btn_lote = tk.Button(
+            btns_extras,
+            text="📂 Transcrever Pasta",
+            font=("Arial", 10),
+            bg="#009688",
+            fg="white",
+            command=self.abrir_modo_lote,
+            cursor="hand2"
+        )
+        self.btn_lote.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
 
         # Label de status
         self.label_status = tk.Label(
@@ -453,36 +512,31 @@ class GravadorTranscricao:
         inicio = time.time()
 
         try:
-            with open(self.ultimo_arquivo, 'rb') as f:
-                files = {'file': (self.ultimo_arquivo.name, f, 'audio/wav')}
-                # Especificar idioma alemão via parâmetro
-                response = requests.post(
-                    f"{SERVICE_URL}/api/transcribe-audio",
-                    files=files,
-                    timeout=120
-                )
-
+            resultado = cliente.transcrever(self.ultimo_arquivo, openai=False, prazo=TIMEOUT_TRANSCRICAO)
             tempo_decorrido = time.time() - inicio
             self.tempo_local = tempo_decorrido
+            etapas = resultado.etapas
 
-            if response.status_code == 200:
-                resultado = response.json()
-                texto = resultado.get('text', '')
+            if resultado.ok:
+                texto = resultado.texto
 
                 output = f"✅ Transcrição Local Concluída\n\n"
                 output += f"Texto:\n{texto}\n\n"
 
-                if resultado.get('segments'):
+                if resultado.dados.get('segments'):
                     output += "Segmentos com timestamp:\n"
-                    for seg in resultado['segments']:
+                    for seg in resultado.dados['segments']:
                         output += f"[{seg['start']:.2f}s - {seg['end']:.2f}s] {seg['text']}\n"
 
+                output += "\n" + detalhar_etapas(etapas)
+
+                resumo = resumir_tempos(tempo_decorrido, etapas)
                 self.atualizar_texto(self.texto_local, output)
-                self.root.after(0, lambda: self.label_tempo_local.config(text=f"⏱️ {tempo_decorrido:.2f}s"))
+                self.root.after(0, lambda: self.label_tempo_local.config(text=resumo))
             else:
                 self.atualizar_texto(
                     self.texto_local,
-                    f"❌ Erro na transcrição local:\n{response.status_code} - {response.text}"
+                    f"❌ Erro na transcrição local:\n{resultado.erro}"
                 )
 
         except Exception as e:
@@ -499,36 +553,31 @@ class GravadorTranscricao:
         inicio = time.time()
 
         try:
-            with open(self.ultimo_arquivo, 'rb') as f:
-                files = {'file': (self.ultimo_arquivo.name, f, 'audio/wav')}
-                # Especificar idioma alemão via parâmetro (se a API suportar)
-                response = requests.post(
-                    f"{SERVICE_URL}/api/transcribe-audio-openai",
-                    files=files,
-                    timeout=120
-                )
-
+            resultado = cliente.transcrever(self.ultimo_arquivo, openai=True, prazo=TIMEOUT_TRANSCRICAO)
             tempo_decorrido = time.time() - inicio
             self.tempo_openai = tempo_decorrido
+            etapas = resultado.etapas
 
-            if response.status_code == 200:
-                resultado = response.json()
-                texto = resultado.get('text', '')
+            if resultado.ok:
+                texto = resultado.texto
 
                 output = f"✅ Transcrição OpenAI Concluída\n\n"
                 output += f"Texto:\n{texto}\n\n"
 
-                if resultado.get('segments'):
+                if resultado.dados.get('segments'):
                     output += "Segmentos com timestamp:\n"
-                    for seg in resultado['segments']:
+                    for seg in resultado.dados['segments']:
                         output += f"[{seg['start']:.2f}s - {seg['end']:.2f}s] {seg['text']}\n"
 
+                output += "\n" + detalhar_etapas(etapas)
+
+                resumo = resumir_tempos(tempo_decorrido, etapas)
                 self.atualizar_texto(self.texto_openai, output)
-                self.root.after(0, lambda: self.label_tempo_openai.config(text=f"⏱️ {tempo_decorrido:.2f}s"))
+                self.root.after(0, lambda: self.label_tempo_openai.config(text=resumo))
             else:
                 self.atualizar_texto(
                     self.texto_openai,
-                    f"❌ Erro na transcrição OpenAI:\n{response.status_code} - {response.text}"
+                    f"❌ Erro na transcrição OpenAI:\n{resultado.erro}"
                 )
 
         except Exception as e:
@@ -572,6 +621,10 @@ class GravadorTranscricao:
         """Abrir janela de modo individual"""
         ModoIndividual(self.root, self.ultimo_arquivo)
 
+    def abrir_modo_lote(self):
+        """Abrir janela de transcrição em lote (pasta)"""
+        ModoLote(self.root, AUDIOS_DIR)
+
     def on_closing(self):
         """Limpar recursos ao fechar"""
         if self.gravando:
@@ -842,22 +895,16 @@ class ModoIndividual:
         inicio = time.time()
 
         try:
-            with open(self.ultimo_arquivo, 'rb') as f:
-                files = {'file': (self.ultimo_arquivo.name, f, 'audio/wav')}
-                response = requests.post(
-                    f"{SERVICE_URL}/api/transcribe-audio",
-                    files=files,
-                    timeout=120
-                )
-
+            resultado = cliente.transcrever(self.ultimo_arquivo, openai=False, prazo=TIMEOUT_TRANSCRICAO)
             tempo = time.time() - inicio
+            etapas = resultado.etapas
 
-            if response.status_code == 200:
-                resultado = response.json()
-                output = f"✅ Transcrição Local ({tempo:.2f}s)\n\n{resultado.get('text', '')}"
+            if resultado.ok:
+                output = f"✅ Transcrição Local {resumir_tempos(tempo, etapas)}\n\n{resultado.texto}\n\n"
+                output += detalhar_etapas(etapas)
                 self.atualizar_texto(output)
             else:
-                self.atualizar_texto(f"❌ Erro: {response.status_code}")
+                self.atualizar_texto(f"❌ Erro: {resultado.erro}")
 
         except Exception as e:
             self.atualizar_texto(f"❌ Erro: {str(e)}")
@@ -874,22 +921,16 @@ class ModoIndividual:
         inicio = time.time()
 
         try:
-            with open(self.ultimo_arquivo, 'rb') as f:
-                files = {'file': (self.ultimo_arquivo.name, f, 'audio/wav')}
-                response = requests.post(
-                    f"{SERVICE_URL}/api/transcribe-audio-openai",
-                    files=files,
-                    timeout=120
-                )
-
+            resultado = cliente.transcrever(self.ultimo_arquivo, openai=True, prazo=TIMEOUT_TRANSCRICAO)
             tempo = time.time() - inicio
+            etapas = resultado.etapas
 
-            if response.status_code == 200:
-                resultado = response.json()
-                output = f"✅ Transcrição OpenAI ({tempo:.2f}s)\n\n{resultado.get('text', '')}"
+            if resultado.ok:
+                output = f"✅ Transcrição OpenAI {resumir_tempos(tempo, etapas)}\n\n{resultado.texto}\n\n"
+                output += detalhar_etapas(etapas)
                 self.atualizar_texto(output)
             else:
-                self.atualizar_texto(f"❌ Erro: {response.status_code}")
+                self.atualizar_texto(f"❌ Erro: {resultado.erro}")
 
         except Exception as e:
             self.atualizar_texto(f"❌ Erro: {str(e)}")
@@ -930,6 +971,379 @@ class ModoIndividual:
         self.janela.destroy()
 
 
+# ============================================
+# MANIFESTO DO LOTE (PASTA)
+# ============================================
+
+CAMPOS_MANIFESTO = ["arquivo", "servico", "status", "texto", "erro", "tempo_s", "servidor_s",
+                    "duracao_audio_s", "tamanho", "modificado", "data"]
+
+def arquivos_de_audio(pasta):
+    """Arquivos de áudio da pasta (sem subpastas), em ordem de nome"""
+    return sorted(p for p in Path(pasta).iterdir() if p.is_file() and p.suffix.lower() in TIPOS_AUDIO)
+
+def assinatura(caminho):
+    """(tamanho, modificado) do arquivo: se mudar, o arquivo é transcrito de novo"""
+    info = caminho.stat()
+    return str(info.st_size), str(int(info.st_mtime))
+
+def duracao_audio(caminho):
+    """Duração em segundos (só WAV, lendo o cabeçalho); None nos outros formatos"""
+    if caminho.suffix.lower() != ".wav":
+        return None
+    try:
+        with wave.open(str(caminho), 'rb') as wf:
+            return wf.getnframes() / wf.getframerate()
+    except (wave.Error, EOFError, OSError):
+        return None
+
+def ler_manifesto(caminho):
+    """Chaves (arquivo, serviço, tamanho, modificado) já transcritas com sucesso"""
+    concluidos = set()
+    if not caminho.exists():
+        return concluidos
+    with open(caminho, encoding="utf-8", newline="") as f:
+        if caminho.suffix == ".csv":
+            registros = csv.DictReader(f)
+        else:
+            registros = (json.loads(linha) for linha in f if linha.strip())
+        for registro in registros:
+            if registro.get("status") == "ok":
+                concluidos.add((registro["arquivo"], registro["servico"],
+                                str(registro["tamanho"]), str(registro["modificado"])))
+    return concluidos
+
+class ManifestoLote:
+    """Resultados gravados um a um (CSV ou JSONL), para não perder nada se o lote for interrompido"""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        novo = not caminho.exists() or caminho.stat().st_size == 0
+        self.arquivo = open(caminho, "a", encoding="utf-8", newline="")
+        self.csv = None
+        if caminho.suffix == ".csv":
+            self.csv = csv.DictWriter(self.arquivo, fieldnames=CAMPOS_MANIFESTO)
+            if novo:
+                self.csv.writeheader()
+        self.trava = threading.Lock()
+
+    def gravar(self, registro):
+        with self.trava:
+            if self.csv:
+                self.csv.writerow(registro)
+            else:
+                self.arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            self.arquivo.flush()
+
+    def fechar(self):
+        with self.trava:
+            self.arquivo.close()
+
+# ============================================
+# JANELA MODO LOTE (PASTA)
+# ============================================
+
+class ModoLote:
+    """Transcrever todos os áudios de uma pasta, com concorrência limitada por serviço"""
+
+    def __init__(self, parent, pasta_inicial=AUDIOS_DIR):
+        self.janela = Toplevel(parent)
+        self.janela.title("Transcrição em Lote (Pasta)")
+        self.janela.geometry("800x600")
+
+        self.pasta = Path(pasta_inicial)
+        self.cancelar = threading.Event()
+        self.trava = threading.Lock()
+        self.executando = False
+        self.fechar_ao_terminar = False
+
+        self.criar_interface()
+
+        # Configurar evento de fechamento
+        self.janela.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+    def criar_interface(self):
+        """Criar interface do modo lote"""
+
+        # Título
+        titulo = tk.Label(
+            self.janela,
+            text="📂 Transcrição em Lote (Pasta)",
+            font=("Arial", 16, "bold"),
+            bg="#009688",
+            fg="white",
+            pady=12
+        )
+        titulo.pack(fill=tk.X)
+
+        # Frame principal
+        main_frame = tk.Frame(self.janela, padx=20, pady=20)
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        # Seção de configuração
+        config_frame = tk.LabelFrame(
+            main_frame,
+            text="Configuração",
+            font=("Arial", 11, "bold"),
+            padx=10,
+            pady=10
+        )
+        config_frame.pack(fill=tk.X, pady=(0, 15))
+
+        pasta_frame = tk.Frame(config_frame)
+        pasta_frame.pack(fill=tk.X, pady=5)
+
+        self.btn_pasta = tk.Button(
+            pasta_frame,
+            text="📁 Escolher Pasta",
+            font=("Arial", 10),
+            bg="#2196F3",
+            fg="white",
+            command=self.escolher_pasta
+        )
+        self.btn_pasta.pack(side=tk.LEFT)
+
+        self.label_pasta = tk.Label(pasta_frame, text=str(self.pasta.absolute()), font=("Arial", 9), fg="#666")
+        self.label_pasta.pack(side=tk.LEFT, padx=10)
+
+        opcoes_frame = tk.Frame(config_frame)
+        opcoes_frame.pack(fill=tk.X, pady=5)
+
+        self.usar_local = tk.BooleanVar(value=True)
+        self.usar_openai = tk.BooleanVar(value=False)
+        tk.Checkbutton(opcoes_frame, text="🖥️ Local", variable=self.usar_local).pack(side=tk.LEFT)
+        tk.Checkbutton(opcoes_frame, text="☁️ OpenAI", variable=self.usar_openai).pack(side=tk.LEFT, padx=(10, 20))
+
+        tk.Label(opcoes_frame, text="Simultâneos por serviço:").pack(side=tk.LEFT)
+        self.concorrencia = tk.IntVar(value=CONCORRENCIA_LOTE)
+        tk.Spinbox(
+            opcoes_frame, from_=1, to=CONCORRENCIA_LOTE_MAX, width=4, textvariable=self.concorrencia
+        ).pack(side=tk.LEFT, padx=(5, 20))
+
+        tk.Label(opcoes_frame, text="Manifesto:").pack(side=tk.LEFT)
+        self.formato = tk.StringVar(value="jsonl")
+        ttk.Combobox(
+            opcoes_frame, textvariable=self.formato, values=("jsonl", "csv"), width=6, state="readonly"
+        ).pack(side=tk.LEFT, padx=5)
+
+        # Botões de execução
+        btns_frame = tk.Frame(main_frame)
+        btns_frame.pack(fill=tk.X, pady=(0, 15))
+
+        self.btn_iniciar = tk.Button(
+            btns_frame,
+            text="▶️ Transcrever Pasta",
+            font=("Arial", 11, "bold"),
+            bg="#4CAF50",
+            fg="white",
+            command=self.iniciar,
+            height=2
+        )
+        self.btn_iniciar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
+
+        self.btn_parar = tk.Button(
+            btns_frame,
+            text="⏹️ Parar",
+            font=("Arial", 11, "bold"),
+            bg="#f44336",
+            fg="white",
+            command=self.parar,
+            height=2,
+            state=tk.DISABLED
+        )
+        self.btn_parar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
+
+        # Progresso agregado
+        self.progress = ttk.Progressbar(main_frame, mode='determinate')
+        self.progress.pack(fill=tk.X)
+
+        self.label_progresso = tk.Label(main_frame, text="Pronto", font=("Arial", 9), fg="#666")
+        self.label_progresso.pack(pady=5)
+
+        # Registro dos resultados
+        resultado_frame = tk.LabelFrame(
+            main_frame,
+            text="Resultados",
+            font=("Arial", 11, "bold"),
+            padx=10,
+            pady=10
+        )
+        resultado_frame.pack(fill=tk.BOTH, expand=True)
+
+        self.texto_resultado = scrolledtext.ScrolledText(
+            resultado_frame,
+            wrap=tk.WORD,
+            font=("Arial", 9),
+            state=tk.DISABLED
+        )
+        self.texto_resultado.pack(fill=tk.BOTH, expand=True)
+
+    def escolher_pasta(self):
+        pasta = filedialog.askdirectory(title='Selecione a pasta de áudios', initialdir=self.pasta)
+        if pasta:
+            self.pasta = Path(pasta)
+            self.label_pasta.config(text=str(self.pasta.absolute()))
+
+    def iniciar(self):
+        """Montar a lista de pendentes (pulando o que o manifesto já tem) e iniciar o lote"""
+        servicos = [nome for nome, usar in (("local", self.usar_local), ("openai", self.usar_openai)) if usar.get()]
+        if not servicos:
+            messagebox.showwarning("Lote", "Escolha ao menos um serviço", parent=self.janela)
+            return
+
+        try:
+            caminho_manifesto = self.pasta / f"{NOME_MANIFESTO_LOTE}.{self.formato.get()}"
+            concluidos = ler_manifesto(caminho_manifesto)
+            arquivos = arquivos_de_audio(self.pasta)
+        except (OSError, ValueError, KeyError) as e:
+            messagebox.showerror("Erro", f"Erro ao preparar o lote:\n{str(e)}", parent=self.janela)
+            return
+
+        # Pendentes por serviço: arquivos novos, alterados ou que falharam da última vez
+        pendentes = {}
+        self.assinaturas = {arquivo: assinatura(arquivo) for arquivo in arquivos}
+        for servico in servicos:
+            pendentes[servico] = [
+                arquivo for arquivo in arquivos
+                if (arquivo.name, servico, *self.assinaturas[arquivo]) not in concluidos
+            ]
+
+        self.total = sum(len(lista) for lista in pendentes.values())
+        self.pulados = len(arquivos) * len(servicos) - self.total
+        self.concluidos = 0
+        self.erros = 0
+        self.segundos_audio = 0.0
+
+        self.limpar_texto()
+        self.registrar(
+            f"📂 {len(arquivos)} arquivos em {self.pasta} · {self.total} transcrições pendentes"
+            f" · {self.pulados} já no manifesto ({caminho_manifesto.name})\n"
+        )
+        if not self.total:
+            self.label_progresso.config(text="✅ Nada a transcrever: tudo já está no manifesto")
+            return
+
+        self.manifesto = ManifestoLote(caminho_manifesto)
+        self.cancelar.clear()
+        self.executando = True
+        self.inicio = time.time()
+        self.progress.config(maximum=self.total, value=0)
+        self.btn_iniciar.config(state=tk.DISABLED)
+        self.btn_parar.config(state=tk.NORMAL)
+        self.btn_pasta.config(state=tk.DISABLED)
+
+        # Uma thread por serviço, cada uma com seu próprio limite de transcrições simultâneas
+        try:
+            concorrencia = max(1, min(self.concorrencia.get(), CONCORRENCIA_LOTE_MAX))
+        except tk.TclError:
+            concorrencia = CONCORRENCIA_LOTE
+        self.threads = [
+            threading.Thread(target=self._processar_servico, args=(servico, lista, concorrencia), daemon=True)
+            for servico, lista in pendentes.items() if lista
+        ]
+        for thread in self.threads:
+            thread.start()
+        threading.Thread(target=self._aguardar_fim, daemon=True).start()
+
+    def _processar_servico(self, servico, arquivos, concorrencia):
+        for arquivo, resultado in cliente.transcrever_varios(
+            arquivos, concorrencia=concorrencia, openai=servico == "openai",
+            prazo=TIMEOUT_TRANSCRICAO, cancelar=self.cancelar
+        ):
+            tamanho, modificado = self.assinaturas[arquivo]
+            duracao = duracao_audio(arquivo)
+            self.manifesto.gravar({
+                "arquivo": arquivo.name,
+                "servico": servico,
+                "status": "ok" if resultado.ok else "erro",
+                "texto": resultado.texto.strip(),
+                "erro": resultado.erro,
+                "tempo_s": round(resultado.tempo, 3),
+                "servidor_s": resultado.etapas.get("total"),
+                "duracao_audio_s": round(duracao, 3) if duracao is not None else None,
+                "tamanho": tamanho,
+                "modificado": modificado,
+                "data": datetime.now().isoformat(timespec="seconds"),
+            })
+
+            with self.trava:
+                self.concluidos += 1
+                if resultado.ok:
+                    self.segundos_audio += duracao or 0.0
+                else:
+                    self.erros += 1
+
+            if resultado.ok:
+                self.registrar(f"✅ [{servico}] {arquivo.name} ({resultado.tempo:.2f}s): {resultado.texto.strip()}\n")
+            else:
+                self.registrar(f"❌ [{servico}] {arquivo.name}: {resultado.erro}\n")
+            self.janela.after(0, self.atualizar_progresso)
+
+    def _aguardar_fim(self):
+        for thread in self.threads:
+            thread.join()
+        self.manifesto.fechar()
+        self.janela.after(0, self.finalizar)
+
+    def atualizar_progresso(self):
+        """Progresso agregado dos serviços: feitos, erros, vazão e tempo restante estimado"""
+        with self.trava:
+            concluidos, erros, segundos_audio = self.concluidos, self.erros, self.segundos_audio
+        decorrido = max(time.time() - self.inicio, 1e-6)
+        vazao = concluidos / decorrido
+        restante = (self.total - concluidos) / vazao if vazao else 0
+        texto = f"{concluidos}/{self.total} · {erros} erros · {vazao * 60:.1f} arquivos/min"
+        if segundos_audio:
+            texto += f" · {segundos_audio / decorrido:.1f}s de áudio por segundo"
+        if concluidos < self.total:
+            texto += f" · restam ~{restante:.0f}s"
+        self.progress.config(value=concluidos)
+        self.label_progresso.config(text=texto)
+
+    def finalizar(self):
+        self.executando = False
+        if self.fechar_ao_terminar:
+            self.janela.destroy()
+            return
+        self.atualizar_progresso()
+        interrompido = self.cancelar.is_set() and self.concluidos < self.total
+        self.registrar(
+            f"\n{'⏹️ Interrompido' if interrompido else '✅ Concluído'}: {self.concluidos - self.erros} ok, "
+            f"{self.erros} erros em {time.time() - self.inicio:.1f}s · manifesto: {self.manifesto.caminho}\n"
+        )
+        self.btn_iniciar.config(state=tk.NORMAL)
+        self.btn_parar.config(state=tk.DISABLED)
+        self.btn_pasta.config(state=tk.NORMAL)
+
+    def parar(self):
+        """Não iniciar novas transcrições; as que já estão em andamento terminam e vão para o manifesto"""
+        self.cancelar.set()
+        self.btn_parar.config(state=tk.DISABLED)
+        self.label_progresso.config(text="⏹️ Parando: aguardando as transcrições em andamento...")
+
+    def limpar_texto(self):
+        self.texto_resultado.config(state=tk.NORMAL)
+        self.texto_resultado.delete(1.0, tk.END)
+        self.texto_resultado.config(state=tk.DISABLED)
+
+    def registrar(self, linha):
+        def update():
+            self.texto_resultado.config(state=tk.NORMAL)
+            self.texto_resultado.insert(tk.END, linha)
+            self.texto_resultado.see(tk.END)
+            self.texto_resultado.config(state=tk.DISABLED)
+        self.janela.after(0, update)
+
+    def on_closing(self):
+        """Interromper o lote ao fechar; a janela some e é destruída quando as em andamento terminarem"""
+        self.cancelar.set()
+        if self.executando:
+            self.fechar_ao_terminar = True
+            self.janela.withdraw()
+        else:
+            self.janela.destroy()
+
+
 # ============================================
 # FUNÇÃO PRINCIPAL
 # ============================================
@@ -0,0 +1,314 @@
+"""
+Microbenchmarks das Etapas do Serviço TTS/STT
+Mede isoladamente cada peça do caminho de uma requisição, com áudio sintético e sem rede,
+e compara com a baseline versionada em utilitarios/baselines/microbenchmarks.json
+
+Exemplos:
+    python utilitarios/microbenchmarks.py                       # rodar e comparar com a baseline
+    python utilitarios/microbenchmarks.py --filtro whisper --modelos minusculo,tiny
+    python utilitarios/microbenchmarks.py --atualizar-baseline  # gravar nova baseline
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from datetime import datetime
+from pathlib import Path
+
+from simuladores.audio_sintetico import gerar_pcm, gerar_wav
+
+RAIZ_PROJETO = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ_PROJETO))  # Módulos do serviço (cache_tts, processamento_audio)
+BASELINE_PADRAO = Path(__file__).resolve().parent / "baselines" / "microbenchmarks.json"
+CACHE_DIR = Path.home() / ".cache" / "servico_tts_e_stt"
+
+# Áudios de referência: resposta típica do Piper (22,05 kHz) e upload típico (16 kHz)
+DURACAO_AUDIO = 5.0
+TAXA_PIPER = 22050
+TAXA_WHISPER = 16000
+
+# ============================================
+# REGISTRO DE MICROBENCHMARKS
+# ============================================
+
+MICROBENCHMARKS = {}
+
+
+class Indisponivel(Exception):
+    """Dependência ausente: o microbenchmark é pulado, não falha"""
+
+
+def microbenchmark(nome, repeticoes=50):
+    """Registrar uma função de preparação que devolve o callable a ser medido"""
+    def decorador(preparar):
+        MICROBENCHMARKS[nome] = (preparar, repeticoes)
+        return preparar
+    return decorador
+
+
+def medir(funcao, repeticoes, aquecimento=2):
+    """Executar `funcao` e devolver estatísticas em ms"""
+    for _ in range(aquecimento):
+        funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {
+        "mediana_ms": round(statistics.median(tempos), 4),
+        "min_ms": round(min(tempos), 4),
+        "desvio_ms": round(statistics.stdev(tempos), 4) if len(tempos) > 1 else 0.0,
+        "repeticoes": repeticoes,
+    }
+
+# ============================================
+# ETAPAS
+# ============================================
+
+@microbenchmark("wav_decodificar_reamostrar_ffmpeg", repeticoes=20)
+def preparar_decodificacao_ffmpeg(contexto):
+    """whisper.load_audio: ffmpeg decodifica e reamostra para 16 kHz (caminho do /api/transcribe-audio)"""
+    try:
+        import whisper
+    except ImportError as e:
+        raise Indisponivel(f"whisper não instalado ({e})")
+
+    caminho = contexto["temp"] / "entrada_22k.wav"
+    caminho.write_bytes(gerar_wav(DURACAO_AUDIO, TAXA_PIPER))
+    return lambda: whisper.load_audio(str(caminho))
+
+
+@microbenchmark("wav_decodificar_reamostrar_numpy")
+def preparar_decodificacao_numpy(contexto):
+    """Decodificação em processo (wave + numpy) e reamostragem linear 22,05 kHz -> 16 kHz"""
+    try:
+        import numpy as np
+    except ImportError as e:
+        raise Indisponivel(f"numpy não instalado ({e})")
+
+    dados = gerar_wav(DURACAO_AUDIO, TAXA_PIPER)
+
+    def decodificar():
+        with wave.open(io.BytesIO(dados), "rb") as wf:
+            pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        audio = pcm.astype(np.float32) / 32768.0
+        destino = np.arange(int(len(audio) * TAXA_WHISPER / TAXA_PIPER)) * (TAXA_PIPER / TAXA_WHISPER)
+        return np.interp(destino, np.arange(len(audio)), audio).astype(np.float32)
+
+    return decodificar
+
+
+@microbenchmark("resposta_base64_json", repeticoes=200)
+def preparar_codificacao(contexto):
+    """Base64 + JSON da resposta do /api/generate-audio (mesmos parâmetros do JSONResponse)"""
+    dados = gerar_wav(DURACAO_AUDIO, TAXA_PIPER)
+
+    def codificar():
+        return json.dumps(
+            {"audio": base64.b64encode(dados).decode("utf-8"), "mimeType": "audio/wav",
+             "metadata": {"speed": 1.0, "length_scale": 1.0}},
+            ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"),
+        ).encode("utf-8")
+
+    return codificar
+
+
+@microbenchmark("cache_tts_consulta", repeticoes=200)
+def preparar_cache_tts(contexto):
+    """Acerto no cache de áudio do TTS (índice + leitura do WAV do disco), alternativa a executar o Piper"""
+    from cache_tts import CacheAudio
+
+    cache = CacheAudio(contexto["temp"] / "cache_tts", "modelo", 64 * 1024 * 1024)
+    cache.guardar("ab" * 32, gerar_wav(DURACAO_AUDIO, TAXA_PIPER))
+    return lambda: cache.obter("ab" * 32)
+
+
+@microbenchmark("dialogo_concatenar_turnos")
+def preparar_concatenacao_dialogo(contexto):
+    """Montagem da faixa única do /api/generate-dialogue-audio (6 turnos com pausa)"""
+    from processamento_audio import concatenar_wavs
+
+    turnos = [gerar_wav(DURACAO_AUDIO / 2, TAXA_PIPER) for _ in range(6)]
+    return lambda: concatenar_wavs(turnos, 0.4)
+
+
+@microbenchmark("velocidade_esticar_wsola", repeticoes=20)
+def preparar_esticamento(contexto):
+    """speed_mode=stretch: resposta de 5 s do Piper acelerada para 1.5x sem mudar o tom"""
+    from processamento_audio import esticar_wav
+
+    dados = gerar_wav(DURACAO_AUDIO, TAXA_PIPER)
+    return lambda: esticar_wav(dados, 1.5)
+
+
+@microbenchmark("fonemas_memo_acerto", repeticoes=200)
+def preparar_memo_fonemas(contexto):
+    """Piper em processo: frase já fonemizada (o que substitui a chamada ao espeak)"""
+    from fonemas import MemoFonemas
+
+    memo = MemoFonemas(None)
+    frase = "Ich bin sechsundfünfzig Jahre alt und wohne in Berlin."
+    fonemizar = lambda texto: [list(texto.lower())]
+    para_ids = lambda fonemas: [ord(fonema) % 128 for fonema in fonemas]
+    memo.ids(frase, fonemizar, para_ids)
+    return lambda: memo.ids(frase, fonemizar, para_ids)
+
+
+@microbenchmark("piper_invocacao", repeticoes=10)
+def preparar_piper(contexto):
+    """Custo de uma execução do Piper para uma frase curta (processo + carga do modelo)"""
+    executavel = contexto["piper"]
+    modelo = os.getenv("PIPER_MODELS_DIR", str(RAIZ_PROJETO / "piper_models"))
+    modelo = Path(modelo) / "de_DE-thorsten-medium.onnx"
+    saida = contexto["temp"] / "piper.wav"
+
+    if executavel is None:
+        # Sem Piper real: usa o simulado, que mede só o custo de criar o processo
+        executavel = [sys.executable, str(Path(__file__).resolve().parent / "simuladores" / "piper_falso.py")]
+    else:
+        executavel = [executavel]
+
+    cmd = executavel + ["--model", str(modelo), "--config", f"{modelo}.json",
+                        "--output_file", str(saida), "--length_scale", "1.0"]
+    env = dict(os.environ, PIPER_FALSO_RTF="0")
+    return lambda: subprocess.run(cmd, input="Hallo.".encode("utf-8"), capture_output=True, check=True, env=env)
+
+
+def preparar_whisper(modelo):
+    """Inferência Whisper em CPU sobre áudio sintético, um modelo por microbenchmark"""
+    def preparar(contexto):
+        try:
+            import numpy as np
+            import whisper
+        except ImportError as e:
+            raise Indisponivel(f"whisper não instalado ({e})")
+
+        caminho = modelo
+        if modelo == "minusculo":
+            from simuladores.whisper_minusculo import gerar_modelo
+            caminho = str(gerar_modelo(CACHE_DIR / "whisper_minusculo.pt"))
+
+        try:
+            carregado = whisper.load_model(caminho, device="cpu")
+        except Exception as e:
+            raise Indisponivel(f"modelo {modelo} indisponível offline ({e})")
+
+        pcm = np.frombuffer(gerar_pcm(DURACAO_AUDIO, TAXA_WHISPER).tobytes(), dtype=np.int16)
+        audio = pcm.astype(np.float32) / 32768.0
+        return lambda: carregado.transcribe(audio, language="de", fp16=False, task="transcribe",
+                                            verbose=None, temperature=0.0)
+    return preparar
+
+# ============================================
+# BASELINE
+# ============================================
+
+def descrever_maquina():
+    return {
+        "plataforma": platform.platform(),
+        "processador": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+
+def comparar_baseline(resultados, baseline, limite):
+    """Devolver [(nome, atual, base, variação)] das etapas acima do limite de regressão"""
+    regressoes = []
+    print("\n" + "=" * 72)
+    print(f"🔍 Comparação com a baseline de {baseline.get('data')} (limite: +{limite * 100:.0f}%)")
+    if baseline.get("maquina") != descrever_maquina():
+        print("⚠️ Baseline gerada em outra máquina: compare com cautela")
+    print("=" * 72)
+
+    for nome, resultado in resultados.items():
+        base = baseline.get("resultados", {}).get(nome)
+        if "mediana_ms" not in resultado:
+            continue
+        if not base:
+            print(f"{nome:<40} sem baseline")
+            continue
+        variacao = (resultado["mediana_ms"] - base["mediana_ms"]) / base["mediana_ms"]
+        marcador = "❌ REGRESSÃO" if variacao > limite else ("✅" if variacao < -limite else "")
+        print(f"{nome:<40}{base['mediana_ms']:>10.3f} -> {resultado['mediana_ms']:>10.3f} ms {variacao * 100:+7.1f}% {marcador}")
+        if variacao > limite:
+            regressoes.append((nome, resultado["mediana_ms"], base["mediana_ms"], variacao))
+    return regressoes
+
+# ============================================
+# FUNÇÃO PRINCIPAL
+# ============================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks das etapas do serviço TTS/STT")
+    parser.add_argument("--filtro", help="Rodar apenas microbenchmarks cujo nome contém este texto")
+    parser.add_argument("--modelos", default="minusculo",
+                        help="Modelos Whisper para a inferência em CPU (ex.: minusculo,tiny,base)")
+    parser.add_argument("--piper", default=os.getenv("PIPER_EXECUTABLE"),
+                        help="Executável Piper real (padrão: simulado)")
+    parser.add_argument("--repeticoes", type=int, help="Sobrescrever o número de repetições")
+    parser.add_argument("--baseline", default=str(BASELINE_PADRAO))
+    parser.add_argument("--limite", type=float, default=0.15, help="Regressão tolerada (0.15 = +15%%)")
+    parser.add_argument("--atualizar-baseline", action="store_true", help="Gravar os resultados como nova baseline")
+    parser.add_argument("--json", help="Salvar os resultados neste arquivo")
+    args = parser.parse_args()
+
+    for modelo in args.modelos.split(","):
+        MICROBENCHMARKS[f"whisper_inferencia_cpu[{modelo}]"] = (preparar_whisper(modelo), 3)
+
+    resultados = {}
+    with tempfile.TemporaryDirectory(prefix="microbenchmarks_") as temp:
+        contexto = {"temp": Path(temp), "piper": args.piper}
+        for nome, (preparar, repeticoes) in MICROBENCHMARKS.items():
+            if args.filtro and args.filtro not in nome:
+                continue
+            try:
+                funcao = preparar(contexto)
+                resultados[nome] = medir(funcao, args.repeticoes or repeticoes)
+                print(f"✓ {nome:<40}{resultados[nome]['mediana_ms']:>10.3f} ms (mediana)")
+            except Indisponivel as e:
+                resultados[nome] = {"pulado": str(e)}
+                print(f"- {nome:<40} pulado: {e}")
+
+    relatorio = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "maquina": descrever_maquina(),
+        "resultados": resultados,
+    }
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(relatorio, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    baseline_path = Path(args.baseline)
+    if args.atualizar_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        medidos = {nome: r for nome, r in resultados.items() if "mediana_ms" in r}
+        baseline_path.write_text(json.dumps(dict(relatorio, resultados=medidos), indent=2, ensure_ascii=False) + "\n",
+                                 encoding="utf-8")
+        print(f"💾 Baseline atualizada: {baseline_path}")
+        return 0
+
+    if not baseline_path.exists():
+        print(f"⚠️ Baseline não encontrada em {baseline_path} (use --atualizar-baseline)")
+        return 0
+
+    regressoes = comparar_baseline(resultados, json.loads(baseline_path.read_text(encoding="utf-8")), args.limite)
+    if regressoes:
+        print(f"\n❌ {len(regressoes)} regressão(ões) acima de {args.limite * 100:.0f}%")
+        return 1
+    print("\n✅ Nenhuma regressão acima do limite")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
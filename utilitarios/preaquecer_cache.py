@@ -0,0 +1,346 @@
+"""
+Pré-Aquecimento do Cache de TTS
+Sintetiza uma lista de frases (CSV ou JSONL) em várias velocidades com o mesmo motor do
+/api/generate-audio (PIPER_MODO, PIPER_VOZES), com um processo por núcleo, e grava os
+áudios no cache do serviço (TTS_CACHE_DIR): as lições mais usadas nunca passam pelo Piper
+
+Pode ser interrompido e rodado de novo: o que já está no cache (e no pacote) é pulado
+
+Com --pacote, exporta também um pacote estático para o frontend: um Opus por frase e
+velocidade em <pacote>/audio/ e <pacote>/manifest.json com texto, voz, velocidade e arquivo
+
+Entrada:
+    CSV:   coluna "text" (ou a primeira coluna) e, opcional, "voice"
+    JSONL: {"text": "...", "voice": "Kore"} por linha ("voice" opcional)
+
+Exemplos:
+    python utilitarios/preaquecer_cache.py frases.csv --velocidades 0.8,1.0
+    python utilitarios/preaquecer_cache.py licoes.jsonl --processos 4 --pacote pacote_audio
+"""
+
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import time
+import wave
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+RAIZ_PROJETO = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ_PROJETO))  # Módulos do serviço (motores, cache_tts)
+load_dotenv(RAIZ_PROJETO / ".env")  # Antes dos motores: PIPER_* são lidos ao importar
+
+from cache_tts import CacheAudio, chave_cache
+from motores import PIPER_MODEL_PATH, PIPER_VOZ_PADRAO, PIPER_VOZES, criar_motor_piper, nucleos_disponiveis
+from processamento_audio import esticar_wav
+from vozes import VozDesconhecida, modelo_da_voz
+
+MODOS_VELOCIDADE = ("resynthesis", "stretch")
+
+# ============================================
+# ENTRADA
+# ============================================
+
+def ler_frases(caminho: Path) -> List[Dict]:
+    """Frases do CSV/JSONL como [{"text", "voice"}], sem vazias nem repetidas"""
+    if caminho.suffix.lower() == ".jsonl":
+        registros = [json.loads(linha) for linha in caminho.read_text(encoding="utf-8").splitlines() if linha.strip()]
+    elif caminho.suffix.lower() == ".csv":
+        with open(caminho, newline="", encoding="utf-8-sig") as arquivo:
+            linhas = list(csv.reader(arquivo))
+        cabecalho = [coluna.strip().lower() for coluna in linhas[0]] if linhas else []
+        if "text" in cabecalho:
+            registros = [dict(zip(cabecalho, linha)) for linha in linhas[1:]]
+        else:
+            registros = [{"text": linha[0]} for linha in linhas if linha]
+    else:
+        raise SystemExit(f"❌ Formato não suportado: {caminho.suffix} (use .csv ou .jsonl)")
+
+    frases, vistas = [], set()
+    for registro in registros:
+        texto = " ".join(str(registro.get("text") or "").split())
+        voz = (registro.get("voice") or "").strip() or PIPER_VOZ_PADRAO
+        if texto and (texto, voz) not in vistas:
+            vistas.add((texto, voz))
+            frases.append({"text": texto, "voice": voz})
+    return frases
+
+
+def interpretar_velocidades(texto: str) -> List[float]:
+    velocidades = sorted({float(v) for v in texto.split(",") if v.strip()}, key=lambda v: (v != 1.0, v))
+    for velocidade in velocidades:
+        if not 0.5 <= velocidade <= 2.0:
+            raise SystemExit(f"❌ Velocidade fora de 0.5 - 2.0: {velocidade}")
+    return velocidades
+
+# ============================================
+# WORKERS
+# ============================================
+
+# Motor do processo worker (carregado uma vez por processo, em iniciar_worker)
+_motor = None
+
+
+def iniciar_worker(threads: int):
+    global _motor
+    # Ctrl+C é tratado só pelo processo principal (que encerra os workers)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _motor = criar_motor_piper()
+    # Os núcleos são divididos entre os processos (sem isso, cada sessão ONNX usaria todos)
+    _motor.configurar_threads(threads)
+    _motor.carregar()
+
+
+def duracao_wav(dados: bytes) -> float:
+    with wave.open(io.BytesIO(dados), "rb") as arquivo:
+        return arquivo.getnframes() / arquivo.getframerate()
+
+
+def codificar_opus(wav: bytes, destino: Path, bitrate: str):
+    """WAV -> Opus (Ogg) via ffmpeg, com escrita atômica"""
+    temporario = destino.with_name(f".{destino.stem}.{secrets.token_hex(4)}.tmp")
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-f", "wav", "-i", "pipe:0",
+        "-c:a", "libopus", "-b:a", bitrate, "-application", "voip", "-f", "ogg", str(temporario),
+    ]
+    try:
+        subprocess.run(cmd, input=wav, capture_output=True, check=True)
+    except subprocess.CalledProcessError as e:
+        temporario.unlink(missing_ok=True)
+        raise RuntimeError(f"Falha ao codificar Opus: {e.stderr.decode('utf-8', errors='ignore')}") from e
+    os.replace(temporario, destino)
+
+
+def ler_do_cache(caminho: Optional[str]) -> Optional[bytes]:
+    try:
+        return Path(caminho).read_bytes() if caminho else None
+    except FileNotFoundError:
+        return None  # Apagado do cache depois de planejado
+
+
+def processar_frase(tarefa: Dict) -> Dict:
+    """
+    Worker: gerar (ou ler do cache) cada velocidade pendente de uma frase e, com pacote, o Opus
+    Os WAVs novos voltam ao processo principal, o único que grava no cache
+    """
+    texto, voz = tarefa["texto"], tarefa["voz"]
+    novos, resultados = {}, []
+    base = None
+    try:
+        for item in tarefa["itens"]:
+            wav = ler_do_cache(item["cache"])
+            if wav is None and item["esticado"]:
+                # Como no serviço: a versão 1.0x (do cache ou gerada uma vez) esticada sem mudar o tom
+                base = base or ler_do_cache(tarefa["cache_base"])
+                if base is None:
+                    base = _motor.sintetizar(texto, 1.0, voz)
+                    novos[tarefa["chave_base"]] = base
+                wav = esticar_wav(base, item["velocidade"])
+                novos[item["chave"]] = wav
+            elif wav is None:
+                wav = _motor.sintetizar(texto, 1.0 / item["velocidade"], voz)
+                novos[item["chave"]] = wav
+            if item["velocidade"] == 1.0:
+                base = wav
+
+            resultado = {"key": item["chave"], "speed": item["velocidade"], "duration": round(duracao_wav(wav), 3)}
+            if tarefa["pacote"]:
+                arquivo = Path(tarefa["pacote"]) / "audio" / f"{item['chave']}.opus"
+                codificar_opus(wav, arquivo, tarefa["bitrate"])
+                resultado.update(file=f"audio/{arquivo.name}", bytes=arquivo.stat().st_size)
+            resultados.append(resultado)
+    except Exception as e:
+        return {"indice": tarefa["indice"], "novos": novos, "resultados": resultados, "erro": f"{type(e).__name__}: {e}"}
+    return {"indice": tarefa["indice"], "novos": novos, "resultados": resultados, "erro": None}
+
+# ============================================
+# PLANEJAMENTO E PROGRESSO
+# ============================================
+
+def carregar_progresso(arquivo: Path) -> Dict[str, Dict]:
+    """Itens já exportados para o pacote (chave -> linha do manifest), de uma execução anterior"""
+    progresso = {}
+    if arquivo.exists():
+        for linha in arquivo.read_text(encoding="utf-8").splitlines():
+            try:
+                item = json.loads(linha)
+            except json.JSONDecodeError:
+                continue  # Última linha cortada por uma interrupção
+            if (arquivo.parent / item["file"]).exists():
+                progresso[item["key"]] = item
+    return progresso
+
+
+def planejar(frases: List[Dict], velocidades: List[float], modo: str, cache: CacheAudio,
+             pacote: Optional[Path], progresso: Dict[str, Dict], bitrate: str) -> List[Dict]:
+    """Uma tarefa por frase com as velocidades que faltam no cache (ou no pacote)"""
+    tarefas = []
+    for indice, frase in enumerate(frases):
+        texto, voz = frase["text"], frase["voice"]
+        itens = []
+        for velocidade in velocidades:
+            esticado = modo == "stretch" and velocidade != 1.0
+            chave = chave_cache(texto, voz, PIPER_VOZES[voz].id, velocidade, esticado)
+            em_cache = cache.contem(chave)
+            if em_cache and (pacote is None or chave in progresso):
+                continue
+            itens.append({
+                "velocidade": velocidade,
+                "chave": chave,
+                "esticado": esticado,
+                "cache": str(cache.caminho(chave)) if em_cache else None,
+            })
+        if itens:
+            chave_base = chave_cache(texto, voz, PIPER_VOZES[voz].id, 1.0)
+            tarefas.append({
+                "indice": indice,
+                "texto": texto,
+                "voz": voz,
+                "itens": itens,
+                "chave_base": chave_base,
+                "cache_base": str(cache.caminho(chave_base)) if cache.contem(chave_base) else None,
+                "pacote": str(pacote) if pacote else None,
+                "bitrate": bitrate,
+            })
+    return tarefas
+
+
+def formatar_tempo(segundos: float) -> str:
+    minutos, segundos = divmod(int(segundos), 60)
+    return f"{minutos}m{segundos:02d}s" if minutos else f"{segundos}s"
+
+
+def mostrar_progresso(feitas: int, total: int, inicio: float, erros: int):
+    decorrido = time.monotonic() - inicio
+    vazao = feitas / decorrido if decorrido else 0.0
+    restante = formatar_tempo((total - feitas) / vazao) if vazao else "?"
+    print(f"\r⏳ {feitas}/{total} frases ({feitas / total:.0%}) | {vazao:.1f} frases/s | faltam {restante}"
+          + (f" | {erros} erros" if erros else ""), end="", flush=True)
+
+
+def salvar_manifest(pacote: Path, frases: List[Dict], velocidades: List[float], modo: str,
+                    progresso: Dict[str, Dict], bitrate: str) -> int:
+    """manifest.json com os itens do corpus já exportados, na ordem da entrada"""
+    itens = []
+    for frase in frases:
+        for velocidade in velocidades:
+            esticado = modo == "stretch" and velocidade != 1.0
+            chave = chave_cache(frase["text"], frase["voice"], PIPER_VOZES[frase["voice"]].id, velocidade, esticado)
+            exportado = progresso.get(chave)
+            if exportado:
+                itens.append({
+                    "text": frase["text"],
+                    "voice": frase["voice"],
+                    "speed": velocidade,
+                    "speed_mode": "stretch" if esticado else "resynthesis",
+                    **exportado,
+                })
+    manifest = {
+        "model": PIPER_MODEL_PATH.stem,
+        "voices": {nome: modelo.id for nome, modelo in PIPER_VOZES.items()},
+        "format": "opus",
+        "mimeType": "audio/ogg; codecs=opus",
+        "bitrate": bitrate,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "items": itens,
+    }
+    (pacote / "manifest.json").write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+    return len(itens)
+
+# ============================================
+# EXECUÇÃO
+# ============================================
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Pré-aquecer o cache de TTS com uma lista de frases")
+    parser.add_argument("entrada", type=Path, help="Frases em .csv (coluna text) ou .jsonl")
+    parser.add_argument("--velocidades", default="1.0", help="Velocidades, ex.: 0.75,1.0,1.25")
+    parser.add_argument("--modo-velocidade", choices=MODOS_VELOCIDADE,
+                        default=os.getenv("TTS_MODO_VELOCIDADE", "resynthesis"),
+                        help="Como gerar velocidades diferentes de 1.0 (padrão: TTS_MODO_VELOCIDADE)")
+    parser.add_argument("--processos", type=int, default=nucleos_disponiveis(), help="Processos de síntese")
+    parser.add_argument("--cache-dir", type=Path, default=Path(os.getenv("TTS_CACHE_DIR", "cache_tts")))
+    parser.add_argument("--cache-max-mb", type=float, default=float(os.getenv("TTS_CACHE_MAX_MB", "1024")),
+                        help="Limite do cache (o mesmo do serviço: passando dele, os mais antigos saem)")
+    pacote = parser.add_argument_group("pacote de áudio para o frontend")
+    pacote.add_argument("--pacote", type=Path, help="Diretório do pacote (Opus + manifest.json)")
+    pacote.add_argument("--bitrate", default="32k", help="Bitrate do Opus")
+    return parser
+
+
+def main():
+    args = criar_parser().parse_args()
+    frases = ler_frases(args.entrada)
+    velocidades = interpretar_velocidades(args.velocidades)
+    try:
+        for voz in {frase["voice"] for frase in frases}:
+            modelo_da_voz(PIPER_VOZES, voz)
+    except VozDesconhecida as e:
+        raise SystemExit(f"❌ {e}")
+
+    cache = CacheAudio(args.cache_dir, PIPER_MODEL_PATH.stem, int(args.cache_max_mb * 1024 * 1024))
+    progresso, arquivo_progresso = {}, None
+    if args.pacote:
+        (args.pacote / "audio").mkdir(parents=True, exist_ok=True)
+        arquivo_progresso = args.pacote / "progresso.jsonl"
+        progresso = carregar_progresso(arquivo_progresso)
+
+    tarefas = planejar(frases, velocidades, args.modo_velocidade, cache, args.pacote, progresso, args.bitrate)
+    print(f"📚 {len(frases)} frases x {len(velocidades)} velocidades: "
+          f"{len(tarefas)} frases pendentes, {len(frases) - len(tarefas)} já prontas")
+
+    erros = 0
+    interrompido = False
+    if tarefas:
+        processos = max(1, min(args.processos, len(tarefas)))
+        print(f"🎤 Sintetizando com {processos} processos ({args.modo_velocidade})...")
+        inicio = time.monotonic()
+        saida_progresso = open(arquivo_progresso, "a", encoding="utf-8") if arquivo_progresso else None
+        threads = max(1, nucleos_disponiveis() // processos)
+        pool = multiprocessing.Pool(processos, initializer=iniciar_worker, initargs=(threads,))
+        try:
+            for feitas, resultado in enumerate(pool.imap_unordered(processar_frase, tarefas), start=1):
+                for chave, wav in resultado["novos"].items():
+                    cache.guardar(chave, wav)
+                if saida_progresso:
+                    for item in resultado["resultados"]:
+                        progresso[item["key"]] = item
+                        saida_progresso.write(json.dumps(item, ensure_ascii=False) + "\n")
+                    saida_progresso.flush()
+                if resultado["erro"]:
+                    erros += 1
+                    print(f"\n⚠️ {frases[resultado['indice']]['text'][:60]!r}: {resultado['erro']}")
+                mostrar_progresso(feitas, len(tarefas), inicio, erros)
+            pool.close()
+        except KeyboardInterrupt:
+            interrompido = True
+            pool.terminate()
+        finally:
+            pool.join()
+            if saida_progresso:
+                saida_progresso.close()
+        print()
+
+    if args.pacote:
+        exportados = salvar_manifest(args.pacote, frases, velocidades, args.modo_velocidade, progresso, args.bitrate)
+        print(f"📦 Pacote: {exportados} áudios em {args.pacote} (manifest.json)")
+    estado = cache.estado()
+    print(f"💾 Cache: {estado['entradas']} áudios ({estado['bytes'] / 1e6:.1f} MB) em {cache.diretorio}")
+    if interrompido:
+        print("⏹️ Interrompido: rode o mesmo comando de novo para continuar de onde parou")
+        return 130
+    return 1 if erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
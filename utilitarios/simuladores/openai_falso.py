@@ -0,0 +1,73 @@
+"""
+Servidor OpenAI Simulado
+Responde POST /v1/audio/transcriptions com uma transcrição fixa após uma latência configurável
+Permite medir o endpoint /api/transcribe-audio-openai sem rede nem custo
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TEXTO_PADRAO = "Guten Morgen, wie geht es dir?"
+
+
+def criar_handler(latencia, texto):
+    """Criar o handler HTTP com a latência e o texto desejados"""
+
+    class TranscricaoHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            # Consumir o upload inteiro, como a API real faria
+            tamanho = int(self.headers.get("Content-Length", 0))
+            restante = tamanho
+            while restante > 0:
+                bloco = self.rfile.read(min(restante, 65536))
+                if not bloco:
+                    break
+                restante -= len(bloco)
+
+            if not self.path.rstrip("/").endswith("/audio/transcriptions"):
+                self._responder(404, {"error": {"message": f"Rota desconhecida: {self.path}"}})
+                return
+
+            time.sleep(latencia)
+            self._responder(200, {"text": texto})
+
+        def _responder(self, status, corpo):
+            dados = json.dumps(corpo).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def log_message(self, format, *args):
+            pass  # Silencioso durante o benchmark
+
+    return TranscricaoHandler
+
+
+def iniciar_servidor(porta=0, latencia=0.3, texto=TEXTO_PADRAO):
+    """Iniciar o servidor em uma thread daemon; retorna (servidor, url_base)"""
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), criar_handler(latencia, texto))
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor OpenAI simulado")
+    parser.add_argument("--porta", type=int, default=8099)
+    parser.add_argument("--latencia", type=float, default=0.3, help="Latência simulada (s)")
+    parser.add_argument("--texto", default=TEXTO_PADRAO)
+    args = parser.parse_args()
+
+    servidor, url = iniciar_servidor(args.porta, args.latencia, args.texto)
+    print(f"☁️ OpenAI simulado em {url} (latência {args.latencia}s)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
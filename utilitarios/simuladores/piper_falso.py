@@ -0,0 +1,51 @@
+"""
+Piper Simulado
+Aceita os mesmos argumentos que o serviço passa ao Piper e grava um WAV sintético
+A duração acompanha o tamanho do texto e o length_scale, como na voz real
+
+Variáveis de ambiente:
+- PIPER_FALSO_RTF: fração da duração do áudio gasta "sintetizando" (padrão: 0.05)
+"""
+
+import argparse
+import os
+import sys
+import time
+import wave
+
+from audio_sintetico import gerar_pcm
+
+TAXA_PIPER = 22050  # Taxa de amostragem das vozes medium do Piper
+SEGUNDOS_POR_CARACTERE = 0.065
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Piper simulado para benchmarks")
+    parser.add_argument("--model", "-m", required=True)
+    parser.add_argument("--config", "-c")
+    parser.add_argument("--output_file", "-f", required=True)
+    parser.add_argument("--length_scale", type=float, default=1.0)
+    args, _ = parser.parse_known_args()
+
+    texto = sys.stdin.buffer.read().decode("utf-8", errors="ignore").strip()
+    if not texto:
+        print("Texto vazio", file=sys.stderr)
+        return 1
+
+    duracao = max(len(texto) * SEGUNDOS_POR_CARACTERE * args.length_scale, 0.3)
+
+    # Simular o custo da inferência
+    time.sleep(duracao * float(os.getenv("PIPER_FALSO_RTF", "0.05")))
+
+    with wave.open(args.output_file, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(TAXA_PIPER)
+        wf.writeframes(gerar_pcm(duracao, TAXA_PIPER, semente=len(texto)).tobytes())
+
+    print(args.output_file)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""
+Modelo Whisper Minúsculo
+Gera um checkpoint Whisper com pesos aleatórios (determinísticos) e dimensões mínimas
+As transcrições não têm sentido, mas o caminho completo de inferência é exercitado em CPU
+O arquivo gerado é aceito por whisper.load_model(caminho) (variável WHISPER_MODEL)
+"""
+
+import argparse
+from dataclasses import asdict
+from pathlib import Path
+
+# Vocabulário multilíngue completo: o tokenizer do Whisper depende dele
+DIMENSOES = {
+    "n_mels": 80,
+    "n_audio_ctx": 1500,
+    "n_audio_state": 64,
+    "n_audio_head": 2,
+    "n_audio_layer": 1,
+    "n_vocab": 51865,
+    "n_text_ctx": 64,
+    "n_text_state": 64,
+    "n_text_head": 2,
+    "n_text_layer": 1,
+}
+
+
+def gerar_modelo(caminho, semente=0):
+    """Gerar (se ainda não existir) o checkpoint minúsculo em `caminho`"""
+    import torch
+    from whisper.model import ModelDimensions, Whisper
+
+    caminho = Path(caminho)
+    if caminho.exists():
+        return caminho
+
+    torch.manual_seed(semente)
+    dims = ModelDimensions(**DIMENSOES)
+    modelo = Whisper(dims)
+
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    torch.save({"dims": asdict(dims), "model_state_dict": modelo.state_dict()}, caminho)
+    return caminho
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gerar modelo Whisper minúsculo para testes offline")
+    parser.add_argument("saida", nargs="?", default="whisper_minusculo.pt")
+    args = parser.parse_args()
+    print(f"✓ Modelo gerado em: {gerar_modelo(args.saida)}")
@@ -6,13 +6,13 @@ Testa o fluxo completo: TTS -> STT -> Validação com LLM
 import os
 import sys
 import json
-import base64
 import requests
-import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 from colorama import init, Fore, Style
 
+from cliente_servico import ClienteServico
+
 # Inicializar colorama para cores no terminal Windows
 init(autoreset=True)
 
@@ -30,6 +30,10 @@ FRASE_TTS_ALEMAO = os.getenv("FRASE_TTS_ALEMAO", "Guten Morgen")
 TTS_STT_BASE_URL = f"http://{SERVICE_HOST}:{SERVICE_PORT}"
 LLM_BASE_URL = f"http://localhost:{LLM_SERVICE_PORT}"
 
+# Clientes com conexões keep-alive, reaproveitadas entre as etapas do teste
+servico = ClienteServico(TTS_STT_BASE_URL)
+llm = ClienteServico(LLM_BASE_URL, tentativas=1)
+
 # Remover aspas da frase se existirem
 FRASE_TTS_ALEMAO = FRASE_TTS_ALEMAO.strip('"').strip("'")
 
@@ -64,7 +68,7 @@ def print_result(label, value):
 def verificar_servico_tts_stt():
     """Verifica se o serviço TTS/STT está rodando"""
     try:
-        response = requests.get(f"{TTS_STT_BASE_URL}/health", timeout=5)
+        response = servico.get("/health")
         if response.status_code == 200:
             print_success(f"Serviço TTS/STT disponível em {TTS_STT_BASE_URL}")
             data = response.json()
@@ -83,7 +87,7 @@ def verificar_servico_tts_stt():
 def verificar_servico_llm():
     """Verifica se o serviço LLM (Ollama) está rodando"""
     try:
-        response = requests.get(f"{LLM_BASE_URL}/api/tags", timeout=5)
+        response = llm.get("/api/tags")
         if response.status_code == 200:
             print_success(f"Serviço LLM (Ollama) disponível em {LLM_BASE_URL}")
             data = response.json()
@@ -110,26 +114,16 @@ def gerar_audio(texto, velocidade=1.0):
     print_result("Velocidade", f"{velocidade}x")
 
     try:
-        response = requests.post(
-            f"{TTS_STT_BASE_URL}/api/generate-audio",
-            json={"text": texto, "speed": velocidade},
-            timeout=30
-        )
-
-        if response.status_code == 200:
-            data = response.json()
-            audio_base64 = data.get("audio", "")
-
-            # Decodificar base64 para bytes
-            audio_bytes = base64.b64decode(audio_base64)
+        # WAV em binário (URL estável do áudio), sem base64 quando o serviço tem cache
+        audio_bytes, resultado = servico.gerar_audio(texto, velocidade)
 
+        if audio_bytes:
             print_success(f"Áudio gerado com sucesso ({len(audio_bytes)} bytes)")
-            print_info(f"Metadados: {data.get('metadata', {})}")
+            print_info(f"Metadados: {resultado.dados.get('metadata', {})}")
 
             return audio_bytes
         else:
-            print_error(f"Erro ao gerar áudio: {response.status_code}")
-            print_error(response.text)
+            print_error(f"Erro ao gerar áudio: {resultado.erro}")
             return None
 
     except Exception as e:
@@ -142,28 +136,12 @@ def transcrever_audio(audio_bytes):
     print_header("ETAPA 2: Transcrição de Áudio (STT)")
 
     try:
-        # Salvar áudio em arquivo temporário
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-            temp_file.write(audio_bytes)
-            temp_path = temp_file.name
-
-        print_info(f"Áudio salvo temporariamente em: {temp_path}")
+        # Enviar da memória, sem arquivo temporário
+        resultado = servico.transcrever(audio_bytes, "audio.wav")
 
-        # Enviar para transcrição
-        with open(temp_path, "rb") as audio_file:
-            files = {"file": ("audio.wav", audio_file, "audio/wav")}
-            response = requests.post(
-                f"{TTS_STT_BASE_URL}/api/transcribe-audio",
-                files=files,
-                timeout=120
-            )
-
-        # Remover arquivo temporário
-        os.unlink(temp_path)
-
-        if response.status_code == 200:
-            data = response.json()
-            transcricao = data.get("text", "").strip()
+        if resultado.ok:
+            data = resultado.dados
+            transcricao = resultado.texto.strip()
 
             print_success("Áudio transcrito com sucesso")
             print_result("Transcrição", transcricao)
@@ -171,8 +149,7 @@ def transcrever_audio(audio_bytes):
 
             return transcricao
         else:
-            print_error(f"Erro ao transcrever áudio: {response.status_code}")
-            print_error(response.text)
+            print_error(f"Erro ao transcrever áudio: {resultado.erro}")
             return None
 
     except Exception as e:
@@ -204,8 +181,8 @@ Do not include any other text or explanation outside the JSON."""
     print_result("Modelo", LLM_MODEL)
 
     try:
-        response = requests.post(
-            f"{LLM_BASE_URL}/api/generate",
+        response = llm.post(
+            "/api/generate",
             json={
                 "model": LLM_MODEL,
                 "prompt": prompt,
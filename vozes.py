@@ -0,0 +1,133 @@
+"""
+Registro de Vozes do Piper
+Cada nome de voz aceito em `voice` (ex.: "Kore") aponta para um modelo local
+(<modelo>.onnx + <modelo>.onnx.json). Os modelos são carregados só no primeiro uso
+e no máximo `residentes` ficam carregados ao mesmo tempo (LRU); vozes usadas juntas,
+como as duas falas de um diálogo, podem ser pré-carregadas de uma vez
+"""
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List
+
+
+class VozDesconhecida(ValueError):
+    """Nome de voz sem modelo no registro"""
+
+
+class ModeloVoz:
+    __slots__ = ("nome", "modelo", "config")
+
+    def __init__(self, nome: str, modelo: Path):
+        self.nome = nome
+        self.modelo = modelo
+        self.config = modelo.with_name(modelo.name + ".json")
+
+    @property
+    def id(self) -> str:
+        return self.modelo.stem
+
+
+def interpretar_vozes(texto: str, diretorio: Path) -> Dict[str, ModeloVoz]:
+    """
+    'Kore=de_DE-thorsten-medium,Puck=/modelos/de_DE-karlsson-low.onnx' -> {nome: ModeloVoz}
+    Nomes sem caminho são procurados em `diretorio`
+    """
+    vozes = {}
+    for parte in texto.split(","):
+        if not parte.strip():
+            continue
+        nome, separador, modelo = parte.partition("=")
+        if not separador or not modelo.strip():
+            raise ValueError(f"Voz inválida: {parte!r} (use nome=modelo)")
+        caminho = Path(modelo.strip())
+        if caminho.suffix != ".onnx":
+            caminho = caminho.with_name(caminho.name + ".onnx")
+        if not caminho.is_absolute() and caminho.parent == Path("."):
+            caminho = Path(diretorio) / caminho
+        vozes[nome.strip()] = ModeloVoz(nome.strip(), caminho)
+    return vozes
+
+
+def modelo_da_voz(vozes: Dict[str, ModeloVoz], nome: str) -> ModeloVoz:
+    try:
+        return vozes[nome]
+    except KeyError:
+        raise VozDesconhecida(f"Voz desconhecida: {nome!r} (disponíveis: {', '.join(vozes)})") from None
+
+
+class RegistroVozes:
+    """Vozes carregadas sob demanda, com limite de modelos residentes"""
+
+    def __init__(self, vozes: Dict[str, ModeloVoz], carregar: Callable[[ModeloVoz], object], residentes: int = 2):
+        self.vozes = vozes
+        self.residentes = max(residentes, 1)
+        self._carregar = carregar
+        # id do modelo -> voz carregada (vários nomes podem apontar para o mesmo modelo)
+        self._carregadas: "OrderedDict[str, object]" = OrderedDict()
+        self._travas: Dict[str, threading.Lock] = {}
+        self._trava = threading.Lock()
+        self.carregamentos = 0
+        self.descartes = 0
+
+    def modelo(self, nome: str) -> ModeloVoz:
+        return modelo_da_voz(self.vozes, nome)
+
+    def obter(self, nome: str):
+        """Voz carregada (carrega no primeiro uso, descartando a usada há mais tempo se preciso)"""
+        modelo = self.modelo(nome)
+        with self._trava:
+            carregada = self._carregadas.get(modelo.id)
+            if carregada is not None:
+                self._carregadas.move_to_end(modelo.id)
+                return carregada
+            trava_modelo = self._travas.setdefault(modelo.id, threading.Lock())
+
+        # Um carregamento por modelo; outros modelos carregam em paralelo
+        with trava_modelo:
+            with self._trava:
+                carregada = self._carregadas.get(modelo.id)
+            if carregada is not None:
+                return carregada
+            print(f"📦 Carregando voz {nome} ({modelo.id})...")
+            carregada = self._carregar(modelo)
+            with self._trava:
+                self._carregadas[modelo.id] = carregada
+                self.carregamentos += 1
+                descartadas = []
+                while len(self._carregadas) > self.residentes:
+                    descartadas.append(self._carregadas.popitem(last=False))
+                self.descartes += len(descartadas)
+        for id_modelo, voz in descartadas:
+            # Sínteses em andamento mantêm a referência; a sessão é liberada quando terminarem
+            print(f"♻️ Voz {id_modelo} descarregada (limite de {self.residentes} residentes)")
+            if hasattr(voz, "fechar"):
+                voz.fechar()
+        return carregada
+
+    def precarregar(self, nomes: Iterable[str]) -> List[str]:
+        """Carregar juntas as vozes que serão usadas juntas (em paralelo, até o limite de residentes)"""
+        nomes = list(dict.fromkeys(nomes))[:self.residentes]
+        for nome in nomes:
+            self.modelo(nome)  # Validar antes de carregar qualquer uma
+        threads = [threading.Thread(target=self.obter, args=(nome,)) for nome in nomes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return nomes
+
+    def estado(self) -> Dict:
+        """Vozes do registro e, por modelo carregado, o estado que a voz carregada expõe (estado())"""
+        with self._trava:
+            carregadas = list(self._carregadas.items())
+        return {
+            "vozes": {nome: modelo.id for nome, modelo in self.vozes.items()},
+            "carregadas": {
+                id_modelo: voz.estado() if hasattr(voz, "estado") else {} for id_modelo, voz in carregadas
+            },
+            "residentes": self.residentes,
+            "carregamentos": self.carregamentos,
+            "descartes": self.descartes,
+        }